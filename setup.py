@@ -14,7 +14,7 @@ setup(name='Inception',
       url='https://github.com/jercytryn/inception',
       license='MIT',
       packages=['inception', 'inception.ui', 'inception.ui.tool',
-                'inception.image',
+                'inception.image', 'inception.image.blend',
                 'inception.image.matte','inception.image.operation',
                 'inception.image.place','inception.image.scene',
                 'inception.image.shadow','inception.image.statadjust'],
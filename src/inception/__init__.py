@@ -10,7 +10,7 @@ Inception api for semi-automaed 2D object insertion into indoor scenery
 # >>> import inception
 # >>> inception.magic_insert()
 # for instance
-from .base import inception, magic_insert, floodfill, scale, poissonblend, shadow, statadjust
+from .base import inception, magic_insert, magic_insert_many, floodfill, scale, poissonblend, poissonblend_many, multibandblend, shadow, shadows, statadjust
 from .generate import generate_magic_composite
-from .image import Image
+from .image import Image, set_working_dtype, get_working_dtype, set_rgba_storage, get_rgba_storage
 
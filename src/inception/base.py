@@ -1,16 +1,18 @@
 """
 Top level inception api
 """
-__all__ = ['floodfill','poissonblend','scale', 'magic_insert', 'inception']
+__all__ = ['floodfill','poissonblend','poissonblend_many','multibandblend','scale', 'magic_insert', 'magic_insert_many', 'inception']
 
 from .image import Image
 from .image.operation.floodfill import FloodfillOperation
 from .image.operation.scale import ScaleOperation
-from .image.operation.poisson import PoissonOperation
-from .image.operation.merge import MergeOperation
+from .image.operation.poisson import PoissonOperation, PoissonBatchOperation
+from .image.operation.blend import MultibandBlendOperation
+from .image.operation.merge import MergeOperation, CompositeOperation
 from .image.operation.matte import SimpleMatteOperation
 from .image.operation.statadjust import StatAdjustOperation
-from .image.operation.shadow import GenerateShadowOperation
+from .image.operation.shadow import GenerateShadowOperation, GenerateShadowBatchOperation
+from .image.shadow.cache import foreground_key
 
 def floodfill(image, *args, **kwargs):
     """
@@ -90,6 +92,10 @@ def poissonblend(source_image, dest_image, boundingbox, mask=None, **kwargs):
             A flag determining the type of blending to do.  Support normal clone (cv2.NORMAL_CLONE), mixed 
             clone for mixing gradients (cv2.MIXED_CLONE) and feature exchange (cv2.FEATURE_EXCHANGE).
             See http://docs.opencv.org/3.0-beta/modules/photo/doc/cloning.html for more details.
+        solver : `basestring`
+            Which poisson solver to use, 'opencv' or 'native'.  The native solver works in floating point
+            over just the blended region and supports bounding boxes partially outside of the dest image.
+            Default='opencv'
     
     :Returns:
         The blended composite
@@ -104,6 +110,66 @@ def poissonblend(source_image, dest_image, boundingbox, mask=None, **kwargs):
     dest_image = Image.from_any(dest_image)
     return PoissonOperation(source_image, dest_image, offset=(boundingbox[1], boundingbox[0]), **kwargs).run()
 
+def poissonblend_many(source_images, dest_image, boundingboxes, masks=None, **kwargs):
+    """
+    Performs a joint poisson blending operation of several source images into the same destination image,
+    using the native solver.  Overlapping sources are solved together and disjoint ones in parallel
+    
+    :Parameters:
+        source_images : `list`
+            The images to composite, from first to last, as `Image` objects, numpy arrays, urls or filepaths
+        dest_image : `Image` or `numpy.array` or `basestring`
+            The image to blend the sources into
+        boundingboxes : `list`
+            The bounding box for where to insert each source image in the dest image, each given as four
+            coordinates corresponding to (upperleft.x, upperleft.y, lowerright.x, lowerright.y)
+        masks : `list`
+            One-channel mask images to use instead of each source image alpha channel. Default=None
+        clone_type : `int`
+            A flag determining the type of blending to do.  Supports normal clone (cv2.NORMAL_CLONE) and mixed 
+            clone for mixing gradients (cv2.MIXED_CLONE).
+        threads : `int`
+            The number of threads to solve disjoint regions on. If not given, uses one per cpu. Default=None
+    
+    :Returns:
+        The blended composite
+        
+    :Rtype:
+        `Image`
+    """
+    source_images = [Image.from_any(source_image) for source_image in source_images]
+    dest_image = Image.from_any(dest_image)
+    offsets = [(boundingbox[1], boundingbox[0]) for boundingbox in boundingboxes]
+    return PoissonBatchOperation(source_images, dest_image, offsets=offsets, masks=masks, **kwargs).run()
+
+def multibandblend(source_image, dest_image, boundingbox, **kwargs):
+    """
+    Performs a multi-band (Laplacian pyramid) blending operation of the given source image into the 
+    given destination image, using the source alpha as the blending mask
+    
+    :Parameters:
+        source_image : `Image` or `numpy.array` or `basestring`
+            The image to composite
+        dest_image : `Image` or `numpy.array` or `basestring`
+            The image to blend source into
+        boundingbox : `tuple`
+            The bounding box for where to insert the source image in the dest image, given as four
+            coordinates corresponding to (upperleft.x, upperleft.y, lowerright.x, lowerright.y).
+            May lie partially outside of the dest image
+        levels : `int`
+            The number of pyramid levels, i.e. frequency bands, to blend. If not given, as many as fit the
+            source are used. Default=None
+    
+    :Returns:
+        The blended composite
+        
+    :Rtype:
+        `Image`
+    """
+    source_image = Image.from_any(source_image)
+    dest_image = Image.from_any(dest_image)
+    return MultibandBlendOperation(source_image, dest_image, offset=(boundingbox[1], boundingbox[0]), **kwargs).run()
+
 def statadjust(source_image, dest_image, boundingbox, **kwargs):
     """
     Performs a statistical adjustment operation on the source image to match the destination image
@@ -116,6 +182,21 @@ def statadjust(source_image, dest_image, boundingbox, **kwargs):
         boundingbox : `tuple`
             The bounding box for where the source image will be inserted into the dest image once merged, 
             given as four coordinates corresponding to (upperleft.x, upperleft.y, lowerright.x, lowerright.y)
+        contrast_search : `basestring`
+            How to search for the contrast curve best matching the background, 'grid' or 'fast'. Default='grid'
+        indexed : `bool`
+            If True, reads the background statistics from an index of them cached on the dest image, 
+            so that many insertions into the same background only analyze it once. Default=False
+        cct_lookup : `bool`
+            If True, interpolates color temperatures from a precomputed table. Default=False
+        fused : `bool`
+            If True, works out the adjustment on the opaque pixels of the source image only, then applies it 
+            in a single pass. Default=False
+        transform : `ColorTransform`
+            If given, applies this transform from an earlier adjustment instead of measuring either image,
+            e.g. to adjust every frame of a sequence alike. Default=None
+        max_samples : `int`
+            If given, estimates the statistics of each image from at most this many sampled pixels. Default=None
             
     :Returns:
         A statistically adjusted copy of the source image
@@ -124,7 +205,9 @@ def statadjust(source_image, dest_image, boundingbox, **kwargs):
         `Image`
     """
     source_image = Image.from_any(source_image)
-    dest_image = Image.from_any(dest_image)
+    # keep the given background itself, so that any statistics cached on it are kept for later insertions
+    if not isinstance(dest_image, Image):
+        dest_image = Image.from_any(dest_image)
     return StatAdjustOperation(source_image, dest_image, offset=(boundingbox[1], boundingbox[0]), **kwargs).run()
 
 def scale(image, *args, **kwargs):
@@ -170,6 +253,11 @@ def merge(*args, **kwargs):
             The canvas size is determined by the first 
             image and its offset and subsequent offsets are relative to it.  
             Negative offsets equate to cropping off that many pixels from that image.
+        premultiplied : `bool`
+            If True, carries the layers through the merge with premultiplied alpha. Default=False
+        single_pass : `bool`
+            If True, composites every layer front to back into the one output image instead of merging
+            them pairwise, skipping whatever lies behind fully opaque pixels. Default=False
     
     :Returns:
         The resulting merged image
@@ -178,6 +266,8 @@ def merge(*args, **kwargs):
         `Image`
     """
     images = [Image.from_any(image) for image in args]
+    if kwargs.pop('single_pass', False):
+        return CompositeOperation(images, **kwargs).run()
     return MergeOperation(images, **kwargs).run()
 
 def shadow(source_image, dest_image, boundingbox, scene_description=None, **kwargs):
@@ -203,6 +293,11 @@ def shadow(source_image, dest_image, boundingbox, scene_description=None, **kwar
             The number of unique slices to use when applying spatially varying gaussian blur
         skip_soften : `bool`
             If True, do not perform any shadow softening. Default=False
+        template_cache : `ShadowTemplateCache` or `bool`
+            If given, the softened silhouette is looked up in (or added to) this cache of shadow templates. 
+            True uses the shared default cache. Default=None
+        template_key : `object`
+            A hashable identifier for the source image to use as the template cache key. Default=None
             
     :Returns:
         The generated shadow image, of same dimensions as the dest_image
@@ -215,6 +310,49 @@ def shadow(source_image, dest_image, boundingbox, scene_description=None, **kwar
     return GenerateShadowOperation(source_image, dest_image, offset=(boundingbox[1], boundingbox[0]), 
                                    scene_description=scene_description, **kwargs).run()
     
+def shadows(source_images, dest_image, boundingboxes, scene_description=None, **kwargs):
+    """
+    Generates feasible shadows for several source images inserted into the same destination image, 
+    accumulated into a single shadow layer
+    
+    :Parameters:
+        source_images : `list`
+            The foreground images which should each cast a shadow, as `Image` objects, numpy arrays, 
+            urls or filepaths
+        dest_image : `Image` or `numpy.array` or `basestring`
+            The background image which should receive the shadows
+        boundingboxes : `list`
+            The bounding box for where each source image will be inserted into the dest image once merged, 
+            each given as four coordinates corresponding to (upperleft.x, upperleft.y, lowerright.x, lowerright.y)
+        scene_description : `SceneDescription`
+            A scene description object for the background scene, containing various descriptors needed
+            to create shadows.  If not given, the scene description is computed on the fly.
+        blur : `float`
+            The amount of gaussian blur to apply to soften each shadow, on average. 
+        opacity : `float`
+            The average baseline opacity for the softened shadows [0,1]
+        segments : `int`
+            The number of unique slices to use when applying spatially varying gaussian blur
+        skip_soften : `bool`
+            If True, do not perform any shadow softening. Default=False
+        template_cache : `ShadowTemplateCache` or `bool`
+            If given, softened silhouettes are looked up in (or added to) this cache of shadow templates. 
+            True uses the shared default cache. Default=None
+        template_keys : `list`
+            Hashable identifiers for each source image to use as template cache keys. Default=None
+            
+    :Returns:
+        The generated shadow layer holding every shadow, of same dimensions as the dest_image
+        
+    :Rtype:
+        `Image`
+    """
+    source_images = [Image.from_any(source_image) for source_image in source_images]
+    dest_image = Image.from_any(dest_image)
+    offsets = [(boundingbox[1], boundingbox[0]) for boundingbox in boundingboxes]
+    return GenerateShadowBatchOperation(source_images, dest_image, offsets=offsets, 
+                                        scene_description=scene_description, **kwargs).run()
+    
 def magic_insert(source_image, dest_image, boundingbox=None, constrain_scale=None, 
                  generate_shadow=True, perform_statadjust=True,
                  scene_description=None, **kwargs):        
@@ -226,7 +364,9 @@ def magic_insert(source_image, dest_image, boundingbox=None, constrain_scale=Non
         source_image : `Image`
             The foreground image to insert
         dest_image : `Image`
-            The background image into which to insert the foreground
+            The background image into which to insert the foreground.  If kept in 8-bit representation 
+            (e.g. loaded with dtype='uint8'), the composite is 8-bit as well and the background is
+            never converted to floating point as a whole
         boundingbox : `tuple`
             The bounding box for where the source image will be inserted into the dest image once merged, 
             given as four coordinates corresponding to (upperleft.x, upperleft.y, lowerright.x, lowerright.y)
@@ -249,6 +389,9 @@ def magic_insert(source_image, dest_image, boundingbox=None, constrain_scale=Non
     :Rtype:
         `Image`
     """
+    # load the background once for every stage
+    dest_image = Image.from_any(dest_image)
+    
     # simple boundary-based matting
     source_image = simplematte(source_image, **kwargs.get('matteargs',{}))
     
@@ -269,6 +412,11 @@ def magic_insert(source_image, dest_image, boundingbox=None, constrain_scale=Non
         else:
             raise ValueError("Unrecognized value for constrain_scale: '%s'" % constrain_scale)
     
+    # key any cached shadow template on the unscaled source, so that it is shared between all scales
+    shadowargs = dict(kwargs.get('shadowargs',{}))
+    if generate_shadow and shadowargs.get('template_cache') not in (None, False) and shadowargs.get('template_key') is None:
+        shadowargs['template_key'] = foreground_key(source_image)
+    
     # scale
     width = boundingbox[2] - boundingbox[0]
     height = boundingbox[3] - boundingbox[1]
@@ -277,17 +425,89 @@ def magic_insert(source_image, dest_image, boundingbox=None, constrain_scale=Non
     # generate shadow
     if generate_shadow:
         genshadow = shadow(source_image, dest_image, boundingbox, scene_description=scene_description,
-                           **kwargs.get('shadowargs',{}))
+                           **shadowargs)
     
     # light
     if perform_statadjust:
         source_image = statadjust(source_image, dest_image, boundingbox, **kwargs.get('statadjustargs',{}))
     
     # blend
+    mergeargs = dict(kwargs.get('mergeargs',{}))
+    mergeargs.setdefault('single_pass', True)
     if generate_shadow:
         return merge(dest_image, genshadow, source_image, offsets=[(0,0), (0,0), (boundingbox[1], boundingbox[0])], 
-                     **kwargs.get('mergeargs',{}))
-    return merge(dest_image, source_image, offsets=[(0,0), (boundingbox[1], boundingbox[0])], **kwargs.get('mergeargs',{}))
+                     **mergeargs)
+    return merge(dest_image, source_image, offsets=[(0,0), (boundingbox[1], boundingbox[0])], **mergeargs)
+
+def magic_insert_many(source_images, dest_image, boundingboxes, generate_shadow=True, perform_statadjust=True,
+                      scene_description=None, **kwargs):
+    """
+    Performs a "magic" automatic insertion of several source images into the same destination 
+    image at the specified bounding box locations.  Unlike calling `magic_insert` once per source image, 
+    the shadows of every source are generated together into a single shadow layer and everything is 
+    merged in one pass.
+    
+    :Parameters:
+        source_images : `list`
+            The foreground images to insert
+        dest_image : `Image`
+            The background image into which to insert the foregrounds, which may be kept in 8-bit 
+            representation as in `magic_insert`
+        boundingboxes : `list`
+            The bounding box for where each source image will be inserted into the dest image once merged, 
+            each given as four coordinates corresponding to (upperleft.x, upperleft.y, lowerright.x, lowerright.y)
+        generate_shadow : `bool`
+            If True, generates shadows. Otherwise, skips shadow generation. Default=True
+        perform_statadjust : `bool`
+            If True, performs statistical image adjustment on each source image to better match 
+            global lighting of dest_image. Default=True
+        scene_description : `SceneDescription`
+            A scene description object for the background scene, containing various descriptors needed
+            to create shadows.  If not given, the scene description is computed on the fly.
+        **kwargs : 
+            Keyword arguments specific to the various parts of the pipeline, as in `magic_insert`
+            
+    :Returns:
+        The resulting magic composite
+        
+    :Rtype:
+        `Image`
+    """
+    dest_image = Image.from_any(dest_image)
+    
+    shadowargs = dict(kwargs.get('shadowargs',{}))
+    use_template_cache = shadowargs.get('template_cache') not in (None, False) and 'template_keys' not in shadowargs
+    if generate_shadow and use_template_cache:
+        shadowargs['template_keys'] = []
+    
+    # simple boundary-based matting and scale
+    sources = []
+    for source_image, boundingbox in zip(source_images, boundingboxes):
+        source_image = simplematte(source_image, **kwargs.get('matteargs',{}))
+        if generate_shadow and use_template_cache:
+            shadowargs['template_keys'].append(foreground_key(source_image))
+        width = boundingbox[2] - boundingbox[0]
+        height = boundingbox[3] - boundingbox[1]
+        sources.append(scale(source_image, width, height, **kwargs.get('scaleargs',{})))
+    offsets = [(boundingbox[1], boundingbox[0]) for boundingbox in boundingboxes]
+    
+    # generate all shadows together
+    layers = [dest_image]
+    if generate_shadow:
+        layers.append(shadows(sources, dest_image, boundingboxes, scene_description=scene_description,
+                              **shadowargs))
+    
+    # light
+    if perform_statadjust:
+        sources = [statadjust(source_image, dest_image, boundingbox, **kwargs.get('statadjustargs',{}))
+                   for source_image, boundingbox in zip(sources, boundingboxes)]
+    
+    # blend
+    layers.extend(sources)
+    offsets = [(0,0)] * (len(layers) - len(sources)) + offsets
+    mergeargs = dict(kwargs.get('mergeargs',{}))
+    mergeargs.setdefault('single_pass', True)
+    return merge(*layers, offsets=offsets, **mergeargs)
 
 # alias
 inception = magic_insert
@@ -4,4 +4,4 @@ This forms of the meat of the internal inception api.
 The only publicly exposed class is `inception.Image`, which serves 
 as a convenient wrapper around a numpy array.
 """
-from .image import Image
\ No newline at end of file
+from .image import Image, set_working_dtype, get_working_dtype, set_rgba_storage, get_rgba_storage
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""
+Seamless image blending
+"""
+from multiband import multiband_blend
+from poisson import poisson_blend, poisson_blend_many
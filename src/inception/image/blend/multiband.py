@@ -0,0 +1,126 @@
+"""
+Multi-band blending via Laplacian pyramids, a la
+Burt, Peter J., and Edward H. Adelson. "A multiresolution spline with application to image mosaics."
+ACM Transactions on Graphics (TOG) 2.4 (1983): 217-236.
+"""
+
+import math
+import cv2
+import numpy
+from ..image import as_float, as_uint8
+
+## PARAMETERS
+_max_levels = 6 # the most pyramid levels used, unless asked for more
+_min_level_size = 4 # the smallest dimension in pixels allowed at the coarsest level
+
+def multiband_blend(source, dest, offset=(0,0), levels=None, mask=None, out=None):
+    """
+    Blends the source image into the destination image, blending each frequency band of the images
+    over a transition region proportional to its scale, so that fine detail transitions sharply while
+    differences in overall color and lighting are feathered over a wide region.
+    Only the region of the destination around the source is ever touched, and the source may lie
+    partially (or entirely) off the edge of the destination.
+    
+    :Parameters:
+        source : `numpy.array`
+            The RGB[A] image to blend in
+        dest : `numpy.array`
+            The RGB[A] image to blend source into
+        offset : `tuple`
+            A tuple of (row, column) denoting the offset into the destination image where the upper-left
+            corner of the source image should begin. Default=(0,0)
+        levels : `int`
+            The number of pyramid levels, i.e. frequency bands, to blend. If not given, as many as fit the
+            source are used, up to a maximum of 6. Default=None
+        mask : `numpy.array`
+            A one-channel mask [0,1] the size of the source to blend with. If not given, the source 
+            alpha is used. Default=None
+        out : `numpy.array`
+            If given, the array to write the result into, which may be the destination itself. 
+            Otherwise, the destination is copied. Default=None
+            
+    :Returns:
+        The destination with the source blended in, in the same representation as the destination
+        
+    :Rtype:
+        `numpy.array`
+    """
+    if out is None:
+        result = dest.copy()
+    else:
+        result = out
+        if out is not dest:
+            out[...] = dest
+    if mask is None:
+        mask = as_float(source[..., 3], 'float32') if len(source.shape) > 2 and source.shape[2] > 3 else None
+    
+    rows, cols = source.shape[:2]
+    if levels is None:
+        levels = min(_max_levels, _fit_levels(rows, cols))
+    
+    # the coarsest bands feather over about 2^levels pixels, so blend within a margin around the source 
+    # to let them fade out before the edge of the region
+    margin = 2 ** levels
+    r0, c0 = max(offset[0] - margin, 0), max(offset[1] - margin, 0)
+    r1, c1 = min(offset[0] + rows + margin, dest.shape[0]), min(offset[1] + cols + margin, dest.shape[1])
+    if (offset[0] >= dest.shape[0] or offset[1] >= dest.shape[1] or 
+        offset[0] + rows <= 0 or offset[1] + cols <= 0):
+        # nothing to blend
+        return result
+    levels = min(levels, _fit_levels(r1 - r0, c1 - c0))
+    
+    # line the source and its mask up with the region, extending its colors into the margin
+    # and off the edge of the destination for free, as the mask is zero there
+    region = numpy.array(as_float(dest[r0:r1, c0:c1, :3], 'float32'), dtype='float32')
+    top, left = offset[0] - r0, offset[1] - c0
+    bottom, right = (r1 - r0) - (top + rows), (c1 - c0) - (left + cols)
+    source = numpy.asarray(as_float(source[..., :3], 'float32'), dtype='float32')
+    source = _crop_or_pad(source, top, left, bottom, right, cv2.BORDER_REPLICATE)
+    if mask is None:
+        mask = numpy.ones((rows, cols), dtype='float32')
+    mask = _crop_or_pad(numpy.asarray(mask, dtype='float32'), top, left, bottom, right, cv2.BORDER_CONSTANT)
+    
+    # since blending is linear, only the difference between source and destination needs a pyramid:
+    # the result is the destination plus the recombined bands of the difference, each weighted by the 
+    # correspondingly blurred mask
+    coverage = mask
+    difference = source - region
+    bands = []
+    for level in range(levels):
+        smaller = cv2.pyrDown(difference)
+        difference -= cv2.pyrUp(smaller, dstsize=(difference.shape[1], difference.shape[0]))
+        difference *= mask[..., numpy.newaxis]
+        bands.append(difference)
+        difference = smaller
+        mask = cv2.pyrDown(mask)
+    difference *= mask[..., numpy.newaxis]
+    
+    for band in reversed(bands):
+        difference = cv2.pyrUp(difference, dstsize=(band.shape[1], band.shape[0]))
+        difference += band
+    region += difference
+    
+    # the source covers the destination as much as it is blended in
+    if len(dest.shape) > 2 and dest.shape[2] > 3:
+        alpha = numpy.asarray(as_float(dest[r0:r1, c0:c1, 3], 'float32'), dtype='float32')
+        region = numpy.dstack((region, coverage + alpha * (1 - coverage)))
+    
+    numpy.clip(region, 0, 1, out=region)
+    result[r0:r1, c0:c1, :region.shape[2]] = as_uint8(region) if dest.dtype == numpy.uint8 else region
+    return result
+
+def _fit_levels(rows, cols):
+    """
+    Gets the most pyramid levels that fit an image of the given size
+    """
+    return max(int(math.log(max(min(rows, cols), 1) / float(_min_level_size), 2)), 0)
+
+def _crop_or_pad(image, top, left, bottom, right, border_type):
+    """
+    Crops (for negative amounts) or pads (for positive amounts) each side of the given image
+    """
+    image = image[max(-top, 0):image.shape[0] - max(-bottom, 0), max(-left, 0):image.shape[1] - max(-right, 0)]
+    if max(top, left, bottom, right) > 0:
+        image = cv2.copyMakeBorder(image, max(top, 0), max(bottom, 0), max(left, 0), max(right, 0), border_type, 
+                                   value=0)
+    return image
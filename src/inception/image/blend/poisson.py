@@ -0,0 +1,307 @@
+"""
+Native Poisson image blending, a la
+Perez, Patrick, Michel Gangnet, and Andrew Blake. "Poisson image editing." ACM Transactions on Graphics (TOG). Vol. 22. No. 3. ACM, 2003.
+solved directly in floating point with fast sine/cosine transforms over just the blended region
+"""
+
+from multiprocessing.pool import ThreadPool
+import cv2
+import numpy
+import scipy.fftpack
+from ..image import as_float, as_uint8
+from ..place import group_rects
+
+def poisson_blend(source, dest, offset=(0,0), mask=None, mixed=False, out=None):
+    """
+    Blends the source image into the destination image by solving for the image whose gradients best
+    match the source's within the mask, and which matches the destination at the boundary of the blended
+    region.
+    Only the bounding box of the mask is solved over, entirely in floating point. Where that region is
+    cut off by the edge of the destination, the solution is left free (i.e. zero normal gradient) there,
+    so the source may lie partially off the edge of the destination.
+
+    :Parameters:
+        source : `numpy.array`
+            The RGB[A] image to blend in
+        dest : `numpy.array`
+            The RGB[A] image to blend source into
+        offset : `tuple`
+            A tuple of (row, column) denoting the offset into the destination image where the upper-left
+            corner of the source image should begin. Default=(0,0)
+        mask : `numpy.array`
+            A one-channel mask the size of the source, nonzero where the source should be blended in.
+            If not given, the nonzero source alpha is used. Default=None
+        mixed : `bool`
+            If True, uses whichever of the source and destination gradients is stronger within the mask,
+            so that destination texture shows through flat parts of the source. Default=False
+        out : `numpy.array`
+            If given, the array to write the result into, which may be the destination itself.
+            Otherwise, the result is a floating point copy of the destination. Default=None
+
+    :Returns:
+        The destination with the source blended in
+
+    :Rtype:
+        `numpy.array`
+    """
+    masks = None if mask is None else [mask]
+    return poisson_blend_many([source], dest, [offset], masks=masks, mixed=mixed, out=out)
+
+def poisson_blend_many(sources, dest, offsets=None, masks=None, mixed=False, out=None, threads=None):
+    """
+    Blends several source images into the same destination image, as in `poisson_blend`.
+    Sources whose blended regions overlap are solved together as one system over the union of their
+    regions, with later sources taking precedence where they overlap, while disjoint regions are
+    solved independently on a pool of threads.
+
+    :Parameters:
+        sources : `list`
+            An iterable of RGB[A] images to blend in, from first to last
+        dest : `numpy.array`
+            The RGB[A] image to blend the sources into
+        offsets : `list`
+            An iterable of (row, column) tuples denoting the offset into the destination image where the
+            upper-left corner of the corresponding source image should begin. Default=(0,0) for every source
+        masks : `list`
+            An iterable of one-channel masks the size of the corresponding source, nonzero where the source
+            should be blended in. Sources with a mask of None use their nonzero alpha. Default=None
+        mixed : `bool`
+            If True, uses whichever of the source and destination gradients is stronger within each mask.
+            Default=False
+        out : `numpy.array`
+            If given, the array to write the result into, which may be the destination itself.
+            Otherwise, the result is a floating point copy of the destination. Default=None
+        threads : `int`
+            The number of threads to solve disjoint regions on. If not given, uses one per cpu.
+            Default=None
+
+    :Returns:
+        The destination with every source blended in
+
+    :Rtype:
+        `numpy.array`
+    """
+    if out is None:
+        result = numpy.array(as_float(dest))
+    else:
+        result = out
+        if out is not dest:
+            out[...] = dest
+
+    if offsets is None:
+        offsets = [(0,0)] * len(sources)
+    if masks is None:
+        masks = [None] * len(sources)
+
+    rois = [_get_roi(source, dest, offset, mask) for source, offset, mask in zip(sources, offsets, masks)]
+    blends = [(source, roi) for source, roi in zip(sources, rois) if roi is not None]
+    if not blends:
+        return result
+
+    # each group of overlapping regions is one system, keeping the sources in order within it
+    groups = [(rect, [(source, roi) for source, roi in blends if _contains(rect, roi[0])])
+              for rect in group_rects([roi[0] for _, roi in blends])]
+
+    def solve(group):
+        rect, members = group
+        return solve_region([source for source, _ in members], dest, rect, [roi for _, roi in members], mixed)
+
+    if len(groups) > 1 and threads != 1:
+        pool = ThreadPool(threads)
+        try:
+            regions = pool.map(solve, groups)
+        finally:
+            pool.close()
+    else:
+        regions = [solve(group) for group in groups]
+
+    for (rect, members), region in zip(groups, regions):
+        r0, c0, r1, c1 = rect
+
+        # the sources cover the destination wherever they are blended in
+        if len(dest.shape) > 2 and dest.shape[2] > 3:
+            alpha = numpy.array(as_float(dest[r0:r1, c0:c1, 3]))
+            for _, ((top, left, bottom, right), _, inside) in members:
+                covered = alpha[top-r0:bottom-r0, left-c0:right-c0]
+                numpy.maximum(covered, inside, out=covered)
+            region = numpy.dstack((region, alpha))
+
+        numpy.clip(region, 0, 1, out=region)
+        result[r0:r1, c0:c1, :region.shape[2]] = as_uint8(region) if result.dtype == numpy.uint8 else region
+    return result
+
+def _contains(outer, inner):
+    """
+    Whether the outer rect, given as (top, left, bottom, right), contains the inner rect
+    """
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+def _get_roi(source, dest, offset, mask):
+    """
+    Gets the region of the destination to solve over, as the bounding box of the mask (plus a pixel
+    so that the mask boundary has gradients on both sides) clipped to the source and destination.
+
+    :Returns:
+        A tuple of (dest_rect, source_rect, mask) where each rect is given as (top, left, bottom, right)
+        and mask is the boolean mask over the region, or None if there is nothing to blend
+    """
+    rows, cols = source.shape[:2]
+    if mask is None:
+        if len(source.shape) > 2 and source.shape[2] > 3:
+            mask = source[..., 3]
+        else:
+            mask = numpy.ones((rows, cols), dtype='bool')
+
+    occupied_rows = numpy.flatnonzero(numpy.any(mask, axis=1))
+    occupied_cols = numpy.flatnonzero(numpy.any(mask, axis=0))
+    if not occupied_rows.size:
+        return None
+    top, bottom = occupied_rows[0], occupied_rows[-1] + 1
+    left, right = occupied_cols[0], occupied_cols[-1] + 1
+
+    # clip the padded mask bounds to the source, then to the destination
+    top, left = max(top - 1, 0, -offset[0]), max(left - 1, 0, -offset[1])
+    bottom = min(bottom + 1, rows, dest.shape[0] - offset[0])
+    right = min(right + 1, cols, dest.shape[1] - offset[1])
+    if top >= bottom or left >= right:
+        return None
+
+    source_rect = (top, left, bottom, right)
+    dest_rect = (top + offset[0], left + offset[1], bottom + offset[0], right + offset[1])
+    return (dest_rect, source_rect, numpy.asarray(mask[top:bottom, left:right]) > 0)
+
+def solve_region(sources, dest, rect, rois, mixed=False):
+    """
+    Solves the Poisson equation over the given region of the destination, guided by the given sources
+
+    :Parameters:
+        sources : `list`
+            The RGB[A] images to blend in, from first to last
+        dest : `numpy.array`
+            The RGB[A] image to blend the sources into
+        rect : `tuple`
+            The region of the destination to solve over, given as (top, left, bottom, right)
+        rois : `list`
+            The region to blend each source over, as given by `_get_roi`, each of which lies within rect
+        mixed : `bool`
+            If True, uses mixed gradients. Default=False
+
+    :Returns:
+        The blended RGB floating point region of the destination
+
+    :Rtype:
+        `numpy.array`
+    """
+    r0, c0, r1, c1 = rect
+
+    # a side of the region is only held fixed to the destination if the destination continues past it
+    # (top, left, bottom, right)
+    fixed = (r0 > 0, c0 > 0, r1 < dest.shape[0], c1 < dest.shape[1])
+
+    # gather the region with a one pixel ring around it, replicating where the image ends
+    target = _with_ring(dest, rect)
+
+    # the guidance field: each source's gradients across edges within its mask, destination elsewhere,
+    # including across the mask boundary, where the source may jump to whatever lies under its zero alpha
+    guide_x = numpy.diff(target, axis=1)
+    guide_y = numpy.diff(target, axis=0)
+    for source, ((top, left, bottom, right), source_rect, inside) in zip(sources, rois):
+        guide = _with_ring(source, source_rect)
+        inside = numpy.pad(inside, 1, 'constant')
+        
+        # the ring around the source's region lines up with the ring around the whole region
+        top, left = top - r0, left - c0
+        bottom, right = top + guide.shape[0], left + guide.shape[1]
+        region_x = guide_x[top:bottom, left:right-1]
+        region_x[...] = _guidance(numpy.diff(guide, axis=1), region_x, inside[:, 1:] & inside[:, :-1], mixed)
+        region_y = guide_y[top:bottom-1, left:right]
+        region_y[...] = _guidance(numpy.diff(guide, axis=0), region_y, inside[1:, :] & inside[:-1, :], mixed)
+
+    # edges out to free sides do not exist
+    if not fixed[0]: guide_y[0] = 0
+    if not fixed[2]: guide_y[-1] = 0
+    if not fixed[1]: guide_x[:, 0] = 0
+    if not fixed[3]: guide_x[:, -1] = 0
+
+    # discrete poisson equation sum_q (f_p - f_q) = sum_q (g_p - g_q), with fixed neighbors moved to the right
+    rhs = (guide_x[1:-1, :-1] - guide_x[1:-1, 1:]) + (guide_y[:-1, 1:-1] - guide_y[1:, 1:-1])
+    if fixed[0]: rhs[0] += target[0, 1:-1]
+    if fixed[2]: rhs[-1] += target[-1, 1:-1]
+    if fixed[1]: rhs[:, 0] += target[1:-1, 0]
+    if fixed[3]: rhs[:, -1] += target[1:-1, -1]
+
+    region = _solve_laplacian(rhs, (fixed[0], fixed[2]), (fixed[1], fixed[3]))
+    if not any(fixed):
+        # otherwise defined only up to a constant, so keep the destination's overall level
+        region += (target[1:-1, 1:-1].mean(axis=(0, 1)) - region.mean(axis=(0, 1)))
+    return region
+
+def _with_ring(image, rect):
+    """
+    Crops the given rect out of the image's color channels along with a one pixel ring around it, in 
+    floating point, replicating the image's edge pixels where the ring falls outside of it
+    """
+    top, left, bottom, right = rect
+    rows, cols = image.shape[:2]
+    crop = as_float(image[max(top - 1, 0):min(bottom + 1, rows), max(left - 1, 0):min(right + 1, cols), :3])
+    return cv2.copyMakeBorder(numpy.ascontiguousarray(crop, dtype='float64'),
+                              int(top == 0), int(bottom == rows), int(left == 0), int(right == cols),
+                              cv2.BORDER_REPLICATE)
+
+def _guidance(source_gradient, dest_gradient, use_source, mixed):
+    """
+    Chooses the guidance gradient across each edge
+    """
+    if mixed:
+        use_source = use_source[..., numpy.newaxis] & (numpy.abs(source_gradient) > numpy.abs(dest_gradient))
+    else:
+        use_source = numpy.repeat(use_source[..., numpy.newaxis], source_gradient.shape[2], axis=2)
+    return numpy.where(use_source, source_gradient, dest_gradient)
+
+def _solve_laplacian(rhs, fixed_rows, fixed_cols):
+    """
+    Solves the discrete (negative) Laplacian system L f = rhs over a rectangular grid, where each end of
+    each axis is either fixed (the neighbor beyond it is known and already moved into rhs) or free
+    (zero gradient across it).
+    Each axis is diagonalized by a sine transform when both ends are fixed, a cosine transform when both
+    are free, and by mirroring onto a twice as long axis with both ends fixed otherwise.
+    """
+    transforms = []
+    for axis, ends in ((0, fixed_rows), (1, fixed_cols)):
+        n = rhs.shape[axis]
+        if ends[0] != ends[1]:
+            # mirror across the free end
+            mirrored = rhs[::-1] if axis == 0 else rhs[:, ::-1]
+            rhs = numpy.concatenate((rhs, mirrored) if ends[0] else (mirrored, rhs), axis=axis)
+            transforms.append((axis, 'sine', 2 * n, slice(None, n) if ends[0] else slice(n, None)))
+        else:
+            transforms.append((axis, 'sine' if ends[0] else 'cosine', n, slice(None)))
+
+    # forward transform and eigenvalues of the 1d second difference along each axis
+    eigenvalues = 0
+    for axis, kind, n, _ in transforms:
+        shape = [1, 1, 1]
+        shape[axis] = n
+        if kind == 'sine':
+            rhs = scipy.fftpack.dst(rhs, type=1, axis=axis)
+            k = numpy.arange(1, n + 1)
+            eigenvalues = eigenvalues + (2 - 2 * numpy.cos(numpy.pi * k / (n + 1.0))).reshape(shape)
+        else:
+            rhs = scipy.fftpack.dct(rhs, type=2, axis=axis, norm='ortho')
+            k = numpy.arange(n)
+            eigenvalues = eigenvalues + (2 - 2 * numpy.cos(numpy.pi * k / float(n))).reshape(shape)
+
+    # the constant component is unconstrained only when every end is free
+    eigenvalues = numpy.where(eigenvalues == 0, numpy.inf, eigenvalues)
+    rhs /= eigenvalues
+
+    # inverse transform and undo any mirroring
+    for axis, kind, n, keep in transforms:
+        if kind == 'sine':
+            rhs = scipy.fftpack.dst(rhs, type=1, axis=axis) / (2.0 * (n + 1))
+        else:
+            rhs = scipy.fftpack.idct(rhs, type=2, axis=axis, norm='ortho')
+        index = [slice(None)] * 3
+        index[axis] = keep
+        rhs = rhs[tuple(index)]
+    return rhs
@@ -2,35 +2,65 @@
 Image implementation
 This provides a layer of encapsulation for the convenience of the internal inception framework
 """
-import os, urlparse, ssl, cStringIO, urllib
+import os, urlparse, ssl, cStringIO, urllib, weakref
 import numpy
 from PIL import Image as PILImage
 from PIL.ImageFile import ImageFile
 
+# the floating point type that 8-bit image data is converted to, see `set_working_dtype`
+_working_dtype = numpy.dtype('float64')
+# the array methods passed through to the data that write to it in place, see `Image.clone`
+_inplace = ('fill', 'itemset', 'put', 'resize', 'sort', 'partition', 'setfield', 'setflags', 'byteswap')
+# whether RGB image data is converted into storage with room for an alpha channel, see `set_rgba_storage`
+_rgba_storage = False
+# the RGBA buffers allocated for RGB data whose alpha channel no image exposes, so may be filled in place
+# by `Image.to_rgba`, by id
+_spare_alpha = weakref.WeakValueDictionary()
+
 class Image(object):
     """
-    An image object representing an image stored in RGB[A] or L floating point representation
+    An image object representing an image stored in RGB[A] or L floating point representation,
+    or optionally kept in 8-bit representation for stages that support it.
+    Clones share their data with the image they were cloned from until either is written to, see `clone`
     """
     
-    def __init__(self, data, pilimage=None, filename=None, scene_description=None):
+    def __init__(self, data, pilimage=None, filename=None, scene_description=None, content_bounds=None, 
+                 dtype=None, frame_offset=None):
         """
         Initializes an image
         
         :Parameter:
             data : `numpy.array`
                 The underlying numpy array representing the actual pixels of the image.
-                dtype can be 'uint8' if numbers range 0-255 otherwise should be 'float64'
+                dtype can be 'uint8' if numbers range 0-255 otherwise should be floating point.
+                If None, the pixels are decoded from `pilimage` when first needed, see `loaded`
             pilimage : `PIL.Image`
                 Internal usage: The python image library image representation
             filename : `basestring`
                 Internal usage: The filename this object came from
             scene_description : `SceneDescription`
                 Internal usage: The cached scene description for this image
+            content_bounds : `tuple`
+                Internal usage: The known bounding box of the non-transparent content of this image,
+                see `content_bounds`
+            dtype : `basestring`
+                The representation to store the image in. 'uint8' keeps 8-bit data as is (0-255), converting
+                floating point data if need be, which uses an eighth of the memory for stages that support it
+                (e.g. merging). Otherwise the data is stored as floating point (0.0-1.0) of this type, e.g.
+                'float32' to halve the memory and bandwidth of every stage. If not given, 8-bit data is
+                converted to the working type, see `set_working_dtype`, and floating point data wider than 
+                the working type is narrowed to it. Default=None
+            frame_offset : `tuple`
+                Internal usage: The (row, column) of this image's upper-left corner within the full frame it
+                is a region of, see `frame_offset`. Default=(0,0)
         """
-        if data.dtype == 'uint8':
-            self._data = data.astype('float64') / 255
-        else:
-            self._data = data
+        # the representation asked for, kept for decoding lazily loaded images
+        self._dtype = dtype
+        if data is not None:
+            self._data = _stored(data, dtype)
+        
+        # the images sharing this image's data until written to, see `clone`
+        self._sharers = [weakref.ref(self)]
             
         self._pilimage = pilimage
         
@@ -39,27 +69,66 @@ class Image(object):
         
         # cached scene description
         self._scene_description = scene_description
+        
+        # cached bounding box of the non-transparent pixels
+        self._content_bounds = content_bounds
+        
+        # cached index of the image statistics
+        self._stats_index = None
+        
+        # where this image lies within the full frame it was loaded from, and the region of the file
+        # still to be decoded, if any, as (top, left, bottom, right)
+        self.frame_offset = tuple(frame_offset) if frame_offset else (0, 0)
+        self._region = None
     
     @classmethod
-    def from_any(cls, thing):
+    def from_any(cls, thing, dtype=None, lazy=True, max_size=None, region=None):
         """
         Tries to construct an image from whatever the user hands it
+        
+        :Parameters:
+            thing : `object`
+                The image as a url, filepath, stream, `Image`, `PIL.Image`, numpy array, `QImage` or list
+            dtype : `basestring`
+                The representation to store the image in, see `Image`.  Existing `Image` objects keep their 
+                representation by default. Default=None
+            lazy : `bool`
+                If True, images loaded from a url or filepath only have their header read until their 
+                pixels are needed, see `from_filepath`. Default=True
+            max_size : `tuple`
+                If given, the (width, height) that images decoded from a url, filepath or stream are needed
+                at, see `from_filepath`. Default=None
+            region : `tuple`
+                If given, the only region of images decoded from a url, filepath or stream that is needed,
+                see `from_filepath`. Default=None
         """
         if isinstance(thing, basestring):
-            return cls.from_url(thing)
-        
-        if hasattr(thing, 'read'):
-            return cls.from_stream(thing)
+            return cls.from_url(thing, dtype=dtype, lazy=lazy, max_size=max_size, region=region)
         
         if isinstance(thing, cls):
-            return cls(thing._data, pilimage=thing._pilimage, filename=thing.filename, 
-                       scene_description=thing._scene_description)
+            # images that have not been decoded yet stay that way, each reopening the file when decoded
+            data = thing._data if thing.loaded else None
+            image = cls(data, pilimage=thing._pilimage, filename=thing.filename, 
+                        scene_description=thing._scene_description, content_bounds=thing._content_bounds,
+                        dtype=dtype or (thing._data.dtype if thing.loaded else thing._dtype), 
+                        frame_offset=thing.frame_offset)
+            image._stats_index = thing._stats_index
+            if not image.loaded:
+                image._region = thing._region
+            if image.loaded:
+                # the new image shares the data until either is written to, as for `shallow_clone`
+                thing._sharers.append(weakref.ref(image))
+                image._sharers = thing._sharers
+            return image
+        
+        if hasattr(thing, 'read'):
+            return cls.from_stream(thing, dtype=dtype, max_size=max_size, region=region)
         
         if isinstance(thing, ImageFile) or hasattr(thing, 'putpixel'):
-            return cls.from_image(thing)
+            return cls.from_image(thing, dtype=dtype)
         
         if isinstance(thing, numpy.ndarray):
-            return cls(thing)
+            return cls(thing, dtype=dtype)
         
         if hasattr(thing, 'paintEngine'):
             return cls.from_qimage(thing)
@@ -116,7 +185,7 @@ class Image(object):
         return cls(numpy.array(l))
     
     @classmethod
-    def from_url(cls, url):
+    def from_url(cls, url, dtype=None, lazy=True, max_size=None, region=None):
         """
         Constructs an image from the given url or filepath
         Supports protocols such as 'file' and 'http'
@@ -124,6 +193,15 @@ class Image(object):
         :Parameters:
             url : `basestring`
                 The url or filepath denoting the location of the image
+            dtype : `basestring`
+                The representation to store the image in, see `Image`. Default=None
+            lazy : `bool`
+                If True, only the header of the image is read until its pixels are needed, 
+                see `from_filepath`. Default=True
+            max_size : `tuple`
+                If given, the (width, height) the image is needed at, see `from_filepath`. Default=None
+            region : `tuple`
+                If given, the only region of the image that is needed, see `from_filepath`. Default=None
                 
         :Returns:
             A new instance of `Image`
@@ -133,12 +211,13 @@ class Image(object):
         """
         handler = ImageResourceHandler.get(url)
         if handler.rawsupport:
-            return cls.from_filepath(handler.filename)
+            return cls.from_filepath(handler.filename, dtype=dtype, lazy=lazy, max_size=max_size, region=region)
         else:
-            return cls.from_stream(handler.getstream(), resource=handler.filename)
+            return cls.from_stream(handler.getstream(), resource=handler.filename, dtype=dtype, lazy=lazy,
+                                   max_size=max_size, region=region)
     
     @classmethod
-    def from_filepath(cls, filepath):
+    def from_filepath(cls, filepath, dtype=None, lazy=True, max_size=None, region=None):
         """
         Constructs an image from the given filepath
         
@@ -146,6 +225,28 @@ class Image(object):
             filepath : `basestring`
                 The path to an image on disk. May be a relative or absolute path
                 and may include environment variables
+            dtype : `basestring`
+                The representation to store the image in, see `Image`. Default=None
+            lazy : `bool`
+                If True, only the header of the image is read here, so that its size is known, and the 
+                file is closed again.  It is reopened to decode its pixels when they are first needed, see 
+                `loaded`, so the file must still be there then, and errors in the pixel data surface at
+                that point rather than here. Default=True
+            max_size : `tuple`
+                If given, the (width, height) the image is needed at, e.g. the box it is about to be scaled
+                down into.  JPEG images are then decoded directly at the smallest of 1/2, 1/4 or 1/8 scale
+                that is still at least this large in both dimensions, by scaling in the DCT domain, which
+                cuts decoding time and memory by up to 64x.  Other formats are decoded at full size, so 
+                callers still need to scale the result to exactly the size they need. Default=None
+            region : `tuple`
+                If given, the only region of the image that is needed, given as (top, left, bottom, right)
+                where bottom and right are exclusive, in the coordinates of the image as decoded (i.e. after
+                any reduction by `max_size`).  Only the region, clipped to the image, is kept and the image
+                records where it lies in the full frame in `frame_offset`, so that results can be written 
+                back with `paste`.  Tiled and striped formats (e.g. TIFF) only decode the tiles that 
+                overlap the region; other formats (e.g. PNG, or JPEG at the scale chosen for `max_size`)
+                are decoded in full and then cropped, which saves converting and storing the rest of the
+                image but not decoding it. Default=None
         
         :Returns:
             A new instance of `Image`
@@ -154,21 +255,32 @@ class Image(object):
             `Image`
         """
         filepath = os.path.expandvars(os.path.expanduser(filepath))
-        image = PILImage.open(filepath)
-        c = cls(numpy.asarray(image))
-        # we already have the pil image, so lets cache it
-        c._pilimage = image
-        c.filename = image.filename
+        image = _open(filepath, max_size)
+        c = cls(None, pilimage=image, filename=image.filename, dtype=dtype)
+        c._load_region(region, lazy)
+        if lazy:
+            # don't hold on to a file handle for pixels that may never be needed, see `_decode`
+            image.close()
         return c
     
     @classmethod
-    def from_stream(cls, stream, resource=None):
+    def from_stream(cls, stream, resource=None, dtype=None, lazy=False, max_size=None, region=None):
         """
         Constructs an image from the given stream, e.g. a file object or the like
         
         :Parameters:
             stream : `object`
                 Any object that behaves like a file and can be read from
+            dtype : `basestring`
+                The representation to store the image in, see `Image`. Default=None
+            lazy : `bool`
+                If True, only the header of the image is read here and its pixels are decoded when first 
+                needed, see `from_filepath`, in which case the stream must be left open until then. 
+                Default=False
+            max_size : `tuple`
+                If given, the (width, height) the image is needed at, see `from_filepath`. Default=None
+            region : `tuple`
+                If given, the only region of the image that is needed, see `from_filepath`. Default=None
         
         :Returns:
             A new instance of `Image`
@@ -176,22 +288,21 @@ class Image(object):
         :Rtype:
             `Image`
         """
-        image = PILImage.open(stream)
-        c = cls(numpy.asarray(image))
-        # we already have the pil image, so lets cache it
-        c._pilimage = image
-        if resource:
-            c.filename = resource
+        image = _open(stream, max_size)
+        c = cls(None, pilimage=image, filename=resource, dtype=dtype)
+        c._load_region(region, lazy)
         return c
     
     @classmethod
-    def from_image(cls, image):
+    def from_image(cls, image, dtype=None):
         """
         Constructs an image from a `PIL.Image` object
         
         :Parameters:
             image : `PIL.Image`
                 The image stored as a PIL Image object
+            dtype : `basestring`
+                The representation to store the image in, see `Image`. Default=None
         
         :Returns:
             A new instance of `Image`
@@ -199,7 +310,7 @@ class Image(object):
         :Rtype:
             `Image`
         """
-        c = cls(numpy.asarray(image))
+        c = cls(numpy.asarray(image), dtype=dtype)
         # we already have the pil image, so lets cache it
         c._pilimage = image
         if hasattr(image, 'filename'):
@@ -214,9 +325,16 @@ class Image(object):
         :Rtype:
             `PIL.Image`
         """
+        if not self.loaded:
+            # the pil image of an image still to be decoded is only the header of its file, or of the 
+            # whole file when only a region of it is needed
+            self._load()
         # lazy-load
         if self._pilimage is None:
-            self._pilimage = PILImage.fromarray(numpy.uint8(self.data*255))
+            if self._data.dtype == numpy.uint8:
+                self._pilimage = PILImage.fromarray(self._data)
+            else:
+                self._pilimage = PILImage.fromarray(numpy.uint8(self._data*255))
         return self._pilimage
     
     @property
@@ -228,7 +346,9 @@ class Image(object):
         :Rtype:
             `numpy.array`
         """
-        rgb = numpy.uint8(self.data[...,:3]*255)
+        if self._data.dtype == numpy.uint8:
+            return self._data[:, :, 2::-1].copy()
+        rgb = numpy.uint8(self._data[...,:3]*255)
         return rgb[:, :, ::-1].copy() 
     
     @property
@@ -241,15 +361,16 @@ class Image(object):
         """
         # adapted from http://kogs-www.informatik.uni-hamburg.de/~meine/software/vigraqt/qimage2ndarray.py
         from PySide import QtGui
-        rows, cols, chans = self.data.shape
+        rows, cols, chans = self._data.shape
+        scale = 1 if self._data.dtype == numpy.uint8 else 255
         bgra = numpy.empty((rows, cols, 4), numpy.uint8, 'C')
-        bgra[...,2] = self.data[...,0] * 255
-        bgra[...,1] = self.data[...,1] * 255
-        bgra[...,0] = self.data[...,2] * 255
-        if self.data.shape[2] < 4:
+        bgra[...,2] = self._data[...,0] * scale
+        bgra[...,1] = self._data[...,1] * scale
+        bgra[...,0] = self._data[...,2] * scale
+        if self._data.shape[2] < 4:
             bgra[...,3].fill(255)
         else:
-            bgra[...,3] = self.data[...,3] * 255
+            bgra[...,3] = self._data[...,3] * scale
         format = QtGui.QImage.Format_ARGB32
         image = QtGui.QImage(bgra.data, cols, rows, format)
         image.ndarray = bgra
@@ -269,18 +390,63 @@ class Image(object):
     def scene_description(self, value):
         self._scene_description = value
     
+    @property
+    def stats_index(self):
+        """
+        The cached index of the image statistics used for statistical image adjustment, if any.
+        This is cleared whenever the image changes
+        
+        :Rtype:
+            `BackgroundStatsIndex`
+        """
+        return self._stats_index
+    
+    @stats_index.setter
+    def stats_index(self, value):
+        self._stats_index = value
+    
+    @property
+    def content_bounds(self):
+        """
+        The bounding box of the non-transparent content of this image, given as (top, left, bottom, right)
+        where bottom and right are exclusive, so that it can be used directly for slicing.
+        Images without an alpha channel are entirely content and fully transparent images have an empty
+        (0,0,0,0) bounding box.
+        This is computed from the alpha channel once and cached until the image changes. Operations that 
+        already know where the content of their result lies may set it directly, in which case it is only 
+        guaranteed to enclose the content rather than be tight
+        
+        :Rtype:
+            `tuple`
+        """
+        if self._content_bounds is None:
+            self._content_bounds = compute_content_bounds(self._data)
+        return self._content_bounds
+    
+    @content_bounds.setter
+    def content_bounds(self, value):
+        self._content_bounds = value
+    
     @property
     def data(self):
         """
-        The underlying (numpy) data representation for this image
+        The underlying (numpy) data representation for this image, which may be written to in place.
+        If the data is still shared with a clone, this is a read-only view of it, see `clone`
         
         :Rtype:
             `numpy.ndarray`
         """
-        return self._data
+        return self._readable()
     
     @data.setter
     def data(self, val):
+        # views of the shared data, e.g. from dropping a channel, remain shared
+        if not self.loaded or _root(val) is not _root(self._data):
+            self._sharers = [weakref.ref(self)]
+        elif not val.flags.writeable:
+            # a read-only view handed out while shared, which this image may write through once it is not
+            val = val.view()
+            val.flags.writeable = _root(val).flags.writeable
         self._data = val
         self._clear_cache()
         
@@ -292,7 +458,7 @@ class Image(object):
         :Rtype:
             `int`
         """
-        return self.data.shape[0]
+        return self.shape[0]
     
     @property
     def width(self):
@@ -302,25 +468,57 @@ class Image(object):
         :Rtype:
             `int`
         """
-        return self.data.shape[1]
+        return self.shape[1]
+    
+    @property
+    def shape(self):
+        """
+        The shape of the underlying data, which is read from the header of an image that has not been 
+        decoded yet without decoding it
+        
+        :Rtype:
+            `tuple`
+        """
+        if self.loaded:
+            return self._data.shape
+        width, height = self._pilimage.size
+        if self._region:
+            top, left, bottom, right = self._region
+            height, width = bottom - top, right - left
+        bands = len(self._pilimage.getbands())
+        return (height, width) if bands == 1 else (height, width, bands)
+    
+    @property
+    def loaded(self):
+        """
+        Whether the pixels of this image have been decoded.  Images loaded lazily (see `from_filepath`) 
+        only have their header read until anything but their size is asked of them
+        
+        :Rtype:
+            `bool`
+        """
+        return '_data' in self.__dict__
     
     def to_grayscale(self):
         """
         Converts this image to 1 channel grayscale, in place. 
         Warning: This is a lossy operation
         """
-        rows, cols = self.data.shape[:2]
-        if len(self.data.shape) == 2:
+        rows, cols = self._data.shape[:2]
+        if len(self._data.shape) == 2:
             # already grayscale
             return
         
-        chans = self.data.shape[2]
+        chans = self._data.shape[2]
         if chans == 1:
-            self.data = self.data[..., 0]
+            self.data = self._data[..., 0]
         elif chans >= 3:
             # luminance conversion
             # see http://stackoverflow.com/questions/12201577/convert-rgb-image-to-grayscale-in-python
-            self.data = numpy.dot(self.data[...,:3], [0.299, 0.587, 0.114])
+            gray = numpy.dot(self._data[...,:3], [0.299, 0.587, 0.114])
+            if self._data.dtype == numpy.uint8:
+                gray = as_uint8(gray / 255)
+            self.data = gray
         else:
             raise ValueError("Unsupported number of channels for grayscale conversion: %s" % chans)
     
@@ -329,14 +527,15 @@ class Image(object):
         Convenience function to convert this image from grayscale or rgba
         to RGB in place.  Simply copies the single channel into each color channel for grayscale
         """
-        rows, cols = self.data.shape[:2]
-        chans = self.data.shape[2] if len(self.data.shape) > 2 else 1
+        rows, cols = self._data.shape[:2]
+        chans = self._data.shape[2] if len(self._data.shape) > 2 else 1
         
         if chans == 3:
             # no-op
             return
         elif chans == 4:
-            self.data = self.data[..., :3]
+            self.data = self._data[..., :3]
+            self._content_bounds = (0, 0, rows, cols)
             return
         elif chans == 2:
             raise ValueError("Unsupported number of channels for rgb conversion: %s" % chans)
@@ -344,13 +543,14 @@ class Image(object):
         # according to 
         # http://www.socouldanyone.com/2013/03/converting-grayscale-to-rgb-with-numpy.html
         # this pattern is fastest for general use    
-        tmp = numpy.empty((rows, cols, 3), dtype=numpy.float64)
-        if len(self.data.shape) > 2:
-            tmp[:,:,0] = self.data[...,0]
+        tmp = _rgb_empty((rows, cols), numpy.uint8 if self._data.dtype == numpy.uint8 else float_dtype(self._data.dtype))
+        if len(self._data.shape) > 2:
+            tmp[:,:,0] = self._data[...,0]
         else:
-            tmp[:,:,0] = self.data
+            tmp[:,:,0] = self._data
         tmp[:,:,1] = tmp[:,:,2] = tmp[:,:,0]
         self.data = tmp
+        self._content_bounds = (0, 0, rows, cols)
     
     def to_rgba(self):
         """
@@ -359,11 +559,11 @@ class Image(object):
         is assumed to be all opaque.  
         If the image is already RGBA, this is a no-op
         """
-        rows, cols = self.data.shape[:2]
-        if len(self.data.shape) > 2:
-            chans = self.data.shape[2]
+        rows, cols = self._data.shape[:2]
+        if len(self._data.shape) > 2:
+            chans = self._data.shape[2]
         else:
-            self.data = self.data.reshape(rows,cols,1)
+            self.data = self._data.reshape(rows,cols,1)
             chans = 1
             
         if chans >= 4:
@@ -373,10 +573,39 @@ class Image(object):
         if chans == 1:
             self.to_rgb()
 
-        # add a 4th channel, with all 1.0 alpha values
-        alpha = numpy.ones((rows, cols, 1))
-        tmp = numpy.dstack((self.data[:,:,0], self.data[:,:,1], self.data[:,:,2], alpha))
+        # add a 4th channel, with all 1.0 alpha values, in place if the data is the color channels of 
+        # storage allocated with a spare one and no clone still shares it
+        dtype = numpy.uint8 if self._data.dtype == numpy.uint8 else float_dtype(self._data.dtype)
+        tmp = None if self._is_shared() else _alpha_storage(self._data)
+        if tmp is not None and _spare_alpha.get(id(tmp)) is tmp:
+            # once filled, the alpha channel is visible through this image and no longer spare
+            del _spare_alpha[id(tmp)]
+        else:
+            tmp = numpy.empty((rows, cols, 4), dtype=dtype)
+            tmp[..., :3] = self._data
+        tmp[..., 3] = 255 if dtype == numpy.uint8 else 1
         self.data = tmp
+        self._content_bounds = (0, 0, rows, cols)
+        
+    def to_float(self):
+        """
+        Converts this image from 8-bit to floating point representation in place, for stages that only 
+        operate on floating point data.  If the image is already floating point, this is a no-op
+        """
+        if self._data.dtype == numpy.uint8:
+            bounds = self._content_bounds
+            self.data = _convert(self._data, _working_dtype)
+            self._content_bounds = bounds
+            
+    def to_uint8(self):
+        """
+        Converts this image to 8-bit representation in place, rounding to the nearest level.
+        Warning: This is a lossy operation
+        """
+        if self._data.dtype != numpy.uint8:
+            bounds = self._content_bounds
+            self.data = _convert(self._data, numpy.dtype(numpy.uint8))
+            self._content_bounds = bounds
         
     def save(self, outpath, *args, **kwargs):
         """
@@ -397,7 +626,8 @@ class Image(object):
     
     def shallow_clone(self):
         """
-        Performs a shallow copy of this image object
+        Performs a shallow copy of this image object, which shares this image's data until either image is
+        written to, see `clone`
         
         :Returns:
             The shallow clone
@@ -405,11 +635,23 @@ class Image(object):
         :Rtype:
             `Image`
         """
-        return self.__class__(self._data, self._pilimage, self.filename, self._scene_description)
+        clone = self.__class__(self._data, self._pilimage, self.filename, self._scene_description, 
+                               self._content_bounds, self._data.dtype, self.frame_offset)
+        clone._stats_index = self._stats_index
+        self._sharers.append(weakref.ref(clone))
+        clone._sharers = self._sharers
+        return clone
     
     def clone(self):
         """
-        Performs a deep copy of this image object
+        Performs a deep copy of this image object.
+        The copy is made lazily: the clone shares this image's data until either image is written to, through
+        item assignment, an in-place array method passed through to the data (e.g. `fill`) or `detach`, at
+        which point that image takes its own copy.  Until then, reading either image's data, through `data`,
+        item access or any other array attribute, gives read-only views of the shared data, so call `detach`
+        first to write to such views in place.  Only the channels that are not being overwritten entirely are
+        copied, so cloning and then replacing a channel (e.g. the alpha), or converting the representation,
+        never copies the whole image
         
         :Returns:
             The deep clone
@@ -417,9 +659,91 @@ class Image(object):
         :Rtype:
             `Image`
         """
-        copy = self.shallow_clone()
-        copy._data = copy._data.copy()
-        return copy
+        return self.shallow_clone()
+    
+    def detach(self):
+        """
+        Gives this image its own copy of its data if it is still shared with a clone, so that `data` can be 
+        written to in place, e.g. in a loop over pixels without going through item assignment each time.
+        If the data is not shared, this is a no-op
+        """
+        if self._is_shared():
+            self._own(_copy(self._data))
+    
+    def paste(self, image, offset=None):
+        """
+        Writes the given image into this one in place, e.g. to write the result of working on a region of
+        a large frame (see `from_filepath`) back into the full frame.  The image is converted to this 
+        image's representation and only as many channels as both have are written, so for instance an 
+        opaque RGBA composite can be pasted straight back into an RGB frame.  Anything falling outside of 
+        this image is cropped off
+        
+        :Parameters:
+            image : `Image`
+                The image to write, either an `Image` or a `numpy.array`
+            offset : `tuple`
+                The (row, column) in this image to write the upper-left corner of the image to.
+                Defaults to where the image lies in the frame relative to this image, from the 
+                `frame_offset` of each. Default=None
+        """
+        if offset is None:
+            frame_offset = getattr(image, 'frame_offset', (0, 0))
+            offset = (frame_offset[0] - self.frame_offset[0], frame_offset[1] - self.frame_offset[1])
+        data = image.data if isinstance(image, Image) else numpy.asarray(image)
+        
+        rows, cols = self.shape[:2]
+        r0, c0 = max(offset[0], 0), max(offset[1], 0)
+        r1, c1 = min(offset[0] + data.shape[0], rows), min(offset[1] + data.shape[1], cols)
+        if r0 >= r1 or c0 >= c1:
+            return
+        
+        chans = min(self.shape[2] if len(self.shape) > 2 else 1, data.shape[2] if data.ndim > 2 else 1)
+        source = data[r0 - offset[0]:r1 - offset[0], c0 - offset[1]:c1 - offset[1]]
+        if source.ndim > 2:
+            source = source[..., :chans]
+        source = as_uint8(source) if self.dtype == numpy.uint8 else as_float(source, self.dtype)
+        if len(self.shape) > 2:
+            self[r0:r1, c0:c1, :chans] = source if source.ndim > 2 else source[..., numpy.newaxis]
+        else:
+            self[r0:r1, c0:c1] = source if source.ndim == 2 else source[..., 0]
+    
+    def _load_region(self, region, lazy):
+        """
+        Private method to set up decoding only the given region of this image's file, if any, and to
+        decode it now unless lazy
+        """
+        if region:
+            width, height = self._pilimage.size
+            top, left = min(max(int(region[0]), 0), height), min(max(int(region[1]), 0), width)
+            bottom, right = max(min(int(region[2]), height), top), max(min(int(region[3]), width), left)
+            self._region = (top, left, bottom, right)
+            self.frame_offset = (top, left)
+        if not lazy:
+            self._load()
+    
+    def _load(self):
+        """
+        Private method to decode the pixels of a lazily loaded image now, if they have not been already
+        """
+        return self._data
+    
+    def _is_shared(self):
+        """
+        Private method to check whether this image's data is still shared with a live clone
+        """
+        if len(self._sharers) < 2:
+            return False
+        # drop clones that have been freed or have since taken their own copy
+        root = _root(self._data)
+        self._sharers[:] = [ref for ref in self._sharers if ref() is not None and _root(ref()._data) is root]
+        return len(self._sharers) > 1
+    
+    def _own(self, data):
+        """
+        Private method to replace this image's shared data with its own copy
+        """
+        self._data = data
+        self._sharers = [weakref.ref(self)]
     
     def _clear_cache(self):
         """
@@ -427,20 +751,33 @@ class Image(object):
         cached properties can be properly recalculated when the underlying image changed
         """
         self._pilimage = None
+        self._content_bounds = None
+        self._stats_index = None
     
     def __getattr__(self, attr):
+        if attr == '_data':
+            # decode lazily loaded images on first access to their pixels
+            if self.__dict__.get('_pilimage') is None:
+                raise AttributeError(attr)
+            self._pilimage, data = _decode(self._pilimage, self._region)
+            self._region = None
+            self._data = _stored(data, self._dtype)
+            return self._data
+        
         # passthrough all unknown attributes to the wrapped numpy object, so that this can in many ways
         # be treated identically to a numpy array for convenience and ease of support in either type
         # in the framework
-        try:
-            return getattr(self.data, attr)
-        except AttributeError:            
+        if not hasattr(self._data, attr):
             raise AttributeError("Neither '%s' object nor its wrapped '%s' object has attribute '%s'" %
-                                 (self.__class__.__name__, self.data.__class__.__name__, attr))
+                                 (self.__class__.__name__, self._data.__class__.__name__, attr))
+        # methods that write in place take a copy of shared data first, while anything else only reads it
+        if attr in _inplace:
+            self.detach()
+        return getattr(self._readable(), attr)
     
     def __getitem__(self, key):
         # passthrough all dictionary lookups to the underlying numpy array
-        return self.data[key]
+        return self._readable()[key]
     
     def __setitem__(self, key, val):
         # the underlying image is changing, so clear the cache
@@ -448,9 +785,353 @@ class Image(object):
         # calling classes take on the responsibility of clearing the cache
         # of course, if speed is desired, the calling class could simple do
         # self.data[...] = ... to do without caching, then clear the cache only at the end
+        # (images still to be decoded are decoded first, from their cached pil image)
+        self._load()
         self._clear_cache() 
-        # passthrough all dictionary setter to the underlying numpy array
-        self.data[key] = val
+        if not self._is_shared():
+            # passthrough all dictionary setter to the underlying numpy array
+            self._data[key] = val
+            return
+        
+        # take our own copy of the shared data, skipping a channel that is about to be overwritten entirely
+        channel = _whole_channel(key, self._data.shape)
+        if channel is None:
+            data = _copy(self._data)
+        else:
+            data = numpy.empty_like(self._data)
+            data[..., :channel] = self._data[..., :channel]
+            data[..., channel + 1:] = self._data[..., channel + 1:]
+        data[key] = val
+        self._own(data)
+    
+    def _readable(self):
+        """
+        Private method to get this image's data for reading, without taking a copy of shared data, which
+        is instead protected from being written to
+        """
+        if not self._is_shared():
+            return self._data
+        view = self._data.view()
+        view.flags.writeable = False
+        return view
+
+def as_float(data, dtype=None, out=None):
+    """
+    Gets the given image data in floating point representation (0.0-1.0)
+    
+    :Parameters:
+        data : `numpy.array`
+            The image data, either 8-bit or already floating point
+        dtype : `basestring`
+            The floating point type to convert 8-bit data to. If not given, the type of `out` if given, 
+            otherwise the working type, see `set_working_dtype`. Default=None
+        out : `numpy.array`
+            If given, the array of the same shape to convert 8-bit data into. Default=None
+            
+    :Returns:
+        The floating point data, which is the data itself if it was already floating point
+        
+    :Rtype:
+        `numpy.array`
+    """
+    if data.dtype == numpy.uint8:
+        if out is None:
+            out = numpy.empty(data.shape, dtype=dtype or _working_dtype)
+        out[...] = data
+        out /= 255
+        return out
+    return data
+
+def as_uint8(data, out=None):
+    """
+    Gets the given image data in 8-bit representation (0-255), rounding floating point data
+    to the nearest level
+    
+    :Parameters:
+        data : `numpy.array`
+            The image data, either floating point or already 8-bit
+        out : `numpy.array`
+            If given, the 8-bit array of the same shape to convert floating point data into. Default=None
+            
+    :Returns:
+        The 8-bit data, which is the data itself if it was already 8-bit
+        
+    :Rtype:
+        `numpy.array`
+    """
+    if data.dtype == numpy.uint8:
+        return data
+    scaled = numpy.multiply(data, 255.0)
+    scaled += .5
+    numpy.clip(scaled, 0, 255, out=scaled)
+    if out is None:
+        return scaled.astype(numpy.uint8)
+    out[...] = scaled
+    return out
+
+def float_dtype(dtype):
+    """
+    Gets the floating point type that data of the given type is worked on in
+    
+    :Parameters:
+        dtype : `numpy.dtype`
+            The type of the image data
+            
+    :Returns:
+        The type itself if floating point, otherwise the working type, see `set_working_dtype`
+        
+    :Rtype:
+        `numpy.dtype`
+    """
+    dtype = numpy.dtype(dtype)
+    return dtype if dtype.kind == 'f' else _working_dtype
+
+def set_working_dtype(dtype):
+    """
+    Sets the floating point type that images are worked on in by default, i.e. that 8-bit images are
+    converted to when loaded, and that wider floating point images are narrowed to when wrapped.  
+    'float32' halves the memory and bandwidth of every stage, at about 7 significant digits, which is
+    still far finer than 8-bit output
+    
+    :Parameters:
+        dtype : `basestring`
+            The floating point type, e.g. 'float32' or 'float64'
+    """
+    global _working_dtype
+    dtype = numpy.dtype(dtype)
+    if dtype.kind != 'f':
+        raise ValueError("Working type must be floating point: %s" % dtype)
+    _working_dtype = dtype
+
+def get_working_dtype():
+    """
+    Gets the floating point type that images are worked on in by default, see `set_working_dtype`
+    
+    :Returns:
+        The working type
+        
+    :Rtype:
+        `numpy.dtype`
+    """
+    return _working_dtype
+
+def set_rgba_storage(enabled):
+    """
+    Sets whether RGB image data is stored with room for an alpha channel whenever it is converted anyway, 
+    i.e. when 8-bit images are loaded into floating point or representations change.  The data of such an
+    image is a view of the color channels of an RGBA buffer, so that adding an alpha channel (`to_rgba`) 
+    just fills in the buffer's alpha plane rather than copying the whole image, at the cost of a third more
+    memory for images that never need one
+    
+    :Parameters:
+        enabled : `bool`
+            Whether to keep room for an alpha channel
+    """
+    global _rgba_storage
+    _rgba_storage = bool(enabled)
+
+def get_rgba_storage():
+    """
+    Gets whether RGB image data is stored with room for an alpha channel, see `set_rgba_storage`
+    
+    :Returns:
+        Whether room is kept for an alpha channel
+        
+    :Rtype:
+        `bool`
+    """
+    return _rgba_storage
+
+def _open(fp, max_size=None):
+    """
+    Opens an image file for decoding, reading only its header, and sets up JPEG images to be decoded at
+    a reduced scale if they are only needed at the given (width, height)
+    """
+    image = PILImage.open(fp)
+    if max_size:
+        image.draft(image.mode, (max(int(max_size[0]), 1), max(int(max_size[1]), 1)))
+    return image
+
+def _decode(image, region=None):
+    """
+    Decodes the pixels of an opened image file, keeping only the given region (top, left, bottom, right) 
+    if given, returning the decoded `PIL.Image` and its pixels.  Only tiled and striped files skip decoding
+    the parts of the image outside the region, other formats are decoded in full and then cropped
+    """
+    if image.fp is None:
+        # the file was closed once its header was read, so reopen it at the same, possibly reduced, size
+        image = _open(image.filename, image.size)
+    if region is None:
+        return (image, numpy.asarray(image))
+    top, left, bottom, right = region
+    
+    # for files split into tiles or strips, only decode those overlapping the region.  The image keeps
+    # its full size, the rest of it is left blank and cropped away below
+    tiles = image.tile or []
+    if len(tiles) > 1:
+        kept = [tile for tile in tiles 
+                if tile[1][0] < right and tile[1][2] > left and tile[1][1] < bottom and tile[1][3] > top]
+        image.tile = kept or tiles[:1]
+    
+    image = image.crop((left, top, right, bottom))
+    return (image, numpy.asarray(image))
+
+def _stored(data, dtype=None):
+    """
+    Converts image data to the representation it is stored in for the given requested type, see `Image`
+    """
+    if dtype is not None:
+        return _convert(data, numpy.dtype(dtype))
+    if data.dtype == numpy.uint8 or data.dtype.kind == 'f' and data.dtype.itemsize > _working_dtype.itemsize:
+        return _convert(data, _working_dtype)
+    return data
+
+def _convert(data, dtype):
+    """
+    Converts image data to the given representation, if it is not already, storing RGB data with room 
+    for an alpha channel if enabled, see `set_rgba_storage`
+    """
+    if data.dtype == dtype:
+        return data
+    if not (_rgba_storage and data.ndim == 3 and data.shape[2] == 3):
+        if dtype == numpy.uint8:
+            return as_uint8(data)
+        if data.dtype == numpy.uint8:
+            return as_float(data, dtype)
+        return data.astype(dtype)
+    
+    # convert blocks of rows padded out with an opaque alpha channel, so that the conversion itself runs
+    # over contiguous memory rather than skipping every fourth value
+    rows, cols = data.shape[:2]
+    buffer = numpy.empty((rows, cols, 4), dtype=dtype)
+    step = max(1, (1 << 18) // max(cols, 1))
+    for start in range(0, rows, step):
+        block = numpy.empty((min(step, rows - start), cols, 4), dtype=data.dtype)
+        block[..., :3] = data[start:start + step]
+        block[..., 3] = 255 if data.dtype == numpy.uint8 else 1
+        if dtype == numpy.uint8:
+            as_uint8(block, buffer[start:start + step])
+        elif data.dtype == numpy.uint8:
+            as_float(block, dtype, buffer[start:start + step])
+        else:
+            buffer[start:start + step] = block
+    return _spare(buffer)
+
+def _rgb_empty(shape, dtype):
+    """
+    An uninitialized RGB image of the given rows and columns, as the color channels of an RGBA buffer if 
+    room for an alpha channel is enabled, see `set_rgba_storage`
+    """
+    if _rgba_storage:
+        return _spare(numpy.empty(tuple(shape) + (4,), dtype=dtype))
+    return numpy.empty(tuple(shape) + (3,), dtype=dtype)
+
+def _spare(buffer):
+    """
+    The color channels of a newly allocated RGBA buffer, recording that its alpha channel is spare
+    """
+    _spare_alpha[id(buffer)] = buffer
+    return buffer[..., :3]
+
+def _alpha_storage(data):
+    """
+    The RGBA buffer whose color channels the given RGB data is a view of, if any
+    """
+    buffer = data.base
+    if (not isinstance(buffer, numpy.ndarray) or buffer.shape != data.shape[:2] + (4,) or 
+        buffer.dtype != data.dtype or buffer.strides != data.strides or 
+        buffer.__array_interface__['data'][0] != data.__array_interface__['data'][0]):
+        return None
+    return buffer
+
+def _copy(data):
+    """
+    Copies image data, keeping room for an alpha channel if it had it and that is enabled
+    """
+    if _rgba_storage and data.ndim == 3 and data.shape[2] == 3 and _alpha_storage(data) is not None:
+        return _spare(data.base.copy())
+    return data.copy()
+
+def _root(data):
+    """
+    The array that owns the memory of the given array, or the array itself if it is not a view
+    """
+    while isinstance(getattr(data, 'base', None), numpy.ndarray):
+        data = data.base
+    return data
+
+def _whole_channel(key, shape):
+    """
+    The channel index the given item key selects the whole of, for a key such as [..., 3] or [:, :, 3], 
+    or None if it selects anything else
+    """
+    if len(shape) != 3 or not isinstance(key, tuple) or not key:
+        return None
+    channel = key[-1]
+    if not isinstance(channel, (int, long, numpy.integer)) or not -shape[2] <= channel < shape[2]:
+        return None
+    rest = key[:-1]
+    if not (len(rest) == 1 and rest[0] is Ellipsis or 
+            len(rest) == 2 and all(isinstance(k, slice) and k == slice(None) for k in rest)):
+        return None
+    return int(channel) % shape[2]
+
+def compute_content_bounds(data):
+    """
+    Computes the tight bounding box of the non-transparent content of the given image data
+    
+    :Parameters:
+        data : `numpy.array`
+            The image data
+            
+    :Returns:
+        The bounding box given as (top, left, bottom, right) where bottom and right are exclusive.
+        Data without an alpha channel is entirely content and fully transparent data has an
+        empty (0,0,0,0) bounding box
+        
+    :Rtype:
+        `tuple`
+    """
+    rows, cols = data.shape[:2]
+    if len(data.shape) < 3 or data.shape[2] < 4:
+        return (0, 0, rows, cols)
+    
+    alpha = data[..., 3]
+    occupied_rows = numpy.flatnonzero(alpha.any(axis=1))
+    if not occupied_rows.size:
+        return (0, 0, 0, 0)
+    top, bottom = occupied_rows[0], occupied_rows[-1] + 1
+    # only need to look for occupied columns between the occupied rows
+    occupied_cols = numpy.flatnonzero(alpha[top:bottom].any(axis=0))
+    return (int(top), int(occupied_cols[0]), int(bottom), int(occupied_cols[-1] + 1))
+
+def get_content_bounds(image, tight=False):
+    """
+    Gets the bounding box of the non-transparent content of the given image, using the
+    cached bounds of `Image` objects where possible
+    
+    :Parameters:
+        image : `Image` or `numpy.array`
+            The image
+        tight : `bool`
+            If True, the bounding box is tight even if the cached bounds only enclose the content (see 
+            `Image.content_bounds`), which are then only searched within. Default=False
+            
+    :Returns:
+        The bounding box given as (top, left, bottom, right) where bottom and right are exclusive
+        
+    :Rtype:
+        `tuple`
+    """
+    if not isinstance(image, Image):
+        return compute_content_bounds(image)
+    bounds = image.content_bounds
+    if not tight or bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+        return bounds
+    top, left, bottom, right = compute_content_bounds(image[bounds[0]:bounds[2], bounds[1]:bounds[3]])
+    if top >= bottom:
+        return (0, 0, 0, 0)
+    return (bounds[0] + top, bounds[1] + left, bounds[0] + bottom, bounds[1] + right)
 
 class ImageResourceHandler(object):
     """
@@ -0,0 +1,52 @@
+"""
+Module for multi-band blending operations
+"""
+
+from .base import Operation
+from ..image import Image
+from ..blend import multiband_blend
+
+class MultibandBlendOperation(Operation):
+    """
+    Implements a Laplacian pyramid multi-band blending operation, a la
+    Burt, Peter J., and Edward H. Adelson. "A multiresolution spline with application to image mosaics."
+    ACM Transactions on Graphics (TOG) 2.4 (1983): 217-236.
+    Much cheaper than poisson blending, and the source may lie partially off the edge of the destination
+    """
+    def __init__(self, source_image, dest_image, offset=(0, 0), levels=None):
+        """
+        Initializes a multi-band blending operation
+        
+        :Parameters:
+            source_image : `Image`
+                The image to composite. Its alpha channel is used as the blending mask
+            dest_image : `Image`
+                The image to blend source into
+            offset : `tuple`
+                A tuple of (row, column) denoting the offset into the destination image where the upper-left
+                corner of the source image should begin. Default=(0,0)
+            levels : `int`
+                The number of pyramid levels, i.e. frequency bands, to blend. If not given, as many as fit the
+                source are used. Default=None
+        """
+        self.source_image = self.image = source_image
+        self.dest_image = dest_image
+        self.offset = offset
+        self.levels = levels
+        self.opimage = None
+        
+    def run(self):
+        """
+        Runs the operation
+        
+        :Returns:
+            A single image with foreground and background blended together seamlessly
+            
+        :Rtype:
+            `Image`
+        """
+        self.image.to_rgba()
+        self.opimage = Image(multiband_blend(self.source_image.data, self.dest_image.data, self.offset, 
+                                             levels=self.levels),
+                             dtype=self.dest_image.dtype)
+        return self.opimage
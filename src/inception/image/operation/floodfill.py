@@ -100,20 +100,24 @@ class FloodfillOperation(Operation):
         # so we don't run up against python's recursion limits, lets do the floodfill with a set (order doesn't matter anyways)
         pixels = set([first_index])
         
+        # take the clone's own copy of the data once, rather than on every write
+        image.detach()
+        data = image.data
+        
         # TODO: inline floodfill as the all python implementation is rather slow
         # e.g.
         # see http://docs.scipy.org/doc/scipy/reference/tutorial/weave.html#catalog-search-paths-and-the-pythoncompiled-variable
         while pixels:
             row, col = pixels.pop()
             
-            if not self._floatIterEquals(image[row, col, ...], self.keycolor) or \
-                    self._floatEquals(image[row, col, self.channel], self.replacevalue, tol=1e-9):
+            if not self._floatIterEquals(data[row, col, ...], self.keycolor) or \
+                    self._floatEquals(data[row, col, self.channel], self.replacevalue, tol=1e-9):
                 # base case: on an already changed pixel or a border pixel
                 continue 
                         
             # if we get here, this pixel needs to be changed (it is the keycolor) and hasn't been
             # changed already
-            image.data[row, col, self.channel] = self.replacevalue
+            data[row, col, self.channel] = self.replacevalue
                         
             # "recurse" to all surrounding pixels
             if row < rows - 1:
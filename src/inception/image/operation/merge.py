@@ -4,16 +4,18 @@ Merge related operations
 
 import numpy
 from .base import Operation
-from ..image import Image
-from ..place import normalize_shape
+from ..image import Image, as_float, as_uint8
+from ..place import group_rects
 
 _default_image_size = (200,200,4)
 
 class MergeOperation(Operation):
     """
-    An operation for merging any number of differently sized images via an over operation
+    An operation for merging any number of differently sized images via an over operation.
+    If the first (bottom) image is stored in 8-bit representation, the merge is performed entirely in 
+    integer arithmetic and the result is 8-bit as well, with floating point layers rounded to 8-bit on the way in
     """
-    def __init__(self, images, offsets=None):
+    def __init__(self, images, offsets=None, premultiplied=False):
         """
         Initializes the merge operation
         
@@ -27,8 +29,13 @@ class MergeOperation(Operation):
                 The canvas size is determined by the first 
                 image and its offset and subsequent offsets are relative to it.  
                 Negative offsets equate to cropping off that many pixels from that image.
+            premultiplied : `bool`
+                If True, layers are carried through the merge with premultiplied alpha, so that each over
+                is a single multiply-add and colors are only divided back out by alpha once at the end. 
+                Only applies to floating point merges. Default=False
         """
         self.images = images
+        self.premultiplied = premultiplied
         self.opimage = None
         
         if offsets is None:
@@ -43,23 +50,93 @@ class MergeOperation(Operation):
             return self.opimage
         
         # width and height determined entirely by the size of the first image and its offest
-        canvas = self.images[0]
-    
-        height = canvas.height + self.offsets[0][0]
-        width = canvas.width + self.offsets[0][1]
-        # normalize canvas dims (copies canvas to new image so not in-place as well)
-        canvas = Image(normalize_shape(canvas, self.offsets[0], width, height))
-        canvas.to_rgba()
-        
-        # perform the merge operation on the rest of the images...
-        for i, image in enumerate(self.images[1:]):
+        first = self.images[0]
+        height = first.height + self.offsets[0][0]
+        width = first.width + self.offsets[0][1]
+        
+        # the canvas is allocated once and every layer is blended into it in place
+        # a canvas without alpha becomes entirely opaque, padding included
+        fixed_point = first.dtype == numpy.uint8
+        canvas = numpy.zeros((height, width, 4), dtype=first.dtype)
+        r0, c0, r1, c1 = self.place_bounds((0, 0) + first.shape[:2], self.offsets[0], width, height)
+        if r0 < r1 and c0 < c1:
+            canvas[r0:r1, c0:c1, :first.shape[2]] = first[r0-self.offsets[0][0]:r1-self.offsets[0][0], 
+                                                          c0-self.offsets[0][1]:c1-self.offsets[0][1]]
+        if first.shape[2] == 4:
+            bounds = self.place_bounds(first.content_bounds, self.offsets[0], width, height)
+        else:
+            canvas[..., 3] = 255 if fixed_point else 1
+            bounds = (0, 0, height, width)
+        if bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+            bounds = (height, width, 0, 0)
+        
+        # find the region each of the rest of the images covers
+        layers = []
+        for image, offset in zip(self.images[1:], self.offsets[1:]):
             image.to_rgba()
-            image = normalize_shape(image.data, self.offsets[i+1], width, height)
-            canvas = self.merge(image, canvas)
+            
+            r0, c0, r1, c1 = self.place_bounds(image.content_bounds, offset, width, height)
+            if r0 < r1 and c0 < c1:
+                layers.append((image, offset, (r0, c0, r1, c1)))
+                
+        # only the regions touched by some layer ever need to change representation
+        premultiplied = self.premultiplied and not fixed_point
+        touched = group_rects([rect for _, _, rect in layers]) if premultiplied else []
+        for r0, c0, r1, c1 in touched:
+            premultiply(canvas[r0:r1, c0:c1], out=canvas[r0:r1, c0:c1])
         
-        self.opimage = Image(canvas)
+        # perform the merge operation on the rest of the images, only within the region each one covers
+        for image, offset, (r0, c0, r1, c1) in layers:
+            bounds = (min(bounds[0], r0), min(bounds[1], c0), max(bounds[2], r1), max(bounds[3], c1))
+            
+            layer = image.data[r0-offset[0]:r1-offset[0], c0-offset[1]:c1-offset[1]]
+            if fixed_point:
+                self.over_fixed_point(as_uint8(layer), canvas[r0:r1, c0:c1], out=canvas[r0:r1, c0:c1])
+            elif premultiplied:
+                self.over_premultiplied(premultiply(layer), canvas[r0:r1, c0:c1], out=canvas[r0:r1, c0:c1])
+            else:
+                canvas[r0:r1, c0:c1] = self.merge(layer, canvas[r0:r1, c0:c1])
+                
+        for r0, c0, r1, c1 in touched:
+            unpremultiply(canvas[r0:r1, c0:c1], out=canvas[r0:r1, c0:c1])
+        
+        if bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+            bounds = (0, 0, 0, 0)
+        self.opimage = Image(canvas, content_bounds=bounds, dtype=canvas.dtype, 
+                             frame_offset=self.frame_offset(first))
         return self.opimage
     
+    def frame_offset(self, first):
+        """
+        Where the canvas lies within the full frame the first image is a region of, see `Image.frame_offset`
+        """
+        return (first.frame_offset[0] - self.offsets[0][0], first.frame_offset[1] - self.offsets[0][1])
+    
+    def place_bounds(self, bounds, offset, width, height):
+        """
+        Places the content bounding box of an image at the given offset into the canvas
+        
+        :Parameters:
+            bounds : `tuple`
+                The bounding box of the image's content, given as (top, left, bottom, right)
+            offset : `tuple`
+                The (row, column) offset of the image into the canvas
+            width : `int`
+                The width of the canvas in pixels
+            height : `int`
+                The height of the canvas in pixels
+                
+        :Returns:
+            The bounding box of the content within the canvas, which is empty (top >= bottom or left >= right)
+            if none of the content lies within the canvas
+            
+        :Rtype:
+            `tuple`
+        """
+        top, left, bottom, right = bounds
+        return (max(top + offset[0], 0), max(left + offset[1], 0), 
+                min(bottom + offset[0], height), min(right + offset[1], width))
+    
     def merge(self, image1, image2):
         """
         Merges image 1 over image 2
@@ -107,6 +184,73 @@ class MergeOperation(Operation):
     
         return numpy.dstack((new_red, new_green, new_blue, new_alpha))
         
+    def over_premultiplied(self, image1, image2, out=None):
+        """
+        Performs an over operation of image 1 over image 2, where both images have premultiplied alpha
+        
+        :Parameters:
+            image1 : `numpy.array`
+                The premultiplied image to place over image 2
+            image2 : `numpy.array`
+                The premultiplied image to place under image 1
+            out : `numpy.array`
+                If given, the array to write the result into, which may be image2 itself. Default=None
+                
+        :Returns:
+            The newly merged premultiplied image
+            
+        :Rtype:
+            `numpy.array`
+        """
+        # every channel, alpha included: col_a + col_b * (1 - alpha_a)
+        if out is None:
+            out = numpy.empty(numpy.broadcast(image1, image2).shape, 
+                              dtype=numpy.result_type(image1.dtype, image2.dtype))
+        numpy.multiply(image2, (1 - image1[...,3])[...,numpy.newaxis], out=out)
+        out += image1
+        return out
+        
+    def over_fixed_point(self, image1, image2, out=None):
+        """
+        Performs an over operation of 8-bit image 1 over 8-bit image 2, using integer intermediates 
+        with the results rounded to nearest
+        
+        :Parameters:
+            image1 : `numpy.array`
+                The 8-bit image to place over image 2
+            image2 : `numpy.array`
+                The 8-bit image to place under image 1
+            out : `numpy.array`
+                If given, the 8-bit array to write the result into, which may be image2 itself. Default=None
+                
+        :Returns:
+            The newly merged 8-bit image
+            
+        :Rtype:
+            `numpy.array`
+        """
+        alpha1 = image1[...,3:4].astype(numpy.uint16)
+        alpha2 = image2[...,3:4].astype(numpy.uint16)
+        
+        # alpha_a + alpha_b*(1-alpha_a), scaled by 255 so that it is exact in 16 bits
+        weight1 = alpha1 * 255
+        weight2 = alpha2 * (255 - alpha1)
+        new_alpha = weight1 + weight2
+        
+        # (1/alpha_0) * (alpha_a * col_a + alpha_b * col_b * (1- alpha_a)), where the weighted sum
+        # needs up to 24 bits
+        colors = image1[...,:3] * weight1.astype(numpy.uint32)
+        colors += image2[...,:3] * weight2.astype(numpy.uint32)
+        new_alpha_safe = numpy.maximum(new_alpha, 1).astype(numpy.uint32)
+        colors += new_alpha_safe >> 1
+        colors //= new_alpha_safe
+        
+        if out is None:
+            out = numpy.empty(colors.shape[:-1] + (4,), dtype=numpy.uint8)
+        out[...,:3] = colors
+        out[...,3:4] = _div255(new_alpha)
+        return out
+        
     def over_channel(self, image1_channel, image2_channel, alpha1, alpha2):
         """
         Performs an over for a given channel
@@ -129,3 +273,146 @@ class MergeOperation(Operation):
         """
         return numpy.multiply(image1_channel, alpha1) + numpy.multiply(numpy.multiply(image2_channel, alpha2), 1 - alpha1)
         
+class CompositeOperation(MergeOperation):
+    """
+    An operation for merging any number of differently sized images, as in `MergeOperation`, but in a 
+    single pass.  Layers are accumulated front to back with premultiplied alpha into the one output canvas, 
+    so no intermediate composites are made, and each layer is only composited within the part of its region
+    not yet made fully opaque by the layers in front of it.
+    8-bit merges are already performed in place in integer arithmetic, so they are left to `MergeOperation`
+    """
+    def run(self):
+        if not self.images or self.images[0].dtype == numpy.uint8:
+            return super(CompositeOperation, self).run()
+        
+        # width and height determined entirely by the size of the first image and its offest
+        first = self.images[0]
+        height = first.height + self.offsets[0][0]
+        width = first.width + self.offsets[0][1]
+        canvas = numpy.zeros((height, width, 4), dtype=first.dtype)
+        
+        # find the region each of the images covers, from the top layer down
+        layers = []
+        for image, offset in reversed(zip(self.images[1:], self.offsets[1:])):
+            image.to_rgba()
+            rect = self.place_bounds(image.content_bounds, offset, width, height)
+            if rect[0] < rect[2] and rect[1] < rect[3]:
+                layers.append((image.data, offset, rect))
+        
+        # a first image without alpha is entirely opaque, padding included
+        opaque = first.shape[2] != 4
+        rect = self.place_bounds(first.content_bounds if not opaque else (0, 0) + first.shape[:2], 
+                                 self.offsets[0], width, height)
+        if rect[0] < rect[2] and rect[1] < rect[3]:
+            layers.append((first.data, self.offsets[0], rect))
+            
+        bounds = (0, 0, height, width) if opaque else (height, width, 0, 0)
+        for data, offset, (r0, c0, r1, c1) in layers:
+            bounds = (min(bounds[0], r0), min(bounds[1], c0), max(bounds[2], r1), max(bounds[3], c1))
+            layer = as_float(data[r0-offset[0]:r1-offset[0], c0-offset[1]:c1-offset[1]], canvas.dtype)
+            self.under(layer, canvas[r0:r1, c0:c1])
+        
+        # whatever light is left through the opaque first image is black
+        if opaque:
+            canvas[..., 3] = 1
+        elif bounds[0] < bounds[2] and bounds[1] < bounds[3]:
+            r0, c0, r1, c1 = bounds
+            unpremultiply(canvas[r0:r1, c0:c1], out=canvas[r0:r1, c0:c1])
+        
+        if bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+            bounds = (0, 0, 0, 0)
+        self.opimage = Image(canvas, content_bounds=bounds, dtype=canvas.dtype, 
+                             frame_offset=self.frame_offset(first))
+        return self.opimage
+        
+    def under(self, image, accumulated):
+        """
+        Accumulates a straight alpha image underneath the premultiplied composite of the layers in front of it, 
+        in place
+        
+        :Parameters:
+            image : `numpy.array`
+                The RGBA image with straight alpha to place under the accumulated layers, or an opaque RGB image
+            accumulated : `numpy.array`
+                The premultiplied composite of every layer in front of the image, which is updated in place
+                
+        :Returns:
+            The accumulated composite
+            
+        :Rtype:
+            `numpy.array`
+        """
+        # only the part of the image that can still be seen through the layers in front needs any work
+        visible = accumulated[...,3] < 1
+        rows = numpy.flatnonzero(visible.any(axis=1))
+        if not len(rows):
+            return accumulated
+        cols = numpy.flatnonzero(visible.any(axis=0))
+        r0, r1, c0, c1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        image, target = image[r0:r1, c0:c1], accumulated[r0:r1, c0:c1]
+        
+        # col_0 += alpha_a * col_a * (1 - alpha_0), alpha_0 += alpha_a * (1 - alpha_0)
+        weight = 1 - target[...,3]
+        if image.shape[-1] == 4:
+            weight *= image[...,3]
+        target[...,:3] += image[...,:3] * weight[...,numpy.newaxis]
+        target[...,3] += weight
+        return accumulated
+        
+
+def premultiply(image, out=None):
+    """
+    Multiplies the color channels of the given RGBA image by its alpha
+    
+    :Parameters:
+        image : `numpy.array`
+            The RGBA image with straight alpha
+        out : `numpy.array`
+            If given, the array to write the result into, which may be the image itself. Default=None
+            
+    :Returns:
+        The image with premultiplied alpha
+        
+    :Rtype:
+        `numpy.array`
+    """
+    if out is None:
+        out = image.copy()
+    elif out is not image:
+        out[...] = image
+    out[...,:3] *= out[...,3:4]
+    return out
+    
+def unpremultiply(image, out=None):
+    """
+    Divides the color channels of the given RGBA image by its alpha.  Fully transparent pixels become black.
+    
+    :Parameters:
+        image : `numpy.array`
+            The RGBA image with premultiplied alpha
+        out : `numpy.array`
+            If given, the array to write the result into, which may be the image itself. Default=None
+            
+    :Returns:
+        The image with straight alpha
+        
+    :Rtype:
+        `numpy.array`
+    """
+    if out is None:
+        out = image.copy()
+    elif out is not image:
+        out[...] = image
+    alpha = out[...,3:4]
+    numpy.divide(out[...,:3], alpha, out=out[...,:3], where=alpha > 0)
+    out[...,:3][alpha[...,0] == 0] = 0
+    return out
+
+def _div255(values):
+    """
+    Divides 16-bit integers of at most 255*255 by 255, rounding to nearest, in place
+    """
+    values += 128
+    values += values >> 8
+    values >>= 8
+    return values
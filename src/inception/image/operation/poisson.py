@@ -6,6 +6,7 @@ import numpy
 import cv2
 from .base import Operation
 from ..image import Image
+from ..blend import poisson_blend, poisson_blend_many
 
 class PoissonOperation(Operation):
     """
@@ -13,7 +14,7 @@ class PoissonOperation(Operation):
     Perez, Patrick, Michel Gangnet, and Andrew Blake. "Poisson image editing." ACM Transactions on Graphics (TOG). Vol. 22. No. 3. ACM, 2003.
     APA
     """
-    def __init__(self, source_image, dest_image, offset=(0, 0), clone_type=cv2.NORMAL_CLONE):
+    def __init__(self, source_image, dest_image, offset=(0, 0), clone_type=cv2.NORMAL_CLONE, solver='opencv'):
         """
         Initializes a poisson blending operation
         
@@ -29,11 +30,22 @@ class PoissonOperation(Operation):
                 A flag determining the type of blending to do.  Support normal clone (cv2.NORMAL_CLONE), mixed 
                 clone for mixing gradients (cv2.MIXED_CLONE) and feature exchange (cv2.FEATURE_EXCHANGE).
                 See http://docs.opencv.org/3.0-beta/modules/photo/doc/cloning.html for more details.
+            solver : `basestring`
+                Which poisson solver to use. 'opencv' uses `cv2.seamlessClone` on 8-bit copies of the whole
+                images. 'native' solves in floating point over just the blended region, supports sources
+                partially off the edge of the destination, and supports normal and mixed clone only.
+                Default='opencv'
         """
+        if solver not in ('opencv', 'native'):
+            raise ValueError("Unrecognized poisson solver: '%s'" % solver)
+        if solver == 'native' and clone_type not in (cv2.NORMAL_CLONE, cv2.MIXED_CLONE):
+            raise ValueError("Unsupported clone type for the native poisson solver: %s" % clone_type)
+        
         self.source_image = self.image = source_image
         self.dest_image = dest_image
         self.offset = offset
         self.clone_type = clone_type
+        self.solver = solver
         self.opimage = None
         
     def run(self):
@@ -46,20 +58,89 @@ class PoissonOperation(Operation):
         :Rtype:
             `Image`
         """
-        # TODO: add support for merging off the edge of the image
         rows, cols = self.image.shape[:2]
         self.image.to_rgba()
+        
+        if self.solver == 'native':
+            self.opimage = Image(poisson_blend(self.source_image.data, self.dest_image.data, self.offset, 
+                                               mixed=self.clone_type == cv2.MIXED_CLONE), 
+                                 dtype=self.dest_image.dtype)
+            return self.opimage
+        
+        # TODO: add support for merging off the edge of the image
 
         # float->int and swaps channels
         opencv_source = self.source_image.opencvimage 
         opencv_dest = self.dest_image.opencvimage
         # construct a mask with 0 corresponding to alpha of 0 in the source
-        self.mask_image = (self.source_image[...,3] * 255).astype('uint8')
+        alpha = self.source_image[...,3]
+        if alpha.dtype == numpy.uint8:
+            self.mask_image = numpy.ascontiguousarray(alpha)
+        else:
+            self.mask_image = (alpha * 255).astype('uint8')
 
         offset = (self.offset[1] + cols / 2, self.offset[0] + rows / 2)
         opencv_result = cv2.seamlessClone(opencv_source, opencv_dest, 
                                           self.mask_image, offset, self.clone_type)
-        self.opimage = Image(opencv_result[:, :, ::-1]) # swap channels back to rgb
+        # swap channels back to rgb, keeping the destination's representation
+        self.opimage = Image(opencv_result[:, :, ::-1], dtype=self.dest_image.dtype)
         return self.opimage
     
-    
\ No newline at end of file
+    
+
+class PoissonBatchOperation(Operation):
+    """
+    Poisson blends several images into the same destination image at once, using the native solver.
+    Sources whose blended regions overlap are solved together as a single system, while disjoint regions are
+    solved in parallel, and the destination is only converted once
+    """
+    def __init__(self, source_images, dest_image, offsets=None, masks=None, clone_type=cv2.NORMAL_CLONE, 
+                 threads=None):
+        """
+        Initializes a batched poisson blending operation
+        
+        :Parameters:
+            source_images : `list`
+                An iterable of `Image` objects to composite, from first to last
+            dest_image : `Image`
+                The image to blend the sources into
+            offsets : `list`
+                An iterable of (row, column) tuples denoting the offset into the destination image where the 
+                upper-left corner of the corresponding source image should begin. Default=(0,0) for every source
+            masks : `list`
+                An iterable of one-channel masks the size of the corresponding source, nonzero where the source 
+                should be blended in. If not given, each source's alpha channel is used. Default=None
+            clone_type : `int`
+                A flag determining the type of blending to do.  Supports normal clone (cv2.NORMAL_CLONE) and mixed 
+                clone for mixing gradients (cv2.MIXED_CLONE). Default=cv2.NORMAL_CLONE
+            threads : `int`
+                The number of threads to solve disjoint regions on. If not given, uses one per cpu. Default=None
+        """
+        if clone_type not in (cv2.NORMAL_CLONE, cv2.MIXED_CLONE):
+            raise ValueError("Unsupported clone type for the native poisson solver: %s" % clone_type)
+        
+        self.source_images = self.images = source_images
+        self.dest_image = self.image = dest_image
+        self.offsets = offsets
+        self.masks = masks
+        self.clone_type = clone_type
+        self.threads = threads
+        self.opimage = None
+        
+    def run(self):
+        """
+        Runs the operation
+        
+        :Returns:
+            A single image with every foreground and the background blended together seamlessly
+            
+        :Rtype:
+            `Image`
+        """
+        for image in self.source_images:
+            image.to_rgba()
+        self.opimage = Image(poisson_blend_many([image.data for image in self.source_images], self.dest_image.data,
+                                                self.offsets, masks=self.masks, 
+                                                mixed=self.clone_type == cv2.MIXED_CLONE, threads=self.threads),
+                             dtype=self.dest_image.dtype)
+        return self.opimage
@@ -2,6 +2,7 @@
 Scale operation module
 """
 
+import math
 import scipy.misc
 from .base import Operation
 from ..image import Image
@@ -53,4 +54,35 @@ class ScaleOperation(Operation):
         else:
             size = (self.target_height, self.target_width)
         self.opimage = Image(scipy.misc.imresize(self.image.data, size, self.interp))
-        return self.opimage
\ No newline at end of file
+        self.opimage.content_bounds = scale_bounds(self.image.content_bounds, self.image.shape, self.opimage.shape)
+        return self.opimage
+
+def scale_bounds(bounds, shape, scaled_shape):
+    """
+    Conservatively scales a content bounding box along with the image it belongs to, 
+    allowing for the reach of the resampling filter
+    
+    :Parameters:
+        bounds : `tuple`
+            The bounding box given as (top, left, bottom, right)
+        shape : `tuple`
+            The shape of the image before scaling
+        scaled_shape : `tuple`
+            The shape of the image after scaling
+            
+    :Returns:
+        The bounding box of the same content in the scaled image
+        
+    :Rtype:
+        `tuple`
+    """
+    top, left, bottom, right = bounds
+    if top >= bottom or left >= right:
+        return (0, 0, 0, 0)
+    sy = scaled_shape[0] / float(shape[0])
+    sx = scaled_shape[1] / float(shape[1])
+    # pad by the larger of a pixel or one source pixel's footprint to cover interpolation bleed
+    py, px = int(math.ceil(max(sy, 1))), int(math.ceil(max(sx, 1)))
+    return (max(int(math.floor(top * sy)) - py, 0), max(int(math.floor(left * sx)) - px, 0),
+            min(int(math.ceil(bottom * sy)) + py, scaled_shape[0]), 
+            min(int(math.ceil(right * sx)) + px, scaled_shape[1]))
\ No newline at end of file
@@ -49,4 +49,54 @@ class GenerateShadowOperation(Operation):
         self.opimage = Image(shadow.create_shadow(self.image, self.background, 
                                                   offset=self.offset, scene_description=self.scene_description,
                                                   **self.kwargs))
-        return self.opimage
\ No newline at end of file
+        return self.opimage
+
+class GenerateShadowBatchOperation(Operation):
+    """
+    A batched shadow generation operation which acts on several foregrounds inserted into one background and 
+    generates all of their shadows together into a single shadow layer
+    """
+    def __init__(self, foregrounds, background, offsets=None, scene_description=None, **kwargs):
+        """
+        Initializes the batched shadow generation operation.
+        
+        :Parameters:
+            foregrounds : `list`
+                An iterable of foreground `Image` objects which should each cast a shadow
+            background : `Image`
+                The background image which should receive the shadows
+            offsets : `list`
+                An iterable of (row, column) tuples denoting the offset into the destination image where the 
+                upper-left corner of the corresponding foreground image will begin (once merged). 
+                Default=(0,0) for every foreground
+            scene_description : `SceneDescription`
+                A scene description object for the background scene, containing various descriptors needed
+                to create shadows.  If not given, the scene description is computed on the fly.
+            **kwargs :
+                Any additional keyword arguments to pass through to `inception.image.shadow.create_shadows`
+        """
+        self.images = foregrounds
+        self.background = background
+        self.offsets = offsets
+        self.scene_description = scene_description or self.background.scene_description 
+        self.opimage = None
+        
+        self.kwargs = kwargs
+        
+    def run(self):
+        """
+        Runs the operation
+        
+        :Returns:
+            The single generated shadow layer holding every shadow (RGBA)
+            
+        :Rtype:
+            `Image`
+        """
+        for image in self.images:
+            image.to_rgba()
+        layer, bounds = shadow.create_shadows(self.images, self.background, offsets=self.offsets, 
+                                              scene_description=self.scene_description, return_bounds=True,
+                                              **self.kwargs)
+        self.opimage = Image(layer, content_bounds=bounds)
+        return self.opimage
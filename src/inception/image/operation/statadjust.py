@@ -2,8 +2,10 @@
 Statistics-based image adjustment operations
 """
 
-from ..image import Image
+from ..image import Image, get_content_bounds
 from ..statadjust import adjust 
+from ..statadjust.statadjust import fit_transform
+from ..statadjust.index import BackgroundStatsIndex
 from .base import Operation
 
 class StatAdjustOperation(Operation):
@@ -12,7 +14,8 @@ class StatAdjustOperation(Operation):
     using an adapted version of "Understanding and Improving the Realism of 
     Image Composites" (Xue et al. 2012)
     """
-    def __init__(self, foreground, background, offset=(0,0)):
+    def __init__(self, foreground, background, offset=(0,0), contrast_search='grid', indexed=False, 
+                 cct_lookup=False, fused=False, transform=None, max_samples=None):
         """
         Initializes the statistical adjustment operation.  
         
@@ -24,10 +27,37 @@ class StatAdjustOperation(Operation):
             offset : `tuple`
                 A tuple of (row, column) denoting the offset into the destination image where the upper-left
                 corner of the source image will begin (once merged). Default=(0,0)
+            contrast_search : `basestring`
+                How to search for the contrast curve best matching the background. 'grid' tries a fixed set of
+                curves on the whole foreground, while 'fast' tries the same curves on a subsample of it. 
+                Default='grid'
+            indexed : `bool`
+                If True, reads the background statistics from the index of the background's statistics, 
+                building and caching it on the background first if need be, so that later insertions into 
+                the same background reuse it.  Statistics are then approximated to the nearest tiles and 
+                histogram bins. Default=False
+            cct_lookup : `bool`
+                If True, color temperatures are interpolated from a precomputed table rather than converted
+                exactly, which is several times faster. Default=False
+            fused : `bool`
+                If True, works out the adjustment on the foreground's opaque pixels only and applies it to the
+                whole foreground in one pass, as a `ColorTransform` kept in `transform`. Default=False
+            transform : `ColorTransform`
+                If given, applies this transform, e.g. from an earlier fused operation on a previous frame,
+                rather than measuring either image. Default=None
+            max_samples : `int`
+                If given, estimates the statistics of each image other than local contrast from at most
+                this many pixels spread evenly across it, which bounds the cost for large images. Default=None
         """
         self.image = foreground
         self.background = background
         self.offset = offset
+        self.contrast_search = contrast_search
+        self.indexed = indexed
+        self.cct_lookup = cct_lookup
+        self.fused = fused
+        self.transform = transform
+        self.max_samples = max_samples
         self.opimage = None
         
     def run(self):
@@ -40,5 +70,23 @@ class StatAdjustOperation(Operation):
         :Rtype:
             `Image`
         """
-        self.opimage = Image(adjust(self.image, self.background, self.offset))
+        # the adjustment leaves alpha untouched, so the content stays where it was
+        # the statistics are measured around the content itself, so the bounds need to be tight
+        bounds = get_content_bounds(self.image, tight=True)
+        background_index = None
+        if self.indexed:
+            if self.background.stats_index is None:
+                self.background.stats_index = BackgroundStatsIndex(self.background.data, 
+                                                                   cct_lookup=self.cct_lookup)
+            background_index = self.background.stats_index
+        if self.fused and self.transform is None:
+            self.transform = fit_transform(self.image, self.background, self.offset, bounds=bounds,
+                                           contrast_search=self.contrast_search, 
+                                           background_index=background_index, cct_lookup=self.cct_lookup,
+                                           max_samples=self.max_samples)
+        self.opimage = Image(adjust(self.image, self.background, self.offset, bounds=bounds, 
+                                    contrast_search=self.contrast_search, background_index=background_index,
+                                    cct_lookup=self.cct_lookup, transform=self.transform, 
+                                    max_samples=self.max_samples), 
+                             content_bounds=bounds)
         return self.opimage
\ No newline at end of file
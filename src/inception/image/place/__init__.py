@@ -3,4 +3,4 @@ Package for operations relating to the placement of images
 """
 
 from .randomplace import randomplace
-from .place import normalize_shape
\ No newline at end of file
+from .place import normalize_shape, group_rects, insertion_region
\ No newline at end of file
@@ -2,7 +2,9 @@
 Base placement module
 """
 
+import math
 import numpy
+from ..statadjust.statadjust import background_window
 
 def normalize_shape(image, offset, width, height, dtype=None, expand=False):
     """
@@ -48,4 +50,65 @@ def normalize_shape(image, offset, width, height, dtype=None, expand=False):
     new_image = numpy.zeros((height, width, chans), dtype=dtype)
     
     new_image[before_rows:before_rows+(r1-r0), before_cols:before_cols+(c1-c0), :] = image[r0:r1, c0:c1, :]
-    return new_image    
\ No newline at end of file
+    return new_image
+
+def group_rects(rects):
+    """
+    Groups overlapping rectangles together, such that every rectangle lies within exactly one group
+    and no two groups overlap
+    
+    :Parameters:
+        rects : `list`
+            An iterable of rectangles given as (top, left, bottom, right)
+            
+    :Returns:
+        A list of the bounding rectangles of each group, given as (top, left, bottom, right)
+        
+    :Rtype:
+        `list`
+    """
+    groups = []
+    for rect in rects:
+        # absorb every existing group this one overlaps, which may in turn make it overlap others
+        merged = True
+        while merged:
+            merged = False
+            for group in groups:
+                if group[0] < rect[2] and rect[0] < group[2] and group[1] < rect[3] and rect[1] < group[3]:
+                    groups.remove(group)
+                    rect = (min(group[0], rect[0]), min(group[1], rect[1]), 
+                            max(group[2], rect[2]), max(group[3], rect[3]))
+                    merged = True
+                    break
+        groups.append(rect)
+    return groups
+
+def insertion_region(boundingbox, shape, margin=0):
+    """
+    The region of a background that inserting a foreground into the given bounding box works on: the 
+    bounding box itself, where the foreground is merged, together with the window of background the 
+    foreground is statistically adjusted to match, padded by the given margin, e.g. for the reach of its 
+    shadow.  Only this region of a very large background needs to be loaded, see `Image.from_filepath`
+    
+    :Parameters:
+        boundingbox : `tuple`
+            The bounding box the foreground is inserted into, given as (left, top, right, bottom) as for
+            `magic_insert`
+        shape : `tuple`
+            The shape of the full background, which lazily loaded images know from their header alone
+        margin : `int`
+            The number of pixels to pad the region by on every side. Default=0
+            
+    :Returns:
+        The region, given as (top, left, bottom, right) where bottom and right are exclusive, in whole pixels
+        and clipped to the background
+        
+    :Rtype:
+        `tuple`
+    """
+    left, top, right, bottom = boundingbox
+    window = background_window((top, left), (bottom - top, right - left), shape)
+    return (max(int(math.floor(min(top, window[0]))) - margin, 0), 
+            max(int(math.floor(min(left, window[1]))) - margin, 0),
+            min(int(math.ceil(max(bottom, window[2]))) + margin, shape[0]), 
+            min(int(math.ceil(max(right, window[3]))) + margin, shape[1]))
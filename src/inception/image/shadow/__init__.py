@@ -1,4 +1,4 @@
 """
 Shadow-based image manipulations
 """
-from shadow import create_shadow
\ No newline at end of file
+from shadow import create_shadow, create_shadows
\ No newline at end of file
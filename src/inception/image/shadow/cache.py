@@ -0,0 +1,251 @@
+"""
+Caching of softened shadow silhouettes, so that the same foreground inserted at many positions and
+scales only has its silhouette extracted and softened once
+"""
+
+import hashlib
+import collections
+import cv2
+import numpy
+from .shadow import soften_silhouette
+from ..image import get_content_bounds, as_float
+
+class ShadowTemplate(object):
+    """
+    A softened shadow silhouette stored at a canonical resolution, along with where it lies relative
+    to the foreground it was made from
+    """
+    def __init__(self, sprite, pad, size, bounds):
+        """
+        Initializes the template
+
+        :Parameters:
+            sprite : `numpy.array`
+                The padded and softened single channel shadow opacity at the canonical resolution
+            pad : `int`
+                The number of pixels of padding around the silhouette in the sprite
+            size : `tuple`
+                The (rows, columns) size of the unpadded silhouette in the sprite
+            bounds : `tuple`
+                The tight bounding box of the silhouette as fractions of the foreground's dimensions,
+                given as (top, left, bottom, right) where bottom and right are exclusive
+        """
+        self.sprite = sprite
+        self.pad = pad
+        self.size = size
+        self.bounds = bounds
+
+    @property
+    def nbytes(self):
+        """
+        The memory used by this template, in bytes
+
+        :Rtype:
+            `int`
+        """
+        return self.sprite.nbytes
+
+    def place(self, shape, offset):
+        """
+        Places the template for a foreground of the given shape at the given offset
+
+        :Parameters:
+            shape : `tuple`
+                The shape of the foreground image casting the shadow
+            offset : `tuple`
+                A tuple of (row, column) denoting the offset into the destination image where the upper-left
+                corner of the foreground image will begin (once merged)
+
+        :Returns:
+            A tuple of (placement, bounds) where placement is the 3x3 transformation from sprite pixel coordinates
+            into the destination image and bounds is the bounding box of the foreground in the destination image
+            given as (xleft, xright, ybottom, ytop)
+        """
+        rows, cols = shape[:2]
+        top = offset[0] + int(round(self.bounds[0] * rows))
+        left = offset[1] + int(round(self.bounds[1] * cols))
+        bottom = offset[0] + max(int(round(self.bounds[2] * rows)), 1)
+        right = offset[1] + max(int(round(self.bounds[3] * cols)), 1)
+        bottom, right = max(bottom, top + 1), max(right, left + 1)
+
+        # align pixel centers of the silhouette to those of the foreground bounding box
+        scale_y = (bottom - top) / float(self.size[0])
+        scale_x = (right - left) / float(self.size[1])
+        placement = numpy.array([[scale_x, 0, left + (.5 - self.pad) * scale_x - .5],
+                                 [0, scale_y, top + (.5 - self.pad) * scale_y - .5],
+                                 [0, 0, 1]], dtype='float64')
+        return (placement, (left, right - 1, bottom - 1, top))
+
+class ShadowTemplateCache(object):
+    """
+    A least recently used cache of `ShadowTemplate` objects, keyed by the foreground and the
+    softening parameters, and bounded by a memory budget
+    """
+    def __init__(self, max_bytes=64*1024*1024, resolution=400):
+        """
+        Initializes the cache
+
+        :Parameters:
+            max_bytes : `int`
+                The memory budget for all cached templates, in bytes. Least recently used templates are evicted
+                once the budget is exceeded. Default=64MB
+            resolution : `int`
+                The canonical size in pixels of the larger dimension of each silhouette.  Note that shadow blur
+                is specified relative to a ~400px wide object. Default=400
+        """
+        self.max_bytes = max_bytes
+        self.resolution = resolution
+        self.nbytes = 0
+        self._templates = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __contains__(self, key):
+        return key in self._templates
+
+    def clear(self):
+        """
+        Evicts every template from the cache
+        """
+        self._templates.clear()
+        self.nbytes = 0
+
+    def get(self, key):
+        """
+        Gets the template with the given key, marking it as most recently used
+
+        :Parameters:
+            key : `tuple`
+                The cache key
+
+        :Returns:
+            The cached template or None if not cached
+
+        :Rtype:
+            `ShadowTemplate`
+        """
+        template = self._templates.pop(key, None)
+        if template is not None:
+            self._templates[key] = template
+        return template
+
+    def put(self, key, template):
+        """
+        Caches the given template, evicting the least recently used templates as needed to stay in budget.
+        Templates larger than the whole budget are not cached
+
+        :Parameters:
+            key : `tuple`
+                The cache key
+            template : `ShadowTemplate`
+                The template to cache
+        """
+        old = self._templates.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        if template.nbytes > self.max_bytes:
+            return
+
+        self._templates[key] = template
+        self.nbytes += template.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._templates.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def template(self, foreground, blur, opacity, segments, skip_soften=False, key=None):
+        """
+        Gets the softened template for the given foreground, creating and caching it if need be
+
+        :Parameters:
+            foreground : `numpy.array`
+                The RGBA foreground image which should cast a shadow
+            blur : `float`
+                The amount of gaussian blur to apply to soften the shadow, on average.
+            opacity : `float`
+                The average baseline opacity for the softened shadow [0,1]
+            segments : `int`
+                The number of unique slices to use when applying spatially varying gaussian blur
+            skip_soften : `bool`
+                If True, do not perform any shadow softening. Default=False
+            key : `object`
+                A hashable identifier for the foreground, e.g. see `foreground_key`.  Allows the same foreground
+                at different scales to share a template.  If not given, the foreground's alpha is hashed.
+
+        :Returns:
+            The template or None if the foreground is entirely transparent
+
+        :Rtype:
+            `ShadowTemplate`
+        """
+        if key is None:
+            key = foreground_key(foreground)
+        key = (key, blur, opacity, segments, skip_soften, self.resolution)
+
+        template = self.get(key)
+        if template is None:
+            template = self.create(foreground, blur, opacity, segments, skip_soften)
+            if template is not None:
+                self.put(key, template)
+        return template
+
+    def create(self, foreground, blur, opacity, segments, skip_soften=False):
+        """
+        Creates (without caching) the softened template for the given foreground
+
+        :Parameters:
+            foreground : `numpy.array`
+                The RGBA foreground image which should cast a shadow
+            blur : `float`
+                The amount of gaussian blur to apply to soften the shadow, on average.
+            opacity : `float`
+                The average baseline opacity for the softened shadow [0,1]
+            segments : `int`
+                The number of unique slices to use when applying spatially varying gaussian blur
+            skip_soften : `bool`
+                If True, do not perform any shadow softening. Default=False
+
+        :Returns:
+            The template or None if the foreground is entirely transparent
+
+        :Rtype:
+            `ShadowTemplate`
+        """
+        top, left, bottom, right = get_content_bounds(foreground, tight=True)
+        if top >= bottom:
+            return None
+        rows, cols = foreground.shape[:2]
+
+        # resample the silhouette to the canonical resolution
+        # the blur is relative to the silhouette width so softening commutes with the resampling
+        silhouette = numpy.asarray(as_float(foreground[top:bottom, left:right, 3], 'float32'), dtype='float32')
+        scale = self.resolution / float(max(bottom - top, right - left))
+        size = (max(int(round((bottom - top) * scale)), 1), max(int(round((right - left) * scale)), 1))
+        interp = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        silhouette = cv2.resize(silhouette, (size[1], size[0]), interpolation=interp)
+
+        sprite, pad = soften_silhouette(silhouette, blur, opacity, segments, skip_soften)
+        bounds = (top / float(rows), left / float(cols), bottom / float(rows), right / float(cols))
+        return ShadowTemplate(sprite, pad, size, bounds)
+
+def foreground_key(foreground):
+    """
+    Computes a cache key identifying the silhouette of the given foreground
+
+    :Parameters:
+        foreground : `numpy.array`
+            The RGBA foreground image
+
+    :Returns:
+        A hash of the foreground's alpha channel
+
+    :Rtype:
+        `basestring`
+    """
+    alpha = numpy.ascontiguousarray(foreground[..., 3])
+    digest = hashlib.sha1(alpha.view('uint8'))
+    digest.update(str(alpha.shape) + str(alpha.dtype))
+    return digest.hexdigest()
+
+# the shared cache used when shadow generation is simply asked to use a template cache
+default_template_cache = ShadowTemplateCache()
@@ -7,9 +7,10 @@ import scipy.ndimage
 import numpy, math
 from ..scene.scene import estimate_scene_description
 from ..place import normalize_shape
+from ..image import get_content_bounds, float_dtype, as_float
 
 def create_shadow(foreground, background, blur=15, opacity=.45, segments=10, offset=(0,0), scene_description=None,
-                  skip_soften=False):
+                  skip_soften=False, template_cache=None, template_key=None):
     """
     Generates a feasible shadow for the foreground image to cast on the background image
     
@@ -32,6 +33,13 @@ def create_shadow(foreground, background, blur=15, opacity=.45, segments=10, off
             to create shadows.  If not given, the scene description is computed on the fly.
         skip_soften : `bool`
             If True, do not perform any shadow softening. Default=False
+        template_cache : `ShadowTemplateCache` or `bool`
+            If given, the softened silhouette is looked up in (or added to) this cache of shadow templates
+            so that only a single warp of the cached template is needed. True uses the shared
+            `inception.image.shadow.cache.default_template_cache`. Default=None
+        template_key : `object`
+            A hashable identifier for the foreground to use as the template cache key, so that the same foreground
+            at different scales shares a template.  If not given, the foreground's alpha is hashed. Default=None
             
     :Returns:
         The generated shadow image, of same dimensions as the dest_image
@@ -39,34 +47,240 @@ def create_shadow(foreground, background, blur=15, opacity=.45, segments=10, off
     :Rtype:
         `Image`
     """
-    if scene_description is None: 
+    # a single shadow is cast exactly as one of many, so that both place it with the same geometry
+    return create_shadows([foreground], background, [offset], blur=blur, opacity=opacity, segments=segments, 
+                          scene_description=scene_description, skip_soften=skip_soften, 
+                          template_cache=template_cache, template_keys=[template_key])
+
+def create_shadows(foregrounds, background, offsets=None, blur=15, opacity=.45, segments=10, scene_description=None,
+                   skip_soften=False, template_cache=None, template_keys=None, return_bounds=False):
+    """
+    Generates feasible shadows for several foreground images cast onto the same background image,
+    accumulated into a single shadow layer.
+    The scene geometry is shared between all foregrounds and each shadow is softened and warped
+    only within its own region, rather than over a full-size copy of the background
+
+    :Parameters:
+        foregrounds : `list`
+            An iterable of RGBA foreground images which should each cast a shadow
+        background : `Image`
+            The background image which should receive the shadows
+        offsets : `list`
+            An iterable of (row, column) tuples denoting the offset into the destination image where the upper-left
+            corner of the corresponding foreground image will begin (once merged). Default=(0,0) for every foreground
+        blur : `float`
+            The amount of gaussian blur to apply to soften each shadow, on average.
+        opacity : `float`
+            The average baseline opacity for the softened shadows [0,1]
+        segments : `int`
+            The number of unique slices to use when applying spatially varying gaussian blur
+        scene_description : `SceneDescription`
+            A scene description object for the background scene, containing various descriptors needed
+            to create shadows.  If not given, the scene description is computed on the fly.
+        skip_soften : `bool`
+            If True, do not perform any shadow softening. Default=False
+        template_cache : `ShadowTemplateCache` or `bool`
+            If given, softened silhouettes are looked up in (or added to) this cache of shadow templates.
+            True uses the shared `inception.image.shadow.cache.default_template_cache`. Default=None
+        template_keys : `list`
+            An iterable of hashable identifiers for each foreground to use as template cache keys. 
+            Foregrounds without a key have their alpha hashed instead. Default=None
+        return_bounds : `bool`
+            If True, also returns the bounding box enclosing every shadow in the layer. Default=False
+
+    :Returns:
+        A single RGBA shadow layer containing every shadow, of same dimensions as the dest_image.
+        If return_bounds=True, returns a tuple of (layer, bounds) where bounds is given as (top, left, bottom, right)
+    """
+    scene_description = get_scene_description(background, scene_description)
+    if offsets is None:
+        offsets = [(0,0)] * len(foregrounds)
+    if template_keys is None:
+        template_keys = [None] * len(foregrounds)
+    if template_cache is True:
+        from .cache import default_template_cache
+        template_cache = default_template_cache
+    elif template_cache is False:
+        template_cache = None
+
+    # soften each silhouette in its own padded sprite (or reuse its cached template)
+    # keeping track of how each sprite maps into the background
+    sprites = []
+    for foreground, offset, key in zip(foregrounds, offsets, template_keys):
+        if template_cache is not None:
+            template = template_cache.template(foreground, blur, opacity, segments, skip_soften, key=key)
+            if template is not None:
+                placement, bounds = template.place(foreground.shape, offset)
+                sprites.append((template.sprite, placement, bounds))
+        else:
+            sprite = shadow_sprite(foreground, offset, blur, opacity, segments, skip_soften)
+            if sprite is not None:
+                alpha, origin, bounds = sprite
+                sprites.append((alpha, translation(origin), bounds))
+
+    homographies = compute_homographies(background, scene_description, [sprite[2] for sprite in sprites])
+
+    shadow = numpy.zeros(background.shape[:2] + (4,), dtype=float_dtype(background.dtype))
+    top, left, bottom, right = shadow.shape[0], shadow.shape[1], 0, 0
+    for (alpha, placement, bounds), H in zip(sprites, homographies):
+        region = warp_shadow_into(shadow[..., 3], alpha, H.dot(placement))
+        if region is not None:
+            top, left = min(top, region[0]), min(left, region[1])
+            bottom, right = max(bottom, region[2]), max(right, region[3])
+    
+    if return_bounds:
+        return (shadow, (top, left, bottom, right) if top < bottom else (0, 0, 0, 0))
+    return shadow
+
+def get_scene_description(background, scene_description=None):
+    """
+    Gets the scene description to use for shadowing on the given background, estimating it if need be
+
+    :Parameters:
+        background : `Image`
+            The background image which should receive the shadow
+        scene_description : `SceneDescription`
+            An explicit scene description for the background scene, which takes precedence if given
+
+    :Returns:
+        The scene description for the background
+    """
+    if scene_description is None:
         if hasattr(background, 'scene_description') and background.scene_description is not None:
             scene_description = background.scene_description
         else:
             scene_description = estimate_scene_description(background)
-    
-    # normalize foreground size onto background (expanding background if necessary)
-    foreground = normalize_foreground(foreground, background, offset)
-    
-    # create a black version of the foreground
-    shadow = blacken_image(foreground)
-    
-    # find the bottom left-most part of the foreground, assumed to be touching the ground
-    ys_top = shadow[...,3].nonzero()[0].min()
-    xs_left = shadow[...,3].nonzero()[1].min()
-    ys_bottom = shadow[...,3].nonzero()[0].max()
-    xs_right = shadow[...,3].nonzero()[1].max()
-    
+    return scene_description
+
+def shadow_sprite(foreground, offset, blur, opacity, segments, skip_soften=False):
+    """
+    Creates the softened, unwarped shadow silhouette of the given foreground, cropped tightly to the
+    foreground and padded just enough to hold the softening
+
+    :Parameters:
+        foreground : `numpy.array`
+            The RGBA foreground image which should cast a shadow
+        offset : `tuple`
+            A tuple of (row, column) denoting the offset into the destination image where the upper-left
+            corner of the foreground image will begin (once merged)
+        blur : `float`
+            The amount of gaussian blur to apply to soften the shadow, on average.
+        opacity : `float`
+            The average baseline opacity for the softened shadow [0,1]
+        segments : `int`
+            The number of unique slices to use when applying spatially varying gaussian blur
+        skip_soften : `bool`
+            If True, do not perform any shadow softening. Default=False
+
+    :Returns:
+        A tuple of (alpha, origin, bounds) where alpha is the shadow opacity of the sprite, origin is the
+        (row, column) of the sprite's upper-left corner in the destination image and bounds is the tight
+        bounding box of the foreground in the destination image given as (xleft, xright, ybottom, ytop),
+        or None if the foreground is entirely transparent
+    """
+    top, left, bottom, right = get_content_bounds(foreground, tight=True)
+    if top >= bottom:
+        return None
+    ys_top, ys_bottom = top, bottom - 1
+    xs_left, xs_right = left, right - 1
+
+    # soften the opacity in floating point, whatever the representation of the foreground
+    sprite, pad = soften_silhouette(as_float(foreground[top:bottom, left:right, 3]), blur, opacity, segments, 
+                                    skip_soften)
+
+    origin = (offset[0] + ys_top - pad, offset[1] + xs_left - pad)
+    bounds = (offset[1] + xs_left, offset[1] + xs_right, offset[0] + ys_bottom, offset[0] + ys_top)
+    return (sprite, origin, bounds)
+
+def soften_silhouette(silhouette, blur, opacity, segments, skip_soften=False):
+    """
+    Pads the given tightly cropped shadow silhouette just enough to hold its softening and softens it
+
+    :Parameters:
+        silhouette : `numpy.array`
+            The single channel shadow opacity, cropped tightly to the foreground object
+        blur : `float`
+            The amount of gaussian blur to apply to soften the shadow, on average.
+        opacity : `float`
+            The average baseline opacity for the softened shadow [0,1]
+        segments : `int`
+            The number of unique slices to use when applying spatially varying gaussian blur
+        skip_soften : `bool`
+            If True, do not perform any shadow softening. Default=False
+
+    :Returns:
+        A tuple of (sprite, pad) where sprite is the padded and softened shadow opacity and pad
+        is the number of pixels of padding added to each side of the silhouette
+    """
+    height, width = silhouette.shape[:2]
+
+    # pad by the furthest any of the blurs in temper_alpha can spread the silhouette
+    pad = 0
     if not skip_soften:
-        shadow = temper_shadow(shadow, blur, opacity, segments, (xs_left, xs_right, ys_bottom, ys_top))      
-    
-    H = compute_homography(background, scene_description, xs_left, xs_right, ys_bottom, ys_top)
-    shadow = cv2.warpPerspective(shadow,H,(shadow.shape[1],shadow.shape[0]))
-    
-    # finally, crop shadow to fit into background
-    shadow = normalize_foreground(shadow, background, (min(offset[0], 0), min(offset[1], 0)), expand=False)
+        scaled_blur = blur * float(width - 1) / 400
+        pad = int(math.ceil(4.0 * scaled_blur)) + int(4.0 * scaled_blur + .5) + 2
+
+    sprite = numpy.zeros((height + 2 * pad, width + 2 * pad), dtype=silhouette.dtype)
+    sprite[pad:pad+height, pad:pad+width] = silhouette
+
+    if not skip_soften:
+        temper_alpha(sprite, blur, opacity, segments, (pad, pad + width - 1, pad + height - 1, pad))
+    return (sprite, pad)
+
+def warp_shadow_into(layer, sprite, H):
+    """
+    Warps the given shadow sprite by the given homography and composites it over the given shadow opacity layer,
+    in place. Only the region of the layer covered by the warped sprite is touched
+
+    :Parameters:
+        layer : `numpy.array`
+            The single channel shadow opacity layer to accumulate into
+        sprite : `numpy.array`
+            The single channel shadow opacity sprite
+        H : `numpy.array`
+            The 3x3 perspective transformation from sprite pixel coordinates to its shadow in layer space
+            
+    :Returns:
+        The region of the layer that was touched, given as (top, left, bottom, right), or None if the 
+        shadow falls entirely outside the layer
+    """
+    rows, cols = layer.shape[:2]
+
+    # find the destination region from the warped sprite corners
+    # if any corner falls behind the camera, the projection is unbounded so fall back to the whole layer
+    corners = numpy.array([[-1, sprite.shape[1], -1, sprite.shape[1]],
+                           [-1, -1, sprite.shape[0], sprite.shape[0]],
+                           [1, 1, 1, 1]], dtype='float64')
+    warped = H.dot(corners)
+    if (warped[2] <= 0).any():
+        r0, r1, c0, c1 = 0, rows, 0, cols
+    else:
+        xs = warped[0] / warped[2]
+        ys = warped[1] / warped[2]
+        c0, c1 = max(int(math.floor(xs.min())) - 1, 0), min(int(math.ceil(xs.max())) + 2, cols)
+        r0, r1 = max(int(math.floor(ys.min())) - 1, 0), min(int(math.ceil(ys.max())) + 2, rows)
+        if r0 >= r1 or c0 >= c1:
+            return None
+
+    warped = cv2.warpPerspective(sprite, translation((-r0, -c0)).dot(H), (c1 - c0, r1 - r0))
+
+    # alpha over alpha: a_shadow + a_layer * (1 - a_shadow)
+    region = layer[r0:r1, c0:c1]
+    region += warped * (1 - region)
+    return (r0, c0, r1, c1)
+
+def translation(offset):
+    """
+    Gets the 3x3 transformation translating image space by the given offset
     
-    return shadow
+    :Parameters:
+        offset : `tuple`
+            The (row, column) offset to translate by
+            
+    :Returns:
+        The 3x3 translation matrix
+    """
+    return numpy.array([[1, 0, offset[1]], [0, 1, offset[0]], [0, 0, 1]], dtype='float64')
 
 def temper_shadow(shadow, blur, opacity, segments, bounds):
     """
@@ -86,6 +300,29 @@ def temper_shadow(shadow, blur, opacity, segments, bounds):
     :Returns:
         The tempered shadow image
     """
+    temper_alpha(shadow[..., 3], blur, opacity, segments, bounds)
+    return shadow
+
+def temper_alpha(alpha, blur, opacity, segments, bounds):
+    """
+    Softens the given single channel shadow opacity, in place
+    
+    :Parameters:
+        alpha : `numpy.array`
+            The shadow opacity to soften
+        blur : `float`
+            The amount of gaussian blur to apply to soften the shadow, on average. 
+        opacity : `float`
+            The average baseline opacity for the softened shadow [0,1]
+        segments : `int`
+            The number of unique slices to use when applying spatially varying gaussian blur
+        bounds : `tuple`
+            The tight axis-aligned bounding box around the unwarped shadow given as
+            (xleft, xright, ybottom, ytop)
+            
+    :Returns:
+        The tempered shadow opacity
+    """
     (xs_left, xs_right, ys_bottom, ys_top) = bounds
     # qualitative blur amount should be independent of the size
     # use ~400px as the baseline and compare to image width
@@ -99,7 +336,7 @@ def temper_shadow(shadow, blur, opacity, segments, bounds):
     def smoothstep(minval, maxval,t):
         t = t*t*(3-2*t)
         return minval + (maxval - minval)*t
-    opacity_mult = numpy.zeros_like(shadow[ys_top:ys_bottom+1, xs_left:xs_right+1, 3])
+    opacity_mult = numpy.zeros_like(alpha[ys_top:ys_bottom+1, xs_left:xs_right+1])
     height = ys_bottom - ys_top + 1
     hinge = int(height / 6.0)
     step1 = numpy.linspace(0.0, 1.0, num=height-hinge)
@@ -108,7 +345,7 @@ def temper_shadow(shadow, blur, opacity, segments, bounds):
     opacity_mult[height-hinge:, :] = numpy.tile(numpy.reshape(step2, (hinge,1)), (1, xs_right-xs_left+1)) 
     opacity_mult[:height-hinge, :] = smoothstep(minopacity, maxopacity, opacity_mult[:height-hinge, :])
     opacity_mult[height-hinge:, :] = smoothstep(minopacity2, maxopacity, opacity_mult[height-hinge:, :])
-    shadow[ys_top:ys_bottom+1, xs_left:xs_right+1, 3] = shadow[ys_top:ys_bottom+1, xs_left:xs_right+1, 3] * opacity_mult
+    alpha[ys_top:ys_bottom+1, xs_left:xs_right+1] = alpha[ys_top:ys_bottom+1, xs_left:xs_right+1] * opacity_mult
     
     # apply numerous overlapping slices of blurring
     slice_size = math.ceil((ys_bottom - ys_top)/segments)
@@ -122,10 +359,10 @@ def temper_shadow(shadow, blur, opacity, segments, bounds):
         c1 = xs_right+1 + int(math.ceil(blur_amount))
         r0 = max(ys_top+(segments-i-1)*slice_size - slice_size - int(math.ceil(blur_amount)), 0)
         r1 = ys_top+(segments-i)*slice_size+ 1 + int(math.ceil(blur_amount))
-        shadow[r0:r1, c0:c1, 3] = scipy.ndimage.gaussian_filter(shadow[r0:r1, c0:c1, 3], sigma=blur_amount)
+        alpha[r0:r1, c0:c1] = scipy.ndimage.gaussian_filter(alpha[r0:r1, c0:c1], sigma=blur_amount)
     # apply a final blur to help hide the seams
-    shadow[..., 3] = scipy.ndimage.gaussian_filter(shadow[..., 3], sigma=blur)
-    return shadow
+    alpha[...] = scipy.ndimage.gaussian_filter(alpha, sigma=blur)
+    return alpha
     
 def compute_homography(image, scene_description, x0, x1, y0, y1):
     """
@@ -148,11 +385,33 @@ def compute_homography(image, scene_description, x0, x1, y0, y1):
     :Returns:
         The 3x3 perspective transformation matrix needed to warp the foreground to its shadow
     """
+    return compute_homographies(image, scene_description, [(x0, x1, y0, y1)])[0]
+
+def compute_homographies(image, scene_description, bounds):
+    """
+    Computes the perspective transformations in image space to warp each of several foreground objects
+    to their shadows.  The scene geometry is only computed once and shared between all of the objects
+    
+    :Parameters:
+        image : `numpy.array`
+            The background image
+        scene_description : `SceneDescription`
+            An estimated scene descripton for the background image
+        bounds : `list`
+            An iterable of the tightest bounding coordinates for each foreground object, given as
+            (xleft, xright, ybottom, ytop)
+            
+    :Returns:
+        A list of the 3x3 perspective transformation matrices needed to warp each foreground to its shadow
+    """
+    if not bounds:
+        return []
+    
     # create the correct transformation and apply it    
     # first, use the scene description to get image space to world space transformation
-    # origin is set to the bottom-left corner of the foreground object
+    # the rotation does not depend on the origin, so can be shared between all objects
     cam_to_im = scene_description.camera_matrix
-    world_to_cam, T = scene_description.get_world_to_camera_transformation(origin=(x0, y0))
+    world_to_cam, _ = scene_description.get_world_to_camera_transformation()
     cam_to_world = numpy.linalg.inv(world_to_cam)
     world_to_im = cam_to_im.dot(world_to_cam)
     im_to_world = cam_to_world.dot(numpy.linalg.inv(cam_to_im))
@@ -177,57 +436,53 @@ def compute_homography(image, scene_description, x0, x1, y0, y1):
     cam_index = 0 if ((up_index == 1 and right_index == 2) or (up_index == 2 and right_index == 1)) else \
                 (1 if ((up_index == 0 and right_index == 2) or (up_index == 2 and right_index == 0)) else 2)
     
-    # get height of object in world space
-    object_top = im_to_world.dot(numpy.array([x0,y1,1]))
-    height = abs(object_top[up_index] - T[up_index])
-
-    # TODO: would be nice to parametrize the desired light position in the absence of automatic light estimation
-    # for now, just pick an arbitrary position
-    # set the light object 1 height above the camera, partway between the object and the camera
-    cam_to_obj = T
-    w = .2 # how far along the line from camera to object plane [0,1]
-    h = 1.6 # how many units in foreground hight space the light is above the camera
-    # make the light a bit to the side to show off the shadow a bit more
-    light_pos = numpy.zeros((4,), dtype='float64')
-    if right_flipped:
-        light_pos[right_index] = cam_to_obj[right_index] * w + height/4
-    else:
-        light_pos[right_index] = cam_to_obj[right_index] * w - height/4
-    light_pos[cam_index] = cam_to_obj[cam_index] * w
-    light_pos[up_index] = h*height if not up_flipped else - h*height 
-    light_pos[3] = 1
-
-    # create a matrix to project the planar polygon onto the ground plane (y=foreground_pos[1])
-    # from the light 
-    # e.g. see http://math.stackexchange.com/questions/320527/projecting-a-point-on-a-plane-through-a-matrix
-    plane = numpy.zeros((4,))
-    plane[up_index] = 1
-    plane[3] = -T[up_index] # assumes bottom left point of foreground plane touches ground
-    lambd = numpy.dot(plane, light_pos)
-    l = light_pos
-    f = plane
-    world_to_ground = numpy.array([[lambd - f[0]*l[0], -f[1]*l[0], -f[2]*l[0], -f[3]*l[0]],
-                                   [-f[0]*l[1], lambd - f[1]*l[1], -f[2]*l[1], -f[3]*l[1]],
-                                   [-f[0]*l[2], -f[1]*l[2], lambd - f[2]*l[2], -f[3]*l[2]],
-                                   [-f[0]*l[3], -f[1]*l[3], -f[2]*l[3], lambd - f[3]*l[3]]])
+    homographies = []
+    for (x0, x1, y0, y1) in bounds:
+        # origin is set to the bottom-left corner of the foreground object
+        _, T = scene_description.get_world_to_camera_transformation(origin=(x0, y0))
+        
+        # get height of object in world space
+        object_top = im_to_world.dot(numpy.array([x0,y1,1]))
+        height = abs(object_top[up_index] - T[up_index])
     
-    # finally, just project the 4 corners of the object in world space onto the ground plane and then
-    # convert those 4 points back into image space
-    # this gives us the correspondences needed to get the perspective transformation in image space
-    im_pts = numpy.array([(x0,y0),(x0,y1),(x1,y0),(x1,y1)],dtype='float64')
-    im_pts_hom = cv2.convertPointsToHomogeneous(im_pts).squeeze()
-    im_pts_ground = []
+        # TODO: would be nice to parametrize the desired light position in the absence of automatic light estimation
+        # for now, just pick an arbitrary position
+        # set the light object 1 height above the camera, partway between the object and the camera
+        cam_to_obj = T
+        w = .2 # how far along the line from camera to object plane [0,1]
+        h = 1.6 # how many units in foreground hight space the light is above the camera
+        # make the light a bit to the side to show off the shadow a bit more
+        light_pos = numpy.zeros((4,), dtype='float64')
+        if right_flipped:
+            light_pos[right_index] = cam_to_obj[right_index] * w + height/4
+        else:
+            light_pos[right_index] = cam_to_obj[right_index] * w - height/4
+        light_pos[cam_index] = cam_to_obj[cam_index] * w
+        light_pos[up_index] = h*height if not up_flipped else - h*height 
+        light_pos[3] = 1
     
-    for im_pt in im_pts_hom:
-        pt_world = im_to_world.dot(im_pt)
-        pt_world = numpy.array([pt_world[0], pt_world[1], pt_world[2], 1])
-        ground_world = world_to_ground.dot(pt_world)
+        # create a matrix to project the planar polygon onto the ground plane (y=foreground_pos[1])
+        # from the light 
+        # e.g. see http://math.stackexchange.com/questions/320527/projecting-a-point-on-a-plane-through-a-matrix
+        plane = numpy.zeros((4,))
+        plane[up_index] = 1
+        plane[3] = -T[up_index] # assumes bottom left point of foreground plane touches ground
+        lambd = numpy.dot(plane, light_pos)
+        world_to_ground = lambd * numpy.identity(4) - numpy.outer(light_pos, plane)
+        
+        # finally, just project the 4 corners of the object in world space onto the ground plane and then
+        # convert those 4 points back into image space
+        # this gives us the correspondences needed to get the perspective transformation in image space
+        im_pts = numpy.array([(x0,y0),(x0,y1),(x1,y0),(x1,y1)],dtype='float64')
+        pts_world = numpy.ones((4, 4))
+        pts_world[:3] = im_to_world.dot(numpy.vstack((im_pts.T, numpy.ones((1, 4)))))
+        ground_world = world_to_ground.dot(pts_world)
         ground_im = world_to_im.dot(ground_world[:3])
-        im_pts_ground.append(ground_im)
-
-    # perspective divide
-    im_pts_ground = cv2.convertPointsFromHomogeneous(numpy.array(im_pts_ground)).squeeze()
-    return cv2.getPerspectiveTransform(im_pts.astype('float32'), im_pts_ground.astype('float32'))    
+        
+        # perspective divide
+        im_pts_ground = (ground_im[:2] / ground_im[2]).T
+        homographies.append(cv2.getPerspectiveTransform(im_pts.astype('float32'), im_pts_ground.astype('float32')))
+    return homographies
 
 def blacken_image(image):
     """
@@ -262,8 +517,9 @@ def normalize_foreground(foreground, background, offset, expand=True):
             a normal merge
             
     :Returns:
-        A copy of the foreground, normalized relative to the background
+        A floating point copy of the foreground, normalized relative to the background
     """
-    return normalize_shape(foreground, offset, background.shape[1], background.shape[0], 
-                           dtype=background.dtype, expand=expand)
+    dtype = float_dtype(background.dtype)
+    return normalize_shape(as_float(foreground, dtype), offset, background.shape[1], background.shape[0], 
+                           dtype=dtype, expand=expand)
 
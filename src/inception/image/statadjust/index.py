@@ -0,0 +1,230 @@
+"""
+A precomputed index of the statistics of a background image, so that the zone statistics of the background
+around any insertion window can be read off without touching its pixels.  This lets the same background
+analysis be reused across many insertions into one scene
+"""
+
+import math
+import numpy
+from .view import ColorSpaceView
+from .statadjust import statfuncs, getluminance
+from .statadjust import top_ratio, bottom_ratio, highlight_ratio, undershadow_thres, overhighlight_thres
+from .statadjust import _hist_threshold
+from ..image import as_float
+
+class BackgroundStatsIndex(object):
+    """
+    Tiled histograms of each image statistic used for statistical image adjustment, stored as summed-area
+    tables over the tiles so that the histogram of any tile-aligned window is found in O(bins) time.
+    Windows are snapped to the nearest tile boundaries.  Bins hold equal shares of the background's values, 
+    with finer bins toward either end where the high and low zones lie, and zone means are found to within
+    the range of the bin they end in.  Local contrast is measured over the whole background, rather than just over the window, so it differs
+    from measuring the cropped window near the window's edges
+    """
+    def __init__(self, background, tile=64, bins=128, cct_lookup=False):
+        """
+        Builds the index for the given background
+
+        :Parameters:
+            background : `numpy.array`
+                The sRGB background image
+            tile : `int`
+                The size in pixels of the square tiles that windows are snapped to. Default=64
+            bins : `int`
+                The most histogram bins to use for each statistic. Default=128
+            cct_lookup : `bool`
+                If True, color temperatures are interpolated from a precomputed table rather than converted
+                exactly, see `CCTLookupTable`. Default=False
+        """
+        self.tile = tile
+        self.bins = bins
+        self.shape = background.shape[:2]
+
+        image = ColorSpaceView(as_float(background[..., :3]), linear=False, cct_lookup=cct_lookup)
+        luminance = getluminance(image)
+        exposed = (luminance >= undershadow_thres) & (luminance < overhighlight_thres)
+
+        self._tables = {}
+        for statname, config in statfuncs.items():
+            measure = config['get'](image)
+            valid = exposed.copy() if config['filter_exposure'] else numpy.ones(measure.shape, dtype=bool)
+            if config.get('low_threshold'):
+                valid &= (measure > config['low_threshold'])
+            if config.get('high_threshold'):
+                valid &= (measure < config['high_threshold'])
+            self._tables[statname] = _HistogramTable(measure, valid, tile, bins)
+
+        # the brightness threshold of the extra zone is taken from the luminance of every pixel not overexposed
+        if any(config['different_brightness'] for config in statfuncs.values()):
+            self._tables[None] = _HistogramTable(luminance, luminance < overhighlight_thres, tile, bins)
+
+    @property
+    def nbytes(self):
+        """
+        The memory used by this index, in bytes
+
+        :Rtype:
+            `int`
+        """
+        return sum(table.nbytes for table in self._tables.values())
+
+    def stats(self, statname, window):
+        """
+        Computes the zone statistics of the background within the given window, as `compute_stats` would
+        for the cropped background
+
+        :Parameters:
+            statname : `basestring`
+                The name of the image statistic, (e.g. luminance, cct, saturation, contrast)
+            window : `tuple`
+                The region of the background to measure, given as (top, left, bottom, right)
+                where bottom and right are exclusive
+
+        :Returns:
+            A tuple of (low, medium, high) metric values for the window, or (low, medium, high, extra),
+            if the statistic is configured to allow 'different_brightness'
+
+        :Rtype:
+            `tuple`
+        """
+        config = statfuncs[statname]
+        table = self._tables[statname]
+        counts, sums = table.query(self._snap(window))
+
+        # pad out with values at the low threshold when too few, like compute_stats
+        size = counts.sum()
+        fill = config.get('lower_fill_threshold')
+        if fill and size < fill:
+            counts = numpy.concatenate(([fill - size], counts))
+            sums = numpy.concatenate(([(fill - size) * config['low_threshold']], sums))
+            size = fill
+
+        high_count = int(math.floor(top_ratio * size))
+        low_count = size - int(math.floor(bottom_ratio * size))
+        measure_mean_high = _smallest_mean(counts[::-1], sums[::-1], high_count)
+        measure_mean_low = _smallest_mean(counts, sums, low_count)
+        measure_mean_medium = sums.sum() / size if size else float('nan')
+
+        # if we don't have enough pixels above/below threshold, ignore the statistic
+        if high_count <= _hist_threshold:
+            measure_mean_high = None
+        if low_count <= _hist_threshold:
+            measure_mean_low = None
+
+        if not config['different_brightness']:
+            return (measure_mean_low, measure_mean_medium, measure_mean_high)
+
+        # the extra zone holds the values between the bright threshold and overexposure
+        lum_counts, _ = self._tables[None].query(self._snap(window))
+        bright = self._tables[None].value(lum_counts, int(math.floor(highlight_ratio * lum_counts.sum())))
+        extra_count, extra_sum = table.between(counts[-table.bins:], sums[-table.bins:],
+                                               bright, overhighlight_thres)
+        measure_mean_extra = None
+        if extra_count > _hist_threshold:
+            measure_mean_extra = extra_sum / extra_count
+        return (measure_mean_low, measure_mean_medium, measure_mean_high, measure_mean_extra)
+
+    def _snap(self, window):
+        """
+        Snaps the window in pixels to the nearest non-empty window in tiles
+        """
+        tiles = (int(math.ceil(self.shape[0] / float(self.tile))), int(math.ceil(self.shape[1] / float(self.tile))))
+        snapped = []
+        for start, end, count, size in ((window[0], window[2], tiles[0], self.shape[0]),
+                                        (window[1], window[3], tiles[1], self.shape[1])):
+            start = min(max(int(round(start / float(self.tile))), 0), count - 1)
+            end = count if end >= size else min(max(int(round(end / float(self.tile))), start + 1), count)
+            snapped.append((start, end))
+        return (snapped[0][0], snapped[1][0], snapped[0][1], snapped[1][1])
+
+class _HistogramTable(object):
+    """
+    Summed-area tables over the tiles of an image of the per-bin counts and sums of a measure
+    """
+    def __init__(self, measure, valid, tile, bins):
+        # bins hold equal shares of the whole image's values, with finer bins at either end where the 
+        # high and low zones lie
+        values = numpy.sort(measure[valid])
+        if not values.size:
+            values = numpy.zeros(1)
+        tail = 2.0 ** -numpy.arange(4, 14)
+        shares = numpy.unique(numpy.concatenate((numpy.linspace(0, 1, max(bins - 2 * tail.size, 2) + 1), 
+                                                 tail, 1 - tail)))
+        self.edges = numpy.unique(values[numpy.round(shares * (values.size - 1)).astype(numpy.int64)])
+        if self.edges.size < 2:
+            self.edges = numpy.array((self.edges[0], self.edges[0] + 1.0))
+        self.bins = bins = self.edges.size - 1
+
+        # invalid values go in a last bin which is then dropped
+        index = numpy.clip(numpy.searchsorted(self.edges, measure, side='right') - 1, 0, bins - 1)
+        index[~valid] = bins
+        
+        # the range the values of each bin actually span, over the whole image
+        binned = numpy.clip(numpy.searchsorted(self.edges, values, side='right') - 1, 0, bins - 1)
+        self.bin_low, self.bin_high = self.edges[:-1].copy(), self.edges[1:].copy()
+        occupied = numpy.unique(binned)
+        self.bin_low[occupied] = values[numpy.searchsorted(binned, occupied)]
+        self.bin_high[occupied] = values[numpy.searchsorted(binned, occupied, side='right') - 1]
+
+        rows, cols = measure.shape
+        tiles = (int(math.ceil(rows / float(tile))), int(math.ceil(cols / float(tile))))
+        tileindex = (numpy.arange(rows) // tile)[:, numpy.newaxis] * tiles[1] + (numpy.arange(cols) // tile)
+        keys = (tileindex * (bins + 1) + index).ravel()
+        length = tiles[0] * tiles[1] * (bins + 1)
+        counts = numpy.bincount(keys, minlength=length).reshape(tiles + (bins + 1,))[..., :bins]
+        sums = numpy.bincount(keys, weights=numpy.where(valid, measure, 0).ravel(),
+                              minlength=length).reshape(tiles + (bins + 1,))[..., :bins]
+
+        self.counts = numpy.zeros((tiles[0] + 1, tiles[1] + 1, bins), dtype=numpy.int64)
+        self.sums = numpy.zeros((tiles[0] + 1, tiles[1] + 1, bins), dtype=numpy.float64)
+        numpy.cumsum(numpy.cumsum(counts, axis=0), axis=1, out=self.counts[1:, 1:])
+        numpy.cumsum(numpy.cumsum(sums, axis=0), axis=1, out=self.sums[1:, 1:])
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.sums.nbytes
+
+    def query(self, window):
+        """
+        The per-bin (counts, sums) within the window of tiles (top, left, bottom, right)
+        """
+        top, left, bottom, right = window
+        return tuple(table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+                     for table in (self.counts, self.sums))
+
+    def value(self, counts, k):
+        """
+        Estimates the value at index k of the sorted values with the given per-bin counts
+        """
+        cumulative = counts.cumsum()
+        if k >= cumulative[-1]:
+            return float('nan')
+        index = numpy.searchsorted(cumulative, k, side='right')
+        before = cumulative[index - 1] if index else 0
+        return self.bin_low[index] + (self.bin_high[index] - self.bin_low[index]) * (k - before + .5) / counts[index]
+
+    def between(self, counts, sums, low, high):
+        """
+        Estimates the count and sum of the values in [low, high) with the given per-bin counts and sums,
+        assuming values are spread evenly within each bin
+        """
+        if numpy.isnan(low):
+            return (0, 0.0)
+        width = self.bin_high - self.bin_low
+        overlap = numpy.minimum(self.bin_high, high) - numpy.maximum(self.bin_low, low)
+        fraction = numpy.where(width > 0, overlap / numpy.where(width > 0, width, 1), 
+                               (self.bin_low >= low) & (self.bin_low < high))
+        fraction = numpy.clip(fraction, 0, 1)
+        return ((counts * fraction).sum(), (sums * fraction).sum())
+
+def _smallest_mean(counts, sums, k):
+    """
+    The mean of the k smallest values with the given per-bin counts and sums, in order of increasing bin,
+    taking a partial bin at the mean of that bin
+    """
+    if k <= 0:
+        return float('nan')
+    cumulative = counts.cumsum()
+    index = numpy.searchsorted(cumulative, k)
+    before = cumulative[index - 1] if index else 0
+    return (sums[:index].sum() + (k - before) * sums[index] / counts[index]) / k
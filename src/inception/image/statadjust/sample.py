@@ -0,0 +1,71 @@
+"""
+Stratified sampling of images for statistical image adjustment, so that statistics of large regions are
+estimated from a bounded number of pixels spread evenly across them
+"""
+
+import math
+import numpy
+
+def stratified_sample(image, max_samples, mask=None, seed=0):
+    """
+    Samples about the given number of pixels of the image by dividing it into a grid of near-square strata
+    and taking one pixel at random from each (i.e. jittered grid sampling), which covers the image more
+    evenly than drawing pixels independently and avoids the aliasing of a fixed stride
+
+    :Parameters:
+        image : `numpy.array`
+            The image to sample
+        max_samples : `int`
+            The most pixels to sample
+        mask : `numpy.array`
+            If given, a boolean image of the pixels that may be sampled, whose count is used for
+            the number of strata. Default=None
+        seed : `int`
+            The seed of the random choice within each stratum, so that the samples are repeatable. Default=0
+
+    :Returns:
+        The sampled pixels as an array of shape (n, channels), in row-major order of their strata, or all of
+        the (masked) pixels if there are no more than max_samples
+
+    :Rtype:
+        `numpy.array`
+    """
+    rows, cols = image.shape[:2]
+    count = rows * cols if mask is None else int(numpy.count_nonzero(mask))
+    area = count / float(max_samples)
+    if area <= 1:
+        return image.reshape((rows * cols,) + image.shape[2:]) if mask is None else image[mask]
+    row_step = max(int(round(math.sqrt(area))), 1)
+    col_step = int(math.ceil(area / row_step))
+
+    # one pixel at random from each stratum, with the strata at the edges cut short
+    random = numpy.random.RandomState(seed)
+    row_starts = numpy.arange(0, rows, row_step)[:, numpy.newaxis]
+    col_starts = numpy.arange(0, cols, col_step)[numpy.newaxis, :]
+    shape = (row_starts.size, col_starts.size)
+    row = row_starts + (random.random_sample(shape) * numpy.minimum(row_step, rows - row_starts)).astype(numpy.intp)
+    col = col_starts + (random.random_sample(shape) * numpy.minimum(col_step, cols - col_starts)).astype(numpy.intp)
+
+    samples = image[row, col]
+    if mask is not None:
+        return samples[mask[row, col]]
+    return samples.reshape((-1,) + image.shape[2:])
+
+def standard_error(values):
+    """
+    The standard error of the mean of the given values as an estimate of the mean of the population they
+    were sampled from
+
+    :Parameters:
+        values : `numpy.array`
+            The sampled values
+
+    :Returns:
+        The standard error, or None if there are too few values to estimate it
+
+    :Rtype:
+        `float`
+    """
+    if values.size < 2:
+        return None
+    return float(values.std(ddof=1) / math.sqrt(values.size))
@@ -1,16 +1,26 @@
 import math
 import numpy
 import scipy.ndimage
-from .colorspace import linear_to_srgb, srgb_to_linear
+from .transfer import linear_to_srgb, srgb_to_linear
 from .colorspace import cct_to_xy, xyY_to_cct
 from .colorspace import xyY_to_rgb, rgb_to_xyY
 from .colorspace import rgb_to_hsv, hsv_to_rgb
+from .colorspace import chunked
+from .view import ColorSpaceView
+from .zones import zones, high_zone, kth_smallest
+from .transform import ColorTransform
+from .sample import stratified_sample, standard_error
+from ..image import get_content_bounds, as_float
 
 ## PARAMETERS
 # hack to prevent very few sample points mucking things up
 _hist_threshold = 5
 _near_zero = .0000000001
 _bg_scale = 2.0 # the scale of background to consider relative to foreground
+_contrast_samples = 65536 # the number of foreground pixels the fast contrast search measures
+_contrast_lut_size = 1024 # the number of lookup table entries for each half of the contrast curve
+_min_zone_samples = 16 # the fewest values the high and low zones are each estimated from when sampling
+_threads = 1 # the number of threads color space conversions are run on, in blocks of rows (None for one per cpu)
 # see also bottom for statistic-specific configuration
 
 ## CONSTANTS
@@ -20,8 +30,9 @@ highlight_ratio = 1/128.0
 undershadow_thres = .013
 overhighlight_thres = .8714
 
-# TODO: can optimize this a lot by caching the various color spaces of a single image
-def statadjust(foreground, background, offset=(0,0), intermediary_results=False):
+def statadjust(foreground, background, offset=(0,0), intermediary_results=False, bounds=None, 
+               contrast_search='grid', background_index=None, cct_lookup=False, fused=False, transform=None,
+               max_samples=None):
     """
     Performs a statistics-based image adjustment to better match 
     color/lighting in foreground to background
@@ -38,6 +49,34 @@ def statadjust(foreground, background, offset=(0,0), intermediary_results=False)
             If True, return the image at each stage of adjustment (contrast, luminance, cct, saturation)
             Otherwise, just returns the final result after each adjustment applied in turn.
             Default=False
+        bounds : `tuple`
+            The tight bounding box of the non-transparent content of the foreground, given as 
+            (top, left, bottom, right), e.g. from `get_content_bounds`. Only this region of the foreground is 
+            adjusted, and the background is measured around it. If not given, it is computed from the 
+            foreground's alpha.
+        contrast_search : `basestring`
+            How to search for the contrast curve best matching the background, see `match_contrast`. 
+            Default='grid'
+        background_index : `BackgroundStatsIndex`
+            If given, the background statistics are read from this precomputed index of the background
+            rather than measured from its pixels. Default=None
+        cct_lookup : `bool`
+            If True, color temperatures are interpolated from a precomputed table rather than converted
+            exactly, see `CCTLookupTable`. Default=False
+        fused : `bool`
+            If True, the adjustments are only worked out on the measure-only foreground, then baked into a 
+            single `ColorTransform` that is applied to the foreground in one pass, see `fit_transform`. 
+            Default=False
+        transform : `ColorTransform`
+            If given, this transform from an earlier `fit_transform` is applied to the foreground instead,
+            and neither image is measured, e.g. to adjust later frames or a resized copy the same way. 
+            Default=None
+        max_samples : `int`
+            If given, the luminance, color temperature and saturation statistics of the foreground and of the
+            background are each estimated from at most this many pixels, sampled by `stratified_sample`, 
+            and the standard errors of the zone shifts are reported.  It is raised if need be so that the 
+            high and low zones are still estimated from enough values to be used, and local contrast is 
+            still measured on every pixel. Default=None
             
     :Returns:
         The resulting foreground copy adjusted to match background, if intermediary_results=False
@@ -47,39 +86,195 @@ def statadjust(foreground, background, offset=(0,0), intermediary_results=False)
     :Rtype:
         `numpy.array` or `list`
     """
+    if intermediary_results and (fused or transform is not None):
+        raise ValueError("Intermediary results are not available from a fused adjustment")
+    if fused and transform is None:
+        transform = fit_transform(foreground, background, offset, bounds=bounds, contrast_search=contrast_search,
+                                  background_index=background_index, cct_lookup=cct_lookup, 
+                                  max_samples=max_samples)
+    if transform is not None:
+        if bounds is None:
+            bounds = get_content_bounds(foreground)
+        crop = _crop(foreground, bounds)
+        return _uncrop(transform(foreground[crop[0]:crop[2], crop[1]:crop[3]]), foreground, crop)
     
     results = []
+    fullforeground, crop, foreground, foregroundmonly, foregroundalpha, background, background_stats, samples = \
+        _prepare(foreground, background, offset, bounds, background_index, cct_lookup, max_samples)
+    
+    # adjust local constrast
+    meanlum, alpha = solve_contrast(foregroundmonly, background, search=contrast_search, 
+                                    background_stats=background_stats)
+    foreground = apply_contrast(foreground, meanlum, alpha, search=contrast_search)
+    if samples is not None:
+        # the other statistics are measured on the samples only
+        foregroundmonly, background = samples
+    foregroundmonly = apply_contrast(foregroundmonly, meanlum, alpha, search=contrast_search)
+    if intermediary_results:
+        results.append(linear_to_srgb(foreground))
+        if foregroundalpha is not None:
+            results[-1] = numpy.dstack((results[-1][:,:,0], results[-1][:,:,1], results[-1][:,:,2], foregroundalpha))
+    
+    # adjust luminance, CCT, and finally saturation to match
+    for stat in _stat_order:
+        foregroundmonly = ColorSpaceView(foregroundmonly, cct_lookup=cct_lookup, threads=_threads)
+        foreground = ColorSpaceView(foreground, cct_lookup=cct_lookup, threads=_threads)
+        foregroundmonly, foreground = match(stat, foregroundmonly, foreground, background, 
+                                            filter_exposure=statfuncs[stat]['filter_exposure'],
+                                            background_stats=background_stats, errors=samples is not None)
+        
+        if intermediary_results:
+            results.append(linear_to_srgb(foreground))
+            if foregroundalpha is not None:
+                results[-1] = numpy.dstack((results[-1][:,:,0], results[-1][:,:,1], results[-1][:,:,2], foregroundalpha))
+        
+    # convert back to sRGB
+    if intermediary_results:
+        return [_uncrop(result, fullforeground, crop) for result in results]
     
-    foreground = foreground.copy()
+    foreground = chunked(linear_to_srgb, foreground, threads=_threads)
+    if foregroundalpha is not None:
+        foreground = numpy.dstack((foreground[:,:,0], foreground[:,:,1], foreground[:,:,2], foregroundalpha))
+    return _uncrop(foreground, fullforeground, crop)
+
+def fit_transform(foreground, background, offset=(0,0), bounds=None, contrast_search='grid', 
+                  background_index=None, cct_lookup=False, max_samples=None, size=33):
+    """
+    Works out the statistics-based adjustment of the foreground to the background, as `statadjust` does, 
+    but only on the measure-only foreground, and bakes the whole chain of adjustments into a single 
+    per-pixel color transform.  Since each adjustment only depends on a pixel's own color once its shift 
+    has been chosen, the transform can then be applied to the foreground, resized copies of it, or later 
+    frames without measuring anything again
+    
+    :Parameters:
+        foreground : `numpy.array`
+            The foreground image to match to the background
+        background : `numpy.array`
+            The background image to match to
+        offset : `tuple`
+            A tuple of (row, column) denoting the offset into the destination image where the upper-left
+            corner of the source image will begin (once merged). Default=(0,0)
+        bounds : `tuple`
+            The bounding box of the non-transparent content of the foreground, see `statadjust`
+        contrast_search : `basestring`
+            How to search for the contrast curve best matching the background, see `match_contrast`. 
+            Default='grid'
+        background_index : `BackgroundStatsIndex`
+            If given, the background statistics are read from this precomputed index. Default=None
+        cct_lookup : `bool`
+            If True, color temperatures are interpolated from a precomputed table. Default=False
+        max_samples : `int`
+            If given, the most pixels of each image to estimate statistics from, see `statadjust`. Default=None
+        size : `int`
+            The number of table points along each channel of the transform. Default=33
+            
+    :Returns:
+        The transform from the sRGB foreground to the adjusted sRGB foreground
+        
+    :Rtype:
+        `ColorTransform`
+    """
+    _, _, _, foregroundmonly, _, background, background_stats, samples = \
+        _prepare(foreground, background, offset, bounds, background_index, cct_lookup, max_samples)
+    
+    # solve each adjustment in turn on the measure-only foreground, shifted by the adjustments before it
+    meanlum, alpha = solve_contrast(foregroundmonly, background, search=contrast_search, 
+                                    background_stats=background_stats)
+    if samples is not None:
+        foregroundmonly, background = samples
+    foregroundmonly = apply_contrast(foregroundmonly, meanlum, alpha, search=contrast_search)
+    shifts = []
+    for stat in _stat_order:
+        foregroundmonly = ColorSpaceView(foregroundmonly, cct_lookup=cct_lookup, threads=_threads)
+        shift = solve_shift(stat, foregroundmonly, background, filter_exposure=statfuncs[stat]['filter_exposure'],
+                            background_stats=background_stats, errors=samples is not None)
+        print("Shifting foreground %s by %s" % (stat, shift))
+        foregroundmonly = statfuncs[stat]['set'](foregroundmonly, shift).clip(0,1)
+        shifts.append((stat, shift))
+    
+    def adjust(colors):
+        colors = apply_contrast(srgb_to_linear(colors), meanlum, alpha, search=contrast_search)
+        for stat, shift in shifts:
+            colors = ColorSpaceView(colors, cct_lookup=cct_lookup, threads=_threads)
+            colors = statfuncs[stat]['set'](colors, shift).clip(0,1)
+        return linear_to_srgb(colors)
+    return ColorTransform(adjust, size)
+
+def _crop(foreground, bounds):
+    """
+    The region of the foreground to adjust, given as (top, left, bottom, right): its occupied region, padded
+    by the reach of the alpha erosion
+    """
+    row_min, col_min, row_max, col_max = bounds
+    return (max(row_min - 1, 0), max(col_min - 1, 0), 
+            min(row_max + 1, foreground.shape[0]), min(col_max + 1, foreground.shape[1]))
+
+def background_window(offset, size, shape):
+    """
+    The region of the background whose statistics a foreground is matched to: the area `_bg_scale` times
+    the size of the foreground's content centered on it, shifted back inside the background at its edges
     
+    :Parameters:
+        offset : `tuple`
+            The (row, column) of the upper-left corner of the foreground's content within the background
+        size : `tuple`
+            The (rows, columns) of the foreground's content
+        shape : `tuple`
+            The shape of the background
+            
+    :Returns:
+        The region as (top, left, bottom, right) where bottom and right are exclusive
+        
+    :Rtype:
+        `tuple`
+    """
+    window = []
+    for start, length, limit in zip(offset, size, shape[:2]):
+        start = max(start - ((_bg_scale - 1)/2.0) * length, 0)
+        end = start + _bg_scale * length
+        if end > limit:
+            end = limit
+            start = max(end - _bg_scale * length, 0)
+        window.append((start, end))
+    return (window[0][0], window[1][0], window[0][1], window[1][1])
+
+def _prepare(foreground, background, offset, bounds, background_index, cct_lookup, max_samples=None):
+    """
+    Crops the foreground and background to the regions adjusted and measured, returning a tuple of
+    (fullforeground, crop, foreground, foregroundmonly, foregroundalpha, background, background_stats, samples),
+    with the images as views, or the background None if its statistics are read from the index.  If 
+    max_samples is given, samples is a tuple of (foregroundmonly, background) samples of at most that many 
+    pixels each, in the same form, otherwise None
+    """
     # only select background within area equal to bb of fg * 3
     # offset given as row, column
     # ignore the alpha matte, which may be much larger than the actual foreground
-    if len(foreground.shape) > 2 and foreground.shape[2] > 3:
-        foreground_nonzero = numpy.nonzero(foreground[...,3])
-        row_min, col_min = foreground_nonzero[0].min(), foreground_nonzero[1].min()
-        foreground_rows = foreground_nonzero[0].max() - row_min + 1
-        foreground_cols = foreground_nonzero[1].max() - col_min + 1
-        offset = (offset[0] + row_min, offset[1] + col_min)
-    else:
-        foreground_rows = foreground.shape[0]
-        foreground_cols = foreground.shape[1]
-    
-    bgstart = [max(offset[0] - ((_bg_scale - 1)/2.0) * foreground_rows, 0),
-               max(offset[1] - ((_bg_scale - 1)/2.0) * foreground_cols, 0)]
-    bgend = [bgstart[0] + _bg_scale * foreground_rows,
-             bgstart[1] + _bg_scale * foreground_cols]
-    if bgend[0] > background.shape[0]:
-        bgend[0] = background.shape[0]
-        bgstart[0] = max(bgend[0] - _bg_scale * foreground_rows, 0)
-    if bgend[1] > background.shape[1]:
-        bgend[1] = background.shape[1]
-        bgstart[1] = max(bgend[1] - _bg_scale * foreground_cols, 0)
+    if bounds is None:
+        bounds = get_content_bounds(foreground, tight=True)
+    row_min, col_min, row_max, col_max = bounds
+    foreground_rows = row_max - row_min
+    foreground_cols = col_max - col_min
+    offset = (offset[0] + row_min, offset[1] + col_min)
+    
+    # only adjust the occupied region of the foreground, padded by the reach of the alpha erosion below
+    # everything outside it is fully transparent and passes through untouched
+    fullforeground = foreground
+    crop = _crop(foreground, bounds)
+    foreground = as_float(foreground[crop[0]:crop[2], crop[1]:crop[3]]).copy()
+    
+    window = background_window(offset, (foreground_rows, foreground_cols), background.shape)
         
-    if len(background.shape) > 2:
-        background = background[bgstart[0]:bgend[0], bgstart[1]:bgend[1], :3]
+    background_stats = None
+    if background_index is not None:
+        background_stats = dict((statname, background_index.stats(statname, window)) for statname in statfuncs)
+        background = None
+    elif len(background.shape) > 2:
+        background = background[window[0]:window[2], window[1]:window[3], :3]
     else:
-        background = background[bgstart[0]:bgend[0], bgstart[1]:bgend[1], :3]
+        background = background[window[0]:window[2], window[1]:window[3], :3]
+    # only the region of the background that is measured needs to be in floating point
+    if background is not None:
+        background = as_float(background)
     
     # morphologically erode alpha matte of foreground
     foregroundmonly = foreground
@@ -91,44 +286,45 @@ def statadjust(foreground, background, offset=(0,0), intermediary_results=False)
         foregroundmonly = foreground.copy()
     
     # discard areas where alpha < .5
+    samples = None
+    if max_samples is not None:
+        max_samples = max(max_samples, int(math.ceil(_min_zone_samples / top_ratio)))
     if len(foregroundmonly.shape) > 2 and foreground.shape[2] > 3:
-        foregroundmonly = foregroundmonly[foregroundmonly[...,3] > .5]
+        opaque = foregroundmonly[...,3] > .5
+        if max_samples is not None:
+            samples = stratified_sample(foregroundmonly[...,:3], max_samples, mask=opaque)
+        foregroundmonly = foregroundmonly[opaque]
+    elif max_samples is not None:
+        samples = stratified_sample(foregroundmonly[...,:3], max_samples)
     
     foreground = foreground[...,:3]
     foregroundmonly = foregroundmonly[...,:3]
     
     # convert everything to linear space
-    foregroundmonly = srgb_to_linear(foregroundmonly)
-    foreground = srgb_to_linear(foreground)
-    background = srgb_to_linear(background)
-    
-    # adjust local constrast
-    foregroundmonly, foreground = match_contrast(foregroundmonly, foreground, background)
-    if intermediary_results:
-        results.append(linear_to_srgb(foreground))
-        if foregroundalpha is not None:
-            results[-1] = numpy.dstack((results[-1][:,:,0], results[-1][:,:,1], results[-1][:,:,2], foregroundalpha))
-    
-    # adjust luminance, CCT, and finally saturation to match
-    for stat in ('luminance', 'cct', 'saturation'):
-        foregroundmonly, foreground = match(stat, foregroundmonly, foreground, background, 
-                                            filter_exposure=statfuncs[stat]['filter_exposure'])
-        
-        if intermediary_results:
-            results.append(linear_to_srgb(foreground))
-            if foregroundalpha is not None:
-                results[-1] = numpy.dstack((results[-1][:,:,0], results[-1][:,:,1], results[-1][:,:,2], foregroundalpha))
-        
-    # convert back to sRGB
-    if intermediary_results:
-        return results
-    
-    foreground = linear_to_srgb(foreground)
-    if foregroundalpha is not None:
-        foreground = numpy.dstack((foreground[:,:,0], foreground[:,:,1], foreground[:,:,2], foregroundalpha))
-    return foreground
+    # the background never changes, so every color space of it is only computed once for all of the stats
+    def view(image):
+        return ColorSpaceView(image, linear=False, cct_lookup=cct_lookup, threads=_threads)
+    foregroundmonly = view(foregroundmonly)
+    foreground = view(foreground)
+    if background is not None:
+        background = view(background)
+    if samples is not None:
+        samples = (view(samples), None if background is None else 
+                   view(stratified_sample(background.srgb, max_samples)))
+    return (fullforeground, crop, foreground, foregroundmonly, foregroundalpha, background, background_stats, 
+            samples)
+
+def _uncrop(result, foreground, crop):
+    """
+    Pastes the adjusted crop of the foreground back into a copy of the full foreground
+    """
+    if result.shape == foreground.shape:
+        return result
+    full = as_float(foreground).astype(result.dtype)
+    full[crop[0]:crop[2], crop[1]:crop[3]] = result
+    return full
 
-def compute_stats(statname, image, filter_exposure=True):   
+def compute_stats(statname, image, filter_exposure=True, errors=False):   
     """ 
     Computes low, medium, and high mean values for the given statistic.
     For statistics configured to allow an overhighlight metric, also computes 
@@ -137,16 +333,21 @@ def compute_stats(statname, image, filter_exposure=True):
     :Parameters:
         statname : `basestring`
             The name of the image statistic, (e.g. luminance, cct, saturation)
-        image : `numpy.array`
-            The image to compute statistics for
+        image : `numpy.array` or `ColorSpaceView`
+            The linear image to compute statistics for, or a view of it
         filter_exposure : `bool`
             If True, only includes pixels that are not over or underexposed
             in computing the various metrics
+        errors : `bool`
+            If True, also estimates the standard error of each mean, for when the image is a sample of
+            the pixels of a larger one, e.g. from `stratified_sample`. Default=False
             
     :Returns:
         A tuple of (low, medium, high) metric values for the image, or (low, medium, high, extra),
-        if the statistic is configured to allow 'different_brightness'
+        if the statistic is configured to allow 'different_brightness'.  If errors is True, a tuple of
+        that tuple and a tuple of the standard errors of its values, each None where the value is None
     """
+    image = ColorSpaceView.of(image)
     measure = statfuncs[statname]['get'](image).flatten()
     
     # filter out over and underexposed for certain stats
@@ -164,12 +365,8 @@ def compute_stats(statname, image, filter_exposure=True):
         m[:measure.size] = measure
         measure = m
 
-    # sort from high to low
-    measure.sort()
-    measure = measure[::-1]
-    
-    measure_high = measure[:math.floor(top_ratio*measure.size)]
-    measure_low = measure[math.floor(bottom_ratio*measure.size):]
+    # select the zones of the values sorted from high to low
+    measure_low, measure_high = zones(measure, top_ratio, bottom_ratio)
     
     # compute image statistics (low, medium, and high)
     measure_mean_high = measure_high.mean()
@@ -182,17 +379,17 @@ def compute_stats(statname, image, filter_exposure=True):
     if (measure_low.size <= _hist_threshold):
         measure_mean_low = None    
     
+    stats = (measure_mean_low, measure_mean_medium, measure_mean_high)
+    measures = (measure_low, measure, measure_high)
     if statfuncs[statname]['different_brightness']:
         # in this case, we have a fourth order statistic to compare against
         if lum is None:
             lum = getluminance(image).flatten()
         # remove overexposed from lum
         lum = lum[(lum < overhighlight_thres)]
-        lum.sort()
-        lum[::-1]
         
         # bright threshold
-        b = lum[math.floor(highlight_ratio*lum.size)]
+        b = kth_smallest(lum, math.floor(highlight_ratio*lum.size))
 
         measure_extra = measure[(measure >= b) & (measure < overhighlight_thres)]
         if (measure_extra.size <= _hist_threshold):
@@ -200,9 +397,13 @@ def compute_stats(statname, image, filter_exposure=True):
         else:
             measure_mean_extra = measure_extra.mean()
 
-        return (measure_mean_low, measure_mean_medium, measure_mean_high, measure_mean_extra)
+        stats += (measure_mean_extra,)
+        measures += (measure_extra,)
     
-    return (measure_mean_low, measure_mean_medium, measure_mean_high)
+    if errors:
+        return (stats, tuple(None if stat is None else standard_error(values) 
+                             for stat, values in zip(stats, measures)))
+    return stats
 
 def _bezt(t, p0, p1, p2):
     """
@@ -235,28 +436,70 @@ def _bezx(x, p0, p1, p2):
         y = (1 - 2*b) * t**2 + 2 * b * t
     return p0[1] + (p2[1] - p0[1])*y
 
-def match_contrast(foregroundmonly, foreground, background):
+def match_contrast(foregroundmonly, foreground, background, search='grid', background_stats=None):
     """
     Matches contrast between the measure-only foreground and background images
     and applies it to the foreground
     
     :Parameters:
-        foregroundmonly : `numpy.array`
+        foregroundmonly : `numpy.array` or `ColorSpaceView`
             The measure-only foreground image
-        foreground : `numpy.array`
+        foreground : `numpy.array` or `ColorSpaceView`
             The write-only foreground image
-        background : `numpy.array`
+        background : `numpy.array` or `ColorSpaceView`
             The background image to match local contrast to
+        search : `basestring`
+            How to search for the contrast curve that best matches the background.  'grid' measures the whole
+            measure-only foreground for each curve in steps of .02 alpha.  'fast' measures the same curves on a 
+            subsample of the measure-only foreground, made of contiguous blocks of its pixels, and applies the 
+            chosen curve through a lookup table, so it only saves time on foregrounds larger than the subsample. 
+            Default='grid'
+        background_stats : `dict`
+            If given, the precomputed statistics of the background by statistic name, e.g. from a
+            `BackgroundStatsIndex`, in which case the background itself is not measured. Default=None
             
     :Returns:
         A tuple of (newforegroundmonly, newforeground) representing the shifted
         measure-only foreground and foreground respectively
     """
+    foregroundmonly = ColorSpaceView.of(foregroundmonly)
+    meanlum, alpha = solve_contrast(foregroundmonly, background, search=search, background_stats=background_stats)
+    return (apply_contrast(foregroundmonly, meanlum, alpha, search=search), 
+            apply_contrast(foreground, meanlum, alpha, search=search))
+
+def solve_contrast(foregroundmonly, background, search='grid', background_stats=None):
+    """
+    Finds the contrast curve that best matches local contrast between the measure-only foreground and 
+    background images, see `match_contrast`
+    
+    :Parameters:
+        foregroundmonly : `numpy.array` or `ColorSpaceView`
+            The measure-only foreground image
+        background : `numpy.array` or `ColorSpaceView`
+            The background image to match local contrast to
+        search : `basestring`
+            How to search for the contrast curve, 'grid' or 'fast'. Default='grid'
+        background_stats : `dict`
+            If given, the precomputed statistics of the background by statistic name. Default=None
+            
+    :Returns:
+        A tuple of (meanlum, alpha) giving the curve, for `apply_contrast`
+        
+    :Rtype:
+        `tuple`
+    """
+    if search not in ('grid', 'fast'):
+        raise ValueError("Unknown contrast search: %s" % search)
+    
     print("Matching contrast...")
+    foregroundmonly = ColorSpaceView.of(foregroundmonly)
     
     # compute the baseline contrast in the correct space
     resultfg = compute_stats('contrast', foregroundmonly, filter_exposure=False)
-    resultbg = compute_stats('contrast', background, filter_exposure=False)
+    if background_stats is not None:
+        resultbg = background_stats['contrast']
+    else:
+        resultbg = compute_stats('contrast', background, filter_exposure=False)
     
     lomeanbg, medmeanbg, himeanbg = resultbg
     lomeanfg, medmeanfg, himeanfg = resultfg
@@ -264,10 +507,10 @@ def match_contrast(foregroundmonly, foreground, background):
     origmean = himeanfg
     
     # get luminance for zone retrieval
-    Yfg = getluminance(foregroundmonly).flatten()
+    Yfg = getluminance(foregroundmonly)
     
     # convert to xyY to do luminance transformation
-    foregroundmonly_xyY = rgb_to_xyY(foregroundmonly)
+    foregroundmonly_xyY = foregroundmonly.xyY
     meanlum = Yfg.mean()
 
     # curve points
@@ -284,29 +527,16 @@ def match_contrast(foregroundmonly, foreground, background):
     bestmean = float('inf')
     bestalpha = None
     
-    maskLower = (foregroundmonly_xyY[...,2] <= meanlum)
+    # the fast search measures the same curves on a subsample of the foreground
+    luminance = foregroundmonly_xyY[...,2]
+    if search == 'fast':
+        luminance = _contrast_sample(luminance, _contrast_samples)
+    stacked = (search == 'fast')
+    maskLower = (luminance <= meanlum)
     maskUpper = ~maskLower
     
     for alpha in numpy.arange(.4,.6,.02):
-        # get control points
-        pU = p11 + alpha * (p12 - p11)
-        pL = p01 + alpha * (p02 - p01)
-         
-        transformedfg = numpy.zeros_like(foregroundmonly_xyY[...,2])
-        transformedfg[maskLower] = _bezx(foregroundmonly_xyY[...,2][maskLower], p0, pL, pm)
-        transformedfg[maskUpper] = _bezx(foregroundmonly_xyY[...,2][maskUpper], pm, pU, p1)
-        
-        # compute the contrast in the correct space
-        contrastfg = getcontrast_from_lum(transformedfg).flatten()
-        contrastfg = contrastfg[(contrastfg > statfuncs['contrast']['low_threshold'])]
-        if contrastfg.size < statfuncs['contrast']['lower_fill_threshold']:
-            m = statfuncs['contrast']['low_threshold'] * numpy.ones(statfuncs['contrast']['lower_fill_threshold'], dtype=contrastfg.dtype)
-            m[:contrastfg.size] = contrastfg
-            contrastfg = m
-        
-        contrastfg.sort()
-        contrastfg = contrastfg[::-1]
-        himeanfg = contrastfg[:math.floor(top_ratio*contrastfg.size)].mean()
+        himeanfg = _contrast_high_mean(luminance, meanlum, alpha, maskLower, maskUpper, stacked=stacked)
 
         if himeanbg is None or himeanfg is None or numpy.isnan(himeanbg) or numpy.isnan(himeanfg):
             continue
@@ -335,55 +565,185 @@ def match_contrast(foregroundmonly, foreground, background):
         bestmean = 0
         bestmatch = 0
     
-    # do the actual shift of the foreground
     if origmean is not None:
         print("Shifting high zone mean contrast by %s using alpha=%2.2f (best match of %s)" % (bestmean - origmean, bestalpha, bestmatch))
     else:
         print("Shifting high zone mean contrast with alpha=%2.2f" % (bestalpha))
-    pU = p11 + bestalpha * (p12 - p11)
-    pL = p01 + bestalpha * (p02 - p01)
-    
-    newforegroundmonly = foregroundmonly_xyY
-    newforeground = rgb_to_xyY(foreground)
-    
-    maskLowerFgmonly = maskLower
-    maskUpperFgmonly = maskUpper
-    
-    maskLowerFg = (newforeground[...,2] <= meanlum)
-    maskUpperFg = ~maskLowerFg
-    
-    newforegroundmonly[...,2][maskLowerFgmonly] = _bezx(newforegroundmonly[...,2][maskLowerFgmonly], p0, pL, pm)
-    newforegroundmonly[...,2][maskUpperFgmonly] = _bezx(newforegroundmonly[...,2][maskUpperFgmonly], pm, pU, p1)
-    
-    newforeground[...,2][maskLowerFg] = _bezx(newforeground[...,2][maskLowerFg], p0, pL, pm)
-    newforeground[...,2][maskUpperFg] = _bezx(newforeground[...,2][maskUpperFg], pm, pU, p1)
+    return (meanlum, bestalpha)
+
+def apply_contrast(image, meanlum, alpha, search='grid'):
+    """
+    Applies the contrast curve with the given parameters to the luminance of the given image
     
-    return (xyY_to_rgb(newforegroundmonly).clip(0,1), xyY_to_rgb(newforeground).clip(0,1))
+    :Parameters:
+        image : `numpy.array` or `ColorSpaceView`
+            The linear image to adjust
+        meanlum : `float`
+            The mean luminance of the measure-only foreground, where the two halves of the curve join
+        alpha : `float`
+            The strength of the curve, from `solve_contrast`
+        search : `basestring`
+            The search the curve was found with.  Curves found by the 'fast' search are applied through a
+            lookup table. Default='grid'
+            
+    :Returns:
+        The adjusted linear image
+        
+    :Rtype:
+        `numpy.array`
+    """
+    image = ColorSpaceView.of(image)
+    lower, upper = _contrast_curve(meanlum, alpha)
+    
+    if search == 'fast':
+        # the whole curve as a single lookup table, with the join between its halves as an entry
+        lut_x = numpy.concatenate((numpy.linspace(0, meanlum, _contrast_lut_size), 
+                                   numpy.linspace(meanlum, 1, _contrast_lut_size)[1:]))
+        lut_y = numpy.concatenate((_bezx(lut_x[:_contrast_lut_size], *lower), 
+                                   _bezx(lut_x[_contrast_lut_size:], *upper)))
+        return _apply_luminance_curve(image, lut_x, lut_y)
+    
+    newimage = image.xyY.copy()
+    maskLower = (newimage[...,2] <= meanlum)
+    maskUpper = ~maskLower
+    newimage[...,2][maskLower] = _bezx(newimage[...,2][maskLower], *lower)
+    newimage[...,2][maskUpper] = _bezx(newimage[...,2][maskUpper], *upper)
+    return chunked(xyY_to_rgb, newimage, threads=image.threads).clip(0,1)
 
-def match(statname, foregroundmonly, foreground, background, filter_exposure=True): 
+def _contrast_curve(meanlum, alpha):
+    """
+    The control points of the lower and upper halves of the contrast curve with the given alpha
+    """
+    pm = numpy.array((meanlum, meanlum))
+    pL = numpy.array((meanlum, 0)) + alpha * numpy.array((-meanlum, meanlum))
+    pU = numpy.array((meanlum, 1)) + alpha * numpy.array((1 - meanlum, meanlum - 1))
+    return ((numpy.array((0,0)), pL, pm), (pm, pU, numpy.array((1,1))))
+
+def _contrast_high_mean(luminance, meanlum, alpha, maskLower, maskUpper, stacked=False):
+    """
+    The high zone mean contrast of the given luminance after applying the contrast curve with the given alpha,
+    measuring each block stacked along its first axis on its own if stacked, see `_contrast_sample`
+    """
+    lower, upper = _contrast_curve(meanlum, alpha)
+    transformed = numpy.zeros_like(luminance)
+    transformed[maskLower] = _bezx(luminance[maskLower], *lower)
+    transformed[maskUpper] = _bezx(luminance[maskUpper], *upper)
+    
+    # compute the contrast in the correct space
+    contrast = getcontrast_from_lum(transformed, stacked=stacked).flatten()
+    contrast = contrast[(contrast > statfuncs['contrast']['low_threshold'])]
+    if contrast.size < statfuncs['contrast']['lower_fill_threshold']:
+        m = statfuncs['contrast']['low_threshold'] * numpy.ones(statfuncs['contrast']['lower_fill_threshold'], dtype=contrast.dtype)
+        m[:contrast.size] = contrast
+        contrast = m
+    
+    return high_zone(contrast, top_ratio).mean()
+
+def _apply_luminance_curve(image, lut_x, lut_y):
+    """
+    Maps the luminance of the given view through the curve given as a lookup table, keeping its chromaticity.
+    Since linear RGB is linear in XYZ, this just scales each pixel by the ratio of its new to old luminance
+    """
+    luminance = image.luminance
+    gain = numpy.interp(luminance, lut_x, lut_y)
+    nonzero = luminance > 0
+    gain[nonzero] /= luminance[nonzero]
+    gain[~nonzero] = 0
+    return (image.linear * gain[..., numpy.newaxis]).clip(0,1)
+
+def _contrast_sample(luminance, samples):
+    """
+    Subsamples the luminance down to about the given number of pixels by keeping evenly spaced blocks
+    of contiguous pixels along its first axis, stacked along a new first axis so that the local contrast 
+    of the kept pixels is measured against their own neighborhood and never across two blocks
+    """
+    block = 256 if luminance.ndim == 1 else 16
+    step = int(math.ceil(luminance.size / float(samples)))
+    if step <= 1 or luminance.shape[0] < block:
+        return luminance[numpy.newaxis]
+    starts = numpy.arange(0, luminance.shape[0] - block + 1, block * step)
+    return numpy.array([luminance[start:start + block] for start in starts])
+
+def match(statname, foregroundmonly, foreground, background, filter_exposure=True, background_stats=None,
+          errors=False): 
     """
     Match the given image statistic between the measure-only foreground and background images, and apply
     the result to the given foreground image.
     
     :Parameters:
-        foregroundmonly : `numpy.array`
+        foregroundmonly : `numpy.array` or `ColorSpaceView`
             The measure-only foreground image
-        foreground : `numpy.array`
+        foreground : `numpy.array` or `ColorSpaceView`
             The write-only foreground image
-        background : `numpy.array`
+        background : `numpy.array` or `ColorSpaceView`
             The background image to match local contrast to
         filter_exposure : `bool`
             If True, only includes pixels that are not over or underexposed
             in computing the various metrics
+        background_stats : `dict`
+            If given, the precomputed statistics of the background by statistic name, e.g. from a
+            `BackgroundStatsIndex`, in which case the background itself is not measured. Default=None
+        errors : `bool`
+            If True, reports the standard errors of the zone shifts, for sampled images. Default=False
             
     :Returns:
         A tuple of (newforegroundmonly, newforeground) representing the shifted
         measure-only foreground and foreground respectively
     """
+    shift = solve_shift(statname, foregroundmonly, background, filter_exposure=filter_exposure, 
+                        background_stats=background_stats, errors=errors)
+    
+    # now that we have the zone set, perform the shift by the shift amount
+    print("Shifting foreground %s by %s" % (statname, shift))
+    foregroundmonly = statfuncs[statname]['set'](foregroundmonly, shift).clip(0,1)
+    foreground = statfuncs[statname]['set'](foreground, shift).clip(0,1)
+    return (foregroundmonly, foreground)
+
+def solve_shift(statname, foregroundmonly, background, filter_exposure=True, background_stats=None, 
+                errors=False):
+    """
+    Finds the shift of the given image statistic that matches the measure-only foreground to the background
+    image, see `match`
+    
+    :Parameters:
+        statname : `basestring`
+            The name of the image statistic, (e.g. luminance, cct, saturation)
+        foregroundmonly : `numpy.array` or `ColorSpaceView`
+            The measure-only foreground image
+        background : `numpy.array` or `ColorSpaceView`
+            The background image to match to
+        filter_exposure : `bool`
+            If True, only includes pixels that are not over or underexposed
+            in computing the various metrics
+        background_stats : `dict`
+            If given, the precomputed statistics of the background by statistic name. Default=None
+        errors : `bool`
+            If True, the images are samples, e.g. from `stratified_sample`, and the standard errors of the 
+            zone shifts are reported along with them. Default=False
+            
+    :Returns:
+        The amount to shift the statistic by, for the statistic's 'set' function
+        
+    :Rtype:
+        `float`
+    """
     print("Matching %s..." % statname)
+    foregroundmonly = ColorSpaceView.of(foregroundmonly)
+    
+    resultfg = compute_stats(statname, foregroundmonly, filter_exposure=filter_exposure, errors=errors)
+    if background_stats is not None:
+        resultbg = background_stats[statname]
+        if errors:
+            resultbg = (resultbg, (0,) * len(resultbg))
+    else:
+        resultbg = compute_stats(statname, background, filter_exposure=filter_exposure, errors=errors)
     
-    resultfg = compute_stats(statname, foregroundmonly, filter_exposure=filter_exposure)
-    resultbg = compute_stats(statname, background, filter_exposure=filter_exposure)
+    if errors:
+        # the errors of the foreground and background means are independent, so add in quadrature
+        (resultfg, errorsfg), (resultbg, errorsbg) = resultfg, resultbg
+        shifterrors = [float('nan') if errorfg is None or errorbg is None else math.hypot(errorfg, errorbg)
+                       for errorfg, errorbg in zip(errorsfg, errorsbg)]
+        print("Standard errors of L,M,H shifts: %2.4f,%2.4f,%2.4f" % tuple(shifterrors[:3]))
     
     try:
         lomeanbg, medmeanbg, himeanbg = resultbg
@@ -448,12 +808,7 @@ def match(statname, foregroundmonly, foreground, background, filter_exposure=Tru
             shift = clamp[1] - medmeanfg
         elif medmeanfg + shift < clamp[0]:
             shift = clamp[0] - medmeanfg
-            
-    # now that we have the zone set, perform the shift by the shift amount
-    print("Shifting foreground %s by %s" % (statname, shift))
-    foregroundmonly = statfuncs[statname]['set'](foregroundmonly, shift).clip(0,1)
-    foreground = statfuncs[statname]['set'](foreground, shift).clip(0,1)
-    return (foregroundmonly, foreground)
+    return shift
 
 def hue_match(foreground, background):
     """
@@ -485,10 +840,10 @@ def hue_match(foreground, background):
 # measurement getters
 eps = 3.03e-4
 
+# each takes a linear image or a `ColorSpaceView` of one, whose color spaces are then reused
 def getluminance(image):
     #0.2989 * R + 0.5870 * G + 0.1140 * B 
-    #return .2989 * image[...,0] + .5870 * image[...,1] + .1140 * image[...,2]
-    return .2126 * image[...,0] + .7152 * image[...,1] + .0722 * image[...,2] # conversion to Y
+    return ColorSpaceView.of(image).luminance
 
 def getlog2luminance(image):
     image = getluminance(image)
@@ -496,18 +851,24 @@ def getlog2luminance(image):
     return numpy.log2(image)
 
 def setlog2luminance(image, shift):
-    image = numpy.log2(eps + rgb_to_xyY(image)*(1-eps))
-    image[..., 2] += shift
-    return xyY_to_rgb(((2 ** image) - eps)/(1-eps)) 
+    image = ColorSpaceView.of(image)
+    def shifted(xyY):
+        xyY = numpy.log2(eps + xyY*(1-eps))
+        xyY[..., 2] += shift
+        return xyY_to_rgb(((2 ** xyY) - eps)/(1-eps)) 
+    return chunked(shifted, image.xyY, threads=image.threads)
 
 def getsaturation(image):
-    hsv = rgb_to_hsv(image)
+    hsv = ColorSpaceView.of(image).hsv
     return hsv[..., 1]
 
 def setsaturation(image, shift):
-    image = rgb_to_hsv(image)
-    image[..., 1] += shift
-    return hsv_to_rgb(image.clip(0,1))
+    image = ColorSpaceView.of(image)
+    def shifted(hsv):
+        hsv = hsv.copy()
+        hsv[..., 1] += shift
+        return hsv_to_rgb(hsv.clip(0,1))
+    return chunked(shifted, image.hsv, threads=image.threads)
 
 def getlog2saturation(image):
     image = getsaturation(image)
@@ -515,38 +876,47 @@ def getlog2saturation(image):
     return numpy.log2(image)
 
 def setlog2saturation(image, shift):
-    image = numpy.log2(eps + rgb_to_hsv(image)*(1-eps))
-    image[..., 1] += shift
-    return hsv_to_rgb(((2 ** image) - eps)/(1-eps))
+    image = ColorSpaceView.of(image)
+    def shifted(hsv):
+        hsv = numpy.log2(eps + hsv*(1-eps))
+        hsv[..., 1] += shift
+        return hsv_to_rgb(((2 ** hsv) - eps)/(1-eps))
+    return chunked(shifted, image.hsv, threads=image.threads)
 
 def getcolortemp(image):
-    return xyY_to_cct(rgb_to_xyY(image))[...,0]
+    return ColorSpaceView.of(image).cct[...,0]
     
 def setcolortemp(image, shift):
-    # convert into xyY space
-    xyY = rgb_to_xyY(image)
-    # next convert to a color temperature
-    temp = xyY_to_cct(xyY)
-    
-    # shift the color temperature mired by the specified amount
-    temp[..., 0] += shift
-    
-    # convert the color temperature back into xy chromaticity
-    xynew = cct_to_xy(temp)
-    xyY[...,0] = xynew[...,0]
-    xyY[...,1] = xynew[...,1]
-    
-    # finally, back into rgb
-    return xyY_to_rgb(xyY.clip(0,1))
+    image = ColorSpaceView.of(image)
+    def shifted(xyY, temp):
+        # convert into xyY space
+        xyY = xyY.copy()
+        # next convert to a color temperature
+        temp = temp.copy()
+        
+        # shift the color temperature mired by the specified amount
+        temp[..., 0] += shift
+        
+        # convert the color temperature back into xy chromaticity
+        xynew = cct_to_xy(temp, lookup=image.cct_lookup)
+        xyY[...,0] = xynew[...,0]
+        xyY[...,1] = xynew[...,1]
+        
+        # finally, back into rgb
+        return xyY_to_rgb(xyY.clip(0,1))
+    return chunked(shifted, (image.xyY, image.cct), threads=image.threads)
 
 def gethue(image):
-    return rgb_to_hsv(image)[..., 0]
+    return ColorSpaceView.of(image).hsv[..., 0]
 
 def sethue(image, shift):
-    image = rgb_to_hsv(image)
-    image[..., 0] += shift
-    image[..., 0] = image[..., 0] % 1.0
-    return hsv_to_rgb(image)
+    image = ColorSpaceView.of(image)
+    def shifted(hsv):
+        hsv = hsv.copy()
+        hsv[..., 0] += shift
+        hsv[..., 0] = hsv[..., 0] % 1.0
+        return hsv_to_rgb(hsv)
+    return chunked(shifted, image.hsv, threads=image.threads)
 
 def getcontrast(image):
     luminance = getluminance(image)
@@ -556,8 +926,11 @@ def getcontrast_from_xyY(image):
     luminance = image[...,2]
     return getcontrast_from_lum(luminance)
 
-def getcontrast_from_lum(luminance):
+def getcontrast_from_lum(luminance, stacked=False):
     sigma = 1.5
+    if stacked:
+        # blocks stacked along the first axis are each measured on their own
+        sigma = (0,) + (sigma,) * (luminance.ndim - 1)
     avgluminance = scipy.ndimage.filters.gaussian_filter(luminance, sigma, truncate=3.0) 
     mask = (avgluminance != 0)
     contrast = numpy.zeros_like(luminance)
@@ -591,6 +964,5 @@ statfuncs = {'luminance': {'get':getlog2luminance,
                          'lower_fill_threshold':100,
                          'scale':1.0}}
 
-
-
-    
\ No newline at end of file
+# the order in which the shifted statistics are matched, after contrast
+_stat_order = ('luminance', 'cct', 'saturation')
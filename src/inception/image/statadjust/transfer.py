@@ -0,0 +1,130 @@
+"""
+Fast sRGB transfer functions by table lookup.
+8-bit images are converted exactly through a 256 entry table, while floating point images are converted by
+linear interpolation of a fine table, in their own precision and optionally in place
+"""
+
+import numpy
+from .colorspace import srgb_to_linear as exact_srgb_to_linear, linear_to_srgb as exact_linear_to_srgb
+
+# the number of intervals in the tables for floating point images
+_table_size = 4096
+
+class TransferTable(object):
+    """
+    A lookup table for a transfer function over [0,1].  Values are tabulated at evenly spaced points of
+    t where value = t**power, so that with power > 1 the table is finer toward 0, where the inverse of the
+    sRGB curve bends sharply.  Values outside of [0,1] are converted exactly
+    """
+    def __init__(self, function, size=_table_size, power=1):
+        """
+        Builds the table
+
+        :Parameters:
+            function : `function`
+                The exact transfer function, which converts an array
+            size : `int`
+                The number of intervals in the table for floating point images. Default=4096
+            power : `int`
+                The spacing of the table points, as above. Default=1
+        """
+        self.function = function
+        self.size = size
+        self.power = power
+
+        self.table8 = function(numpy.arange(256) / 255.0)
+        points = function((numpy.arange(size + 1) / float(size)) ** power)
+        self._tables = {}
+        for dtype in (numpy.float32, numpy.float64):
+            # store each interval's start and slope, with a repeat of the last for an input of exactly 1
+            start = numpy.append(points[:-1], points[-1]).astype(dtype)
+            slope = numpy.append(numpy.diff(points), 0).astype(dtype)
+            self._tables[numpy.dtype(dtype)] = (start, slope)
+
+    def __call__(self, image, out=None):
+        """
+        Converts the image
+
+        :Parameters:
+            image : `numpy.array`
+                The image to convert, either 8-bit or floating point
+            out : `numpy.array`
+                If given, the floating point array to write the result into, which may be the image itself.
+                Default=None
+
+        :Returns:
+            The converted image, in the precision of `out` if given, otherwise of the image, with 8-bit
+            images converted to double precision
+
+        :Rtype:
+            `numpy.array`
+        """
+        image = numpy.asarray(image)
+        if out is None:
+            out = numpy.empty(image.shape, dtype=image.dtype if image.dtype.kind == 'f' else numpy.float64)
+
+        if image.dtype == numpy.uint8:
+            return numpy.take(self.table8.astype(out.dtype), image, out=out)
+
+        start, slope = self._tables.get(out.dtype) or self._tables[numpy.dtype(numpy.float64)]
+        position = image.astype(out.dtype)
+        outside = ~((position >= 0) & (position <= 1))
+        if outside.any():
+            exact = self.function(image[outside].astype(numpy.float64))
+            position[outside] = 0
+        if self.power == 2:
+            numpy.sqrt(position, out=position)
+        elif self.power != 1:
+            numpy.power(position, 1.0 / self.power, out=position)
+        position *= self.size
+        index = position.astype(numpy.intp)
+        position -= index
+
+        numpy.multiply(numpy.take(slope, index), position, out=out)
+        out += numpy.take(start, index)
+        if outside.any():
+            out[outside] = exact
+        return out
+
+_srgb_to_linear = TransferTable(exact_srgb_to_linear)
+_linear_to_srgb = TransferTable(exact_linear_to_srgb, power=2)
+
+def srgb_to_linear(image, out=None):
+    """
+    Converts the given image from sRGB color space to linear color space by table lookup.
+    Double precision images agree with `colorspace.srgb_to_linear` to within 1e-7
+
+    :Parameters:
+        image : `numpy.array`
+            The sRGB image, either 8-bit or floating point
+        out : `numpy.array`
+            If given, the floating point array to write the result into, which may be the image itself.
+            Default=None
+
+    :Returns:
+        The image in linear color space
+
+    :Rtype:
+        `numpy.array`
+    """
+    return _srgb_to_linear(image, out)
+
+def linear_to_srgb(image, out=None):
+    """
+    Converts the given image from linear color space to sRGB color space by table lookup.
+    Double precision images agree with `colorspace.linear_to_srgb` to within 1e-6
+
+    :Parameters:
+        image : `numpy.array`
+            The linear image, either 8-bit or floating point
+        out : `numpy.array`
+            If given, the floating point array to write the result into, which may be the image itself.
+            Default=None
+
+    :Returns:
+        The image in sRGB color space
+
+    :Rtype:
+        `numpy.array`
+    """
+    return _linear_to_srgb(image, out)
@@ -0,0 +1,105 @@
+"""
+Per-pixel color transforms baked into 3D lookup tables, so that a chain of color space round trips measured
+once can be applied to any number of images, at any resolution, in a single interpolation pass
+"""
+
+import numpy
+import scipy.ndimage
+from ..image import as_float
+
+# the number of table points along each channel
+_lut_size = 33
+# the largest error allowed at the center of a cell before its colors are transformed exactly
+_tolerance = 1 / 255.0
+
+class ColorTransform(object):
+    """
+    A per-pixel transform of sRGB colors, tabulated on a regular grid over the RGB cube and applied by
+    trilinear interpolation.  The transform only depends on each pixel's own color, so the same table
+    applies equally to the image it was measured on, a resized copy of it, or later frames of a sequence.
+    Interpolation is checked against the transform at the center of every cell, and colors in and around
+    cells where it is off by more than the tolerance, e.g. where the transform jumps, are transformed exactly
+    """
+    def __init__(self, function, size=_lut_size, tolerance=_tolerance):
+        """
+        Bakes the given function into a table
+
+        :Parameters:
+            function : `function`
+                The transform, which takes an array of sRGB colors of shape (n, 3) in [0,1] and returns
+                the transformed sRGB colors in the same shape
+            size : `int`
+                The number of table points along each channel. Default=33
+            tolerance : `float`
+                The largest error allowed in any channel at the center of a cell before colors in that cell
+                are transformed exactly. Default=1/255.
+        """
+        self.function = function
+        self.size = size
+        self.table = self._evaluate(numpy.linspace(0, 1, size))
+        
+        last = size - 1
+        centers = self._evaluate((numpy.arange(last) + .5) / last)
+        corners = self.table.reshape(size, size, size, 3)
+        interpolated = sum(corners[i:last + i, j:last + j, k:last + k] 
+                           for i in (0, 1) for j in (0, 1) for k in (0, 1)) / 8.0
+        error = abs(centers.reshape(interpolated.shape) - interpolated).max(axis=-1)
+        # a jump can pass through a cell without moving its center, so the cells next to those found are 
+        # transformed exactly too
+        self.exact = scipy.ndimage.binary_dilation(error > tolerance).ravel()
+
+    def _evaluate(self, levels):
+        """
+        Evaluates the function on the grid of colors with the given levels along each channel, flattened
+        """
+        count = levels.size
+        grid = numpy.empty((count, count, count, 3))
+        grid[..., 0] = levels[:, numpy.newaxis, numpy.newaxis]
+        grid[..., 1] = levels[numpy.newaxis, :, numpy.newaxis]
+        grid[..., 2] = levels[numpy.newaxis, numpy.newaxis, :]
+        return numpy.asarray(self.function(grid.reshape(-1, 3)), dtype=numpy.float64).reshape(-1, 3)
+
+    def __call__(self, image):
+        """
+        Applies the transform to the given image
+
+        :Parameters:
+            image : `numpy.array`
+                The sRGB image, either 8-bit or floating point, whose channels past the first three
+                are passed through untouched
+
+        :Returns:
+            The transformed image, in the precision of the image, with 8-bit images in double precision
+
+        :Rtype:
+            `numpy.array`
+        """
+        image = as_float(numpy.asarray(image))
+        rgb = image[..., :3]
+        dtype = image.dtype
+        last = self.size - 1
+
+        position = rgb.clip(0, 1) * last
+        index = numpy.minimum(position.astype(numpy.intp), last - 1)
+        position -= index
+        base = (index[..., 0] * self.size + index[..., 1]) * self.size + index[..., 2]
+
+        # weigh the 8 corners of the cell each pixel falls in
+        table = self.table.astype(dtype)
+        result = numpy.zeros(rgb.shape, dtype=dtype)
+        for corner in range(8):
+            steps = ((corner >> 2) & 1, (corner >> 1) & 1, corner & 1)
+            weight = numpy.ones(rgb.shape[:-1], dtype=dtype)
+            for channel, step in enumerate(steps):
+                weight *= position[..., channel] if step else 1 - position[..., channel]
+            offset = (steps[0] * self.size + steps[1]) * self.size + steps[2]
+            result += weight[..., numpy.newaxis] * numpy.take(table, base + offset, axis=0)
+
+        # colors in cells that do not interpolate well are transformed exactly
+        exact = numpy.take(self.exact, (index[..., 0] * last + index[..., 1]) * last + index[..., 2])
+        if exact.any():
+            result[exact] = self.function(rgb[exact].clip(0, 1))
+
+        if image.shape[-1] > 3:
+            result = numpy.concatenate((result, image[..., 3:]), axis=-1)
+        return result
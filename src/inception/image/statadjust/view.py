@@ -0,0 +1,172 @@
+"""
+Lazily computed, memoized color spaces of a single image, so that statistics measured on the same image
+in several color spaces only convert it once
+"""
+
+import numpy
+from .transfer import linear_to_srgb, srgb_to_linear
+from .colorspace import rgb_to_xyY, rgb_to_hsv, xyY_to_cct, chunked
+
+class ColorSpaceView(object):
+    """
+    A view of an RGB image in each of the color spaces used for statistical image adjustment.
+    Each color space is only computed the first time it is asked for and is then remembered until the
+    image is written to.  The arrays handed out are read-only, since they are shared by everything
+    measuring the image; to change the image, assign a new linear or sRGB image to the view, which
+    forgets every color space computed from the old one.  Color spaces are converted in blocks of rows,
+    see `chunked`, so the conversions only need memory for the color spaces themselves
+    """
+    def __init__(self, image, linear=True, cct_lookup=False, threads=1):
+        """
+        Initializes the view
+
+        :Parameters:
+            image : `numpy.array`
+                The RGB image, whose channels past the first three are ignored
+            linear : `bool`
+                If True, the image is in linear color space, otherwise it is in sRGB color space. Default=True
+            cct_lookup : `bool`
+                If True, color temperatures are interpolated from the shared `CCTLookupTable` rather than
+                converted exactly. Default=False
+            threads : `int`
+                The number of threads to convert blocks of rows on, or None for one per cpu. Default=1
+        """
+        self.cct_lookup = cct_lookup
+        self.threads = threads
+        self._spaces = {}
+        if linear:
+            self.linear = image
+        else:
+            self.srgb = image
+
+    @classmethod
+    def of(cls, image):
+        """
+        Gets a view of the given image
+
+        :Parameters:
+            image : `numpy.array` or `ColorSpaceView`
+                The linear RGB image or a view of it
+
+        :Returns:
+            The image itself if it is already a view, otherwise a new view of the linear RGB image
+
+        :Rtype:
+            `ColorSpaceView`
+        """
+        if isinstance(image, cls):
+            return image
+        return cls(image)
+
+    def invalidate(self):
+        """
+        Forgets every color space computed so far, apart from the one the view was last given,
+        e.g. after the underlying image has been modified in place
+        """
+        for name in self._spaces.keys():
+            if name != self._source:
+                del self._spaces[name]
+
+    @property
+    def linear(self):
+        """
+        The image in linear RGB color space
+
+        :Rtype:
+            `numpy.array`
+        """
+        return self._get('linear', lambda: self._convert(srgb_to_linear, self.srgb))
+
+    @linear.setter
+    def linear(self, image):
+        self._set('linear', image)
+
+    @property
+    def srgb(self):
+        """
+        The image in sRGB color space
+
+        :Rtype:
+            `numpy.array`
+        """
+        return self._get('srgb', lambda: self._convert(linear_to_srgb, self.linear))
+
+    @srgb.setter
+    def srgb(self, image):
+        self._set('srgb', image)
+
+    @property
+    def luminance(self):
+        """
+        The luminance (Y) of the image
+
+        :Rtype:
+            `numpy.array`
+        """
+        def compute():
+            image = self.linear
+            return .2126 * image[...,0] + .7152 * image[...,1] + .0722 * image[...,2] # conversion to Y
+        return self._get('luminance', compute)
+
+    @property
+    def xyY(self):
+        """
+        The image in xyY color space
+
+        :Rtype:
+            `numpy.array`
+        """
+        return self._get('xyY', lambda: self._convert(rgb_to_xyY, self.linear))
+
+    @property
+    def hsv(self):
+        """
+        The image in HSV color space
+
+        :Rtype:
+            `numpy.array`
+        """
+        return self._get('hsv', lambda: self._convert(rgb_to_hsv, self.linear))
+
+    @property
+    def cct(self):
+        """
+        The correlated color temperature of the image, as a 2-channel image of mired, tint
+
+        :Rtype:
+            `numpy.array`
+        """
+        return self._get('cct', lambda: self._convert(xyY_to_cct, self.xyY, lookup=self.cct_lookup))
+
+    def _convert(self, function, image, **kwargs):
+        """
+        Converts the image with the given color space conversion, in blocks of rows
+        """
+        return chunked(function, image, threads=self.threads, **kwargs)
+
+    def _get(self, name, compute):
+        """
+        Gets the named color space, computing and remembering it if need be
+        """
+        space = self._spaces.get(name)
+        if space is None:
+            space = self._spaces[name] = _readonly(compute())
+        return space
+
+    def _set(self, name, image):
+        """
+        Replaces the image with one in the named color space, forgetting every other color space
+        """
+        image = numpy.asarray(image)
+        if image.ndim > 2 and image.shape[2] > 3:
+            image = image[..., :3]
+        self._source = name
+        self._spaces = {name: _readonly(image)}
+
+def _readonly(array):
+    """
+    Gets a read-only view of the given array, leaving the array itself untouched
+    """
+    array = array.view()
+    array.flags.writeable = False
+    return array
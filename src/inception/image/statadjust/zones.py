@@ -0,0 +1,86 @@
+"""
+Zone statistics of image measures, found by selection rather than by sorting every pixel.
+Each zone is the same set of values, in the same (descending) order, as the corresponding slice of
+the fully sorted measure, so statistics taken on the zones are unchanged
+"""
+
+import math
+import numpy
+
+def zones(measure, top_ratio, bottom_ratio):
+    """
+    Finds the high and low zones of the given measure, i.e. for the measure sorted from high to low,
+    the slices measure[:floor(top_ratio*n)] and measure[floor(bottom_ratio*n):], in linear time
+
+    :Parameters:
+        measure : `numpy.array`
+            The one-dimensional measure values
+        top_ratio : `float`
+            The fraction of values in the high zone
+        bottom_ratio : `float`
+            The fraction of values above the low zone
+
+    :Returns:
+        A tuple of (low, high) zones, each sorted from high to low
+
+    :Rtype:
+        `tuple`
+    """
+    size = measure.size
+    high_start = size - _count(top_ratio, size)
+    low_count = size - _count(bottom_ratio, size)
+
+    kth = [k for k in (low_count - 1, high_start) if 0 <= k < size]
+    if kth:
+        measure = numpy.partition(measure, kth)
+    return (_descending(measure[:low_count]), _descending(measure[high_start:]))
+
+def high_zone(measure, top_ratio):
+    """
+    Finds the high zone of the given measure, as in `zones`
+
+    :Parameters:
+        measure : `numpy.array`
+            The one-dimensional measure values
+        top_ratio : `float`
+            The fraction of values in the high zone
+
+    :Returns:
+        The high zone, sorted from high to low
+
+    :Rtype:
+        `numpy.array`
+    """
+    return zones(measure, top_ratio, 1)[1]
+
+def kth_smallest(measure, k):
+    """
+    Finds the value that would be at index k of the measure sorted from low to high, in linear time
+
+    :Parameters:
+        measure : `numpy.array`
+            The one-dimensional measure values
+        k : `int`
+            The index into the sorted values
+
+    :Returns:
+        The k-th smallest value
+
+    :Rtype:
+        `float`
+    """
+    k = int(k)
+    return numpy.partition(measure, k)[k]
+
+def _count(ratio, size):
+    """
+    The number of values within the given fraction of the measure, as sliced by the sort-based statistics
+    """
+    return min(max(int(math.floor(ratio * size)), 0), size)
+
+def _descending(zone):
+    """
+    Sorts the (small) zone from high to low
+    """
+    zone = numpy.sort(zone)
+    return zone[::-1]
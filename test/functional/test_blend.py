@@ -0,0 +1,125 @@
+from inception.image.blend.multiband import *
+from inception.image.blend.poisson import poisson_blend, poisson_blend_many
+
+if __name__ == '__main__':
+    import time
+    from inception.image.image import Image
+    from inception.image.operation.poisson import PoissonOperation, PoissonBatchOperation
+    
+    print("Running blending tests")
+    
+    # a smooth background and a flat colored object with a soft edged matte
+    rows, cols = numpy.mgrid[0:600, 0:800]
+    dest = numpy.dstack((cols / 800.0, rows / 600.0, .5 * numpy.ones_like(rows)))
+    source = numpy.zeros((200, 150, 4))
+    source[..., :3] = (.9, .3, .2)
+    source[20:180, 20:130, 3] = 1
+    
+    def test_roi():
+        print("Testing that only the region around the source changes")
+        for offset in [(100, 100), (-50, -40), (500, 700), (700, 900)]:
+            result = multiband_blend(source, dest, offset)
+            changed = numpy.argwhere(numpy.abs(result - dest).max(axis=2) > 1e-6)
+            print offset, (changed.min(axis=0), changed.max(axis=0)) if changed.size else None
+    
+    test_roi()
+    
+    def test_uint8():
+        print("Testing that 8-bit images blend the same as floating point ones")
+        from inception.image.operation.blend import MultibandBlendOperation
+        expected = MultibandBlendOperation(Image(source.copy()), Image(dest), offset=(100, 100)).run()
+        for source_dtype, dest_dtype in [('uint8', None), (None, 'uint8'), ('uint8', 'uint8')]:
+            result = MultibandBlendOperation(Image(source.copy(), dtype=source_dtype), Image(dest, dtype=dest_dtype), 
+                                             offset=(100, 100)).run()
+            print source_dtype, dest_dtype, result.dtype == (dest_dtype or expected.dtype), \
+                numpy.abs(as_float(result.data) - expected.data).max() < 3. / 255
+    
+    test_uint8()
+    
+    def test_speed():
+        print("Comparing speed against poisson blending")
+        background = Image(numpy.random.rand(2000, 3000, 3), dtype='uint8')
+        foreground = Image(source.copy())
+        
+        start = time.time()
+        multiband_blend(foreground.data, background.data, (1000, 1000))
+        print("Multi-band: %.3fs" % (time.time() - start))
+        
+        start = time.time()
+        PoissonOperation(foreground, background, offset=(1000, 1000)).run()
+        print("Poisson: %.3fs" % (time.time() - start))
+    
+    test_speed()
+    
+    def test_poisson():
+        print("Testing that a native poisson blend of the destination into itself is a no-op")
+        for offset in [(100, 100), (-50, -40), (500, 700), (0, 0)]:
+            rr = numpy.clip(numpy.arange(200) + offset[0], 0, dest.shape[0] - 1)
+            cc = numpy.clip(numpy.arange(150) + offset[1], 0, dest.shape[1] - 1)
+            copy = source.copy()
+            copy[..., :3] = dest[rr][:, cc]
+            print offset, numpy.abs(poisson_blend(copy, dest, offset) - dest).max() < 1e-10
+            
+        print("Comparing native poisson blending against opencv")
+        foreground, background = Image(source.copy()), Image(dest)
+        native = PoissonOperation(foreground, background, offset=(100, 100), solver='native').run()
+        opencv = PoissonOperation(foreground, background, offset=(100, 100)).run()
+        difference = numpy.abs(native.data - opencv.data).mean()
+        print("Mean absolute difference: %s" % difference)
+        print difference < .01
+        
+        print("Testing that an 8-bit source with a soft matte blends the same as a floating point one")
+        soft = source.copy()
+        soft[..., 3] = numpy.minimum(numpy.minimum(rows[:200, :150], 199 - rows[:200, :150]), 
+                                     numpy.minimum(cols[:200, :150], 149 - cols[:200, :150])) / 40.0
+        numpy.clip(soft[..., 3], 0, 1, out=soft[..., 3])
+        for solver in ['native', 'opencv']:
+            results = [PoissonOperation(Image(soft.copy(), dtype=dtype), Image(dest), offset=(100, 100), 
+                                        solver=solver).run() for dtype in [None, 'uint8']]
+            print solver, numpy.abs(results[0].data - results[1].data).max() < 3. / 255
+        
+        print("Testing that a flat object with black under its transparent border blends into a flat background")
+        flat = numpy.zeros((60, 60, 4))
+        flat[10:50, 10:50] = (.5, .5, .5, 1)
+        for solver in ['native', 'opencv']:
+            result = PoissonOperation(Image(flat.copy()), Image(numpy.zeros((200, 200, 3)) + .3), offset=(50, 50), 
+                                      solver=solver).run()
+            print solver, numpy.abs(result.data - .3).max() < 1. / 255
+        
+    test_poisson()
+    
+    def test_poisson_many():
+        print("Testing that disjoint sources blended together match blending them one at a time")
+        sources = [source.copy() for _ in range(3)]
+        for i, copy in enumerate(sources):
+            copy[..., i] = .1
+        offsets = [(50, 50), (300, 400), (-20, 700)]
+        sequential = dest
+        for copy, offset in zip(sources, offsets):
+            sequential = poisson_blend(copy, sequential, offset)
+        print numpy.abs(poisson_blend_many(sources, dest, offsets) - sequential).max() < 1e-10
+        print numpy.abs(poisson_blend_many(sources, dest, offsets, threads=1) - sequential).max() < 1e-10
+        
+        print("Testing that overlapping sources are solved together over the union of their regions")
+        offsets = [(50, 50), (150, 120)]
+        result = poisson_blend_many(sources[:2], dest, offsets)
+        changed = numpy.argwhere(numpy.abs(result - dest).max(axis=2) > 1e-6)
+        print (tuple(changed.min(axis=0)), tuple(changed.max(axis=0))) == ((69, 69), (330, 250))
+        copies = [source.copy() for _ in offsets]
+        for copy, (top, left) in zip(copies, offsets):
+            copy[..., :3] = dest[top:top + 200, left:left + 150]
+        print numpy.abs(poisson_blend_many(copies, dest, offsets) - dest).max() < 1e-10
+        
+        print("Testing that overlapping flat objects with black under their transparent borders blend in flat")
+        flat = numpy.zeros((60, 60, 4))
+        flat[10:50, 10:50] = (.5, .5, .5, 1)
+        background = Image(numpy.zeros((200, 200, 3)) + .3)
+        result = PoissonBatchOperation([Image(flat.copy()), Image(flat.copy())], background, [(20, 20), (40, 50)]).run()
+        print numpy.abs(result.data - .3).max() < 1e-10
+        
+        print("Testing that the destination's representation is kept")
+        background = Image(numpy.zeros((200, 200, 3)) + .3, dtype='uint8')
+        result = PoissonBatchOperation([Image(flat.copy()), Image(flat.copy())], background, [(20, 20), (40, 50)]).run()
+        print result.dtype == numpy.uint8, numpy.abs(result.data.astype(int) - background.data).max() <= 1
+    
+    test_poisson_many()
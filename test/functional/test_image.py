@@ -0,0 +1,269 @@
+from inception.image.image import *
+
+if __name__ == '__main__':
+    # unittests
+    # TODO: remove all this add to more official unittests
+
+    print("Running image tests")
+
+    def test_clone():
+        print("Testing clone")
+        # writing to either side of a clone leaves the other untouched
+        image = Image(numpy.zeros((4, 5, 3)))
+        clone = image.clone()
+        clone[0, 0] = 1
+        print image.data.max() == 0 and clone.data[0, 0].min() == 1
+
+        image = Image(numpy.zeros((4, 5, 3)))
+        clone = image.clone()
+        image[0, 0] = 1
+        print clone.data.max() == 0 and image.data[0, 0].min() == 1
+
+        # as do in-place array methods and writes through the data once detached
+        image = Image(numpy.zeros((4, 5, 3)))
+        clone = image.clone()
+        clone.fill(1)
+        image.detach()
+        image.data[...] = 3
+        print clone.data.min() == 1 and image.data.min() == 3
+
+        # reads of shared data are read-only views rather than copies
+        image = Image(numpy.zeros((4, 5, 3)))
+        clone = image.clone()
+        views = [clone.data, clone[0:2, 0:2], clone[..., 0], clone.T]
+        print all(not view.flags.writeable and numpy.may_share_memory(view, image.data) for view in views)
+        print clone.mean() == 0 and image.data.flags.writeable == False
+        try:
+            clone[..., 0][numpy.ones((4, 5), bool)] = 2
+            print False
+        except ValueError:
+            print True
+
+        # and become writable once the data is no longer shared
+        clone.detach()
+        clone[..., 0][numpy.ones((4, 5), bool)] = 2
+        print clone.data[..., 0].min() == 2 and image.data.max() == 0 and image.data.flags.writeable
+
+    test_clone()
+
+    def test_from_any():
+        print("Testing from_any")
+        # a clone of a wrapper of an image doesn't see later writes to that image
+        image = Image(numpy.zeros((4, 5, 3)))
+        clone = Image.from_any(image).clone()
+        image[...] = 1
+        print clone.data.max() == 0
+
+        image = Image(numpy.zeros((4, 5, 3)))
+        clone = Image.from_any(image).clone()
+        image.fill(1)
+        print clone.data.max() == 0
+
+        image = Image(numpy.zeros((4, 5, 3)))
+        wrapper = Image.from_any(image)
+        clone = wrapper.clone()
+        wrapper[...] = 1
+        print image.data.max() == 0 and clone.data.max() == 0
+
+    test_from_any()
+
+    def test_to_rgba():
+        print("Testing to_rgb and to_rgba")
+        for rgba_storage in [False, True]:
+            set_rgba_storage(rgba_storage)
+
+            # on a clone
+            rgba = numpy.zeros((4, 5, 4))
+            rgba[..., 3] = .5
+            image = Image(rgba)
+            clone = image.clone()
+            clone.to_rgb()
+            clone.to_rgba()
+            print image.data[..., 3].max() == .5 and clone.data[..., 3].min() == 1
+
+            # on a wrapper
+            rgba = numpy.zeros((4, 5, 4))
+            rgba[..., 3] = .5
+            image = Image(rgba)
+            wrapper = Image.from_any(image)
+            wrapper.to_rgb()
+            wrapper.to_rgba()
+            print image.data[..., 3].max() == .5 and wrapper.data[..., 3].min() == 1
+
+            # on an RGB image, whose clone keeps only the color channels
+            image = Image(numpy.zeros((4, 5, 3)))
+            clone = image.clone()
+            image.to_rgba()
+            print image.data.shape == (4, 5, 4) and image.data[..., 3].min() == 1 and clone.data.shape == (4, 5, 3)
+        set_rgba_storage(False)
+
+    test_to_rgba()
+
+    def test_setitem_channel():
+        print("Testing setting a whole channel")
+        image = Image(numpy.zeros((4, 5, 4)))
+        image[..., 1] = 1
+        clone = image.clone()
+        clone[..., 3] = 1
+        print image.data[..., 3].max() == 0 and image.data[..., 1].min() == 1
+        print clone.data[..., 3].min() == 1 and clone.data[..., 1].min() == 1
+        print clone.data[..., 0].max() == 0 and clone.data[..., 2].max() == 0
+
+    test_setitem_channel()
+
+    def test_magic_insert_copies():
+        print("Testing that magic_insert never copies the background")
+        from inception.base import magic_insert
+        copies = []
+        own = Image._own
+        def counting_own(self, data):
+            copies.append(data.shape)
+            return own(self, data)
+        Image._own = counting_own
+        try:
+            for dtype in [None, 'uint8']:
+                background = Image((numpy.random.rand(300, 400, 3) * 127 + 50).astype('uint8'), dtype=dtype)
+                foreground = numpy.zeros((80, 60, 3), numpy.uint8) + 255
+                foreground[10:70, 10:50] = (200, 50, 25)
+                before = background.data.copy()
+                del copies[:]
+                magic_insert(foreground, background, [50, 150, 110, 230], generate_shadow=False)
+                print (before == background.data).all(), copies == [(80, 60, 4)]
+        finally:
+            Image._own = own
+
+    test_magic_insert_copies()
+
+    def write_striped_tiff(path, pixels, rows_per_strip):
+        # an uncompressed RGB TIFF split into strips, which PIL itself only writes as a single strip
+        import struct
+        height, width = pixels.shape[:2]
+        strips = [pixels[y:y + rows_per_strip].tobytes() for y in range(0, height, rows_per_strip)]
+        offsets = [8 + sum(len(strip) for strip in strips[:i]) for i in range(len(strips))]
+        ifd = 8 + sum(len(strip) for strip in strips)
+        entries = [(256, 4, [width]), (257, 4, [height]), (258, 3, [8, 8, 8]), (259, 3, [1]), (262, 3, [2]),
+                   (273, 4, offsets), (277, 3, [3]), (278, 4, [rows_per_strip]), 
+                   (279, 4, [len(strip) for strip in strips])]
+        extra_offset, header, extra = ifd + 2 + 12 * len(entries) + 4, '', ''
+        for tag, kind, values in entries:
+            raw = struct.pack('<%d%s' % (len(values), {3: 'H', 4: 'I'}[kind]), *values)
+            if len(raw) <= 4:
+                header += struct.pack('<HHI', tag, kind, len(values)) + raw.ljust(4, '\0')
+            else:
+                header += struct.pack('<HHII', tag, kind, len(values), extra_offset + len(extra))
+                extra += raw
+        with open(path, 'wb') as f:
+            f.write('II*\0' + struct.pack('<I', ifd) + ''.join(strips))
+            f.write(struct.pack('<H', len(entries)) + header + struct.pack('<I', 0) + extra)
+
+    def test_region():
+        print("Testing loading a region of an image file")
+        import os, shutil, tempfile
+        from PIL import Image as PILImage
+        directory = tempfile.mkdtemp()
+        try:
+            pixels = (numpy.random.RandomState(0).rand(200, 300, 3) * 255).astype('uint8')
+            paths = [os.path.join(directory, name) for name in ['striped.tif', 'image.png', 'image.jpg']]
+            write_striped_tiff(paths[0], pixels, 16)
+            PILImage.fromarray(pixels).save(paths[1])
+            PILImage.fromarray(pixels).save(paths[2], quality=95)
+            print len(PILImage.open(paths[0]).tile) == 13
+            for path in paths:
+                full = Image.from_filepath(path, dtype='uint8', lazy=False).data
+                for region in [(10, 20, 90, 150), (130, 250, 400, 400), (-5, -5, 64, 64), (70, 70, 71, 71)]:
+                    for lazy in [True, False]:
+                        image = Image.from_filepath(path, dtype='uint8', lazy=lazy, region=region)
+                        top, left = max(region[0], 0), max(region[1], 0)
+                        print image.frame_offset == (top, left) and (image.data == full[top:region[2], left:region[3]]).all()
+        finally:
+            shutil.rmtree(directory)
+
+    test_region()
+
+    def test_lazy():
+        print("Testing that lazily loaded images don't keep their file open")
+        import os, shutil, tempfile
+        from PIL import Image as PILImage
+        directory = tempfile.mkdtemp()
+        try:
+            pixels = (numpy.random.RandomState(0).rand(200, 300, 3) * 255).astype('uint8')
+            for name in ['image.png', 'image.jpg']:
+                path = os.path.join(directory, name)
+                PILImage.fromarray(pixels).save(path)
+                for max_size, region in [(None, None), ((100, 60), None), (None, (10, 20, 90, 150))]:
+                    expected = Image.from_filepath(path, lazy=False, max_size=max_size, region=region).data
+                    descriptors = len(os.listdir('/proc/self/fd'))
+                    images = [Image.from_filepath(path, max_size=max_size, region=region) for i in range(10)]
+                    print len(os.listdir('/proc/self/fd')) == descriptors
+                    print all(not image.loaded and image.shape == expected.shape for image in images)
+                    print (images[0].data == expected).all() and images[1].pilimage.size == expected.shape[1::-1]
+                    print (Image.from_any(images[2]).data == expected).all() and not images[2].loaded
+                    print len(os.listdir('/proc/self/fd')) == descriptors
+        finally:
+            shutil.rmtree(directory)
+
+    test_lazy()
+
+    def test_working_dtype():
+        print("Testing that images round trip through a single precision working type")
+        from inception.image.operation.merge import MergeOperation
+        levels = numpy.arange(256, dtype=numpy.uint8).reshape((16, 16))
+        levels = numpy.dstack((levels, levels.T, 255 - levels))
+        layer = numpy.random.RandomState(0).rand(16, 16, 4)
+        merged64 = MergeOperation([Image(levels), Image(layer)]).run()
+        set_working_dtype('float32')
+        try:
+            # every 8-bit level survives the trip to the working type and back
+            image = Image(levels)
+            print image.dtype == numpy.float32 and get_working_dtype() == numpy.float32
+            print (as_uint8(image.data) == levels).all() and (Image(levels, dtype='uint8').data == levels).all()
+            image.to_rgba()
+            print image.dtype == numpy.float32 and image.data[..., 3].min() == 1
+            image.to_uint8()
+            print image.dtype == numpy.uint8 and (image.data[..., :3] == levels).all()
+
+            # wider data is narrowed when wrapped, unless asked for
+            print Image(layer).dtype == numpy.float32 and Image(layer, dtype='float64').dtype == numpy.float64
+            print as_float(levels).dtype == numpy.float32 and float_dtype(numpy.uint8) == numpy.float32
+
+            # and work done in it rounds to the same 8-bit result
+            merged32 = MergeOperation([Image(levels), Image(layer)]).run()
+            print merged32.dtype == numpy.float32 and (as_uint8(merged32.data) == as_uint8(merged64.data)).all()
+        finally:
+            set_working_dtype('float64')
+        try:
+            set_working_dtype('int32')
+            print False
+        except ValueError:
+            print get_working_dtype() == numpy.float64
+
+    test_working_dtype()
+
+    def test_draft():
+        print("Testing that JPEGs are decoded at the smallest scale still large enough")
+        import os, shutil, tempfile
+        from PIL import Image as PILImage
+        directory = tempfile.mkdtemp()
+        try:
+            rows, cols = numpy.mgrid[0:320, 0:400]
+            pixels = numpy.dstack((rows * 255 / 320, cols * 255 / 400, (rows + cols) % 256)).astype('uint8')
+            jpeg, png = os.path.join(directory, 'image.jpg'), os.path.join(directory, 'image.png')
+            PILImage.fromarray(pixels).save(jpeg, quality=95)
+            PILImage.fromarray(pixels).save(png)
+            full = Image.from_filepath(jpeg, lazy=False).data
+            for max_size, shape in [(None, (320, 400)), ((400, 320), (320, 400)), ((150, 100), (160, 200)), 
+                                    ((100, 80), (80, 100)), ((60, 30), (80, 100)), 
+                                    ((50, 40), (40, 50)), ((1, 1), (40, 50))]:
+                lazy, decoded = [Image.from_filepath(jpeg, lazy=flag, max_size=max_size) for flag in [True, False]]
+                # the size is known from the header before decoding, and the pixels are close to averaging
+                # the full size image down, away from the sharp edges of the pattern
+                print lazy.shape[:2] == shape and decoded.shape[:2] == shape and not lazy.loaded
+                factor = 320 / shape[0]
+                averaged = full.reshape((shape[0], factor, shape[1], factor, 3)).mean(axis=(1, 3))
+                print numpy.median(numpy.abs(decoded.data - averaged)) < .02
+                # other formats are decoded at full size
+                print Image.from_filepath(png, max_size=max_size).shape[:2] == (320, 400)
+        finally:
+            shutil.rmtree(directory)
+
+    test_draft()
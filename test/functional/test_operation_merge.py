@@ -0,0 +1,83 @@
+from inception.image.operation.merge import *
+
+if __name__ == '__main__':
+    # unittests
+    # TODO: remove all this add to more official unittests
+
+    print("Running merge tests")
+
+    # an opaque and a transparent bottom layer, and soft edged layers partly off the canvas
+    numpy.random.seed(0)
+    opaque = numpy.random.rand(120, 160, 3)
+    transparent = numpy.random.rand(120, 160, 4)
+    transparent[40:80, 60:100, 3] = 0
+    layers = []
+    for rows, cols in [(50, 70), (80, 40), (30, 30)]:
+        layer = numpy.random.rand(rows, cols, 4)
+        layer[..., 3] = numpy.clip(layer[..., 3] * 1.5 - .25, 0, 1)
+        layers.append(layer)
+    offsets = [(0, 0), (20, 30), (-10, 120), (100, -5)]
+
+    def test_premultiplied():
+        print("Testing that merging with premultiplied alpha matches merging with straight alpha")
+        for bottom in [opaque, transparent]:
+            straight, premultiplied = [MergeOperation([Image(bottom)] + [Image(layer) for layer in layers], offsets,
+                                                      premultiplied=flag).run() for flag in [False, True]]
+            print numpy.abs(straight.data - premultiplied.data).max() < 1e-12
+            print straight.content_bounds == premultiplied.content_bounds
+
+        # and that premultiplying round trips, with fully transparent pixels becoming black
+        image = transparent.copy()
+        print numpy.abs(unpremultiply(premultiply(image))[40:80, 60:100]).max() == 0
+        image[40:80, 60:100, :3] = 0
+        print numpy.abs(unpremultiply(premultiply(image)) - image).max() < 1e-12
+        print numpy.abs(unpremultiply(premultiply(image), out=image) - transparent)[:40].max() < 1e-12
+
+    test_premultiplied()
+
+    def test_fixed_point():
+        print("Testing that 8-bit merges round the same as floating point merges")
+        from inception.image.operation.merge import _div255
+        for bottom in [opaque, transparent]:
+            quantized = [numpy.round(image * 255).astype('uint8') for image in [bottom] + layers]
+            for count in range(2, len(quantized) + 1):
+                fixed = MergeOperation([Image(image, dtype='uint8') for image in quantized[:count]], offsets).run()
+                exact = MergeOperation([Image(image / 255.0) for image in quantized[:count]], offsets).run()
+                difference = numpy.abs(fixed.data.astype(int) - numpy.round(exact.data * 255).astype(int))
+                # a single over rounds to nearest, while each further layer can be off by one more level
+                # at pixels left almost transparent, where the 8-bit colors they are merged over were rounded
+                print fixed.dtype == numpy.uint8, difference.max() <= count - 2 and difference[..., 3].max() == 0
+
+            # floating point layers are rounded to 8-bit on the way in
+            fixed = MergeOperation([Image(quantized[0], dtype='uint8')] + [Image(layer) for layer in layers], offsets)
+            rounded = MergeOperation([Image(image, dtype='uint8') for image in quantized], offsets)
+            print (fixed.run().data == rounded.run().data).all()
+
+        # the rounded division by 255 is exact over its whole range
+        values = numpy.arange(255 * 255 + 1, dtype=numpy.uint16)
+        print (_div255(values.copy()) == numpy.round(values / 255.0)).all()
+
+    test_fixed_point()
+
+    def test_composite():
+        print("Testing that single pass composites match merging one layer at a time")
+        # including a layer that hides everything under it, which is then never composited
+        cover = numpy.random.rand(40, 50, 4)
+        cover[..., 3] = 1
+        for bottom in [opaque, transparent]:
+            for stack in [layers, layers + [cover], [cover] + layers]:
+                images = [Image(bottom)] + [Image(layer) for layer in stack]
+                merged, composited = [operation(images, offsets + [(60, 70)]).run() 
+                                      for operation in [MergeOperation, CompositeOperation]]
+                # the colors of fully transparent pixels are left as they were by merges but are black here
+                visible = merged.data[..., 3] > 0
+                print numpy.abs(merged.data - composited.data)[visible].max() < 1e-12
+                print numpy.abs(merged.data - composited.data)[..., 3].max() < 1e-12, not composited.data[~visible].any()
+                print merged.content_bounds == composited.content_bounds
+        
+        # 8-bit composites are merged in place
+        images = [Image(numpy.round(image * 255).astype('uint8'), dtype='uint8') for image in [opaque] + layers]
+        merged, composited = [operation(images, offsets).run() for operation in [MergeOperation, CompositeOperation]]
+        print composited.dtype == numpy.uint8 and (merged.data == composited.data).all()
+
+    test_composite()
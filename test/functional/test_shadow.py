@@ -7,6 +7,101 @@ if __name__ == '__main__':
     from inception.image.operation.merge import MergeOperation
     from inception.image.operation.scale import ScaleOperation
     from PIL import Image as PILImage
+    from inception.image.shadow.cache import ShadowTemplateCache
+    
+    print("Running shadow tests")
+    
+    class TiltedScene(object):
+        """
+        A scene description for a camera tilted down onto level ground, without estimating it from an image
+        """
+        def __init__(self, width, height, tilt=.35, pan=.3):
+            self.camera_matrix = numpy.array([[1.2 * width, 0, width / 2.0], [0, 1.2 * width, height / 2.0], [0, 0, 1]])
+            tilt = numpy.array([[1, 0, 0], [0, math.cos(tilt), -math.sin(tilt)], [0, math.sin(tilt), math.cos(tilt)]])
+            pan = numpy.array([[math.cos(pan), 0, math.sin(pan)], [0, 1, 0], [-math.sin(pan), 0, math.cos(pan)]])
+            self.rotation = tilt.dot(pan).dot(numpy.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]]))
+            
+        def get_world_to_camera_transformation(self, origin=(0,0)):
+            to_image = self.camera_matrix.dot(self.rotation)
+            return (self.rotation, numpy.linalg.inv(to_image).dot(numpy.array([origin[0], origin[1], 1])))
+    
+    background = Image(numpy.random.rand(300, 400, 3))
+    scene = TiltedScene(400, 300)
+    foreground = numpy.zeros((80, 60, 4))
+    foreground[10:70, 10:50] = (.8, .2, .1, 1)
+    
+    def test_uint8():
+        print("Testing that 8-bit foregrounds cast the same shadows as floating point ones")
+        for offset in [(150, 200), (-30, -20)]:
+            shadows = []
+            for image in [Image(foreground), Image(foreground, dtype='uint8')]:
+                shadows.append([create_shadow(image, background, offset=offset, scene_description=scene),
+                                create_shadows([image], background, [offset], scene_description=scene),
+                                create_shadow(image, background, offset=offset, scene_description=scene, 
+                                              template_cache=ShadowTemplateCache())])
+            print offset, all(numpy.abs(a - b).max() < 1e-6 and a[..., 3].max() > .5 for a, b in zip(*shadows))
+    
+    test_uint8()
+    
+    def test_batch():
+        print("Testing that shadows cast together match shadows cast one at a time")
+        offsets = [(150, 200), (-30, -20), (100, -40), (250, 370), (-60, 360)]
+        images = [Image(foreground) for _ in offsets]
+        for cache in [None, ShadowTemplateCache()]:
+            singles = [create_shadow(image, background, offset=offset, scene_description=scene, template_cache=cache) 
+                       for image, offset in zip(images, offsets)]
+            print all(numpy.abs(create_shadows([image], background, [offset], scene_description=scene, 
+                                               template_cache=cache) - single).max() < 1e-12
+                      for image, offset, single in zip(images, offsets, singles))
+            
+            # the shadows are accumulated alpha over alpha
+            expected = 1 - numpy.prod([1 - single[..., 3] for single in singles], axis=0)
+            batch = create_shadows(images, background, offsets, scene_description=scene, template_cache=cache)
+            print numpy.abs(batch[..., 3] - expected).max() < 1e-6, batch[..., 3].max() > .5
+    
+    test_batch()
+    
+    def test_scaled_bounds():
+        print("Testing that a scaled foreground casts its shadow from its content, not its padded bounds")
+        scaled = ScaleOperation(Image(foreground), 120, 160).run()
+        tight = Image(scaled.data)
+        for cache in [None, ShadowTemplateCache()]:
+            shadows = [create_shadow(image, background, offset=(100, 150), scene_description=scene, template_cache=cache)
+                       for image in [scaled, tight]]
+            print scaled.content_bounds != tight.content_bounds, numpy.abs(shadows[0] - shadows[1]).max() < 1e-12
+    
+    test_scaled_bounds()
+    
+    def test_template_cache():
+        print("Testing that the template cache evicts the least recently used templates to stay in budget")
+        foregrounds = []
+        for width in [20, 30, 40]:
+            silhouette = numpy.zeros((80, 60, 4))
+            silhouette[10:70, 10:10 + width] = (.8, .2, .1, 1)
+            foregrounds.append(silhouette)
+        sizes = [ShadowTemplateCache(resolution=50).create(silhouette, 5, .5, 4).nbytes for silhouette in foregrounds]
+        cache = ShadowTemplateCache(max_bytes=sizes[0] + sizes[1] + sizes[2] - 1, resolution=50)
+        templates = [cache.template(silhouette, 5, .5, 4, key=i) for i, silhouette in enumerate(foregrounds[:2])]
+        print len(cache) == 2 and cache.nbytes == sizes[0] + sizes[1]
+        
+        # a hit returns the same template and marks it as most recently used, so the other one is evicted
+        print cache.template(foregrounds[0], 5, .5, 4, key=0) is templates[0]
+        cache.template(foregrounds[2], 5, .5, 4, key=2)
+        print len(cache) == 2 and cache.nbytes == sizes[0] + sizes[2] and cache.nbytes <= cache.max_bytes
+        print cache.get((0, 5, .5, 4, False, 50)) is templates[0], cache.get((1, 5, .5, 4, False, 50)) is None
+        
+        # the same foreground with other softening parameters is another template
+        print cache.template(foregrounds[0], 10, .5, 4, key=0) is not templates[0] and len(cache) == 3
+        
+        # replacing a template doesn't count it twice, and templates over the whole budget aren't cached
+        cache.put((0, 10, .5, 4, False, 50), templates[0])
+        print len(cache) == 3 and cache.nbytes == 2 * sizes[0] + sizes[2]
+        small = ShadowTemplateCache(max_bytes=sizes[0] - 1, resolution=50)
+        print small.template(foregrounds[0], 5, .5, 4) is not None and len(small) == 0 and small.nbytes == 0
+        cache.clear()
+        print len(cache) == 0 and cache.nbytes == 0
+    
+    test_template_cache()
 
     image = Image.from_filepath("../../../../test/images/traditional-buffets-and-sideboards.jpg")
     bg = Image.from_filepath("../../../../test/images/vanishing.jpg")
@@ -114,4 +114,188 @@ if __name__ == '__main__':
     
     
     
-    
\ No newline at end of file
+        
+    from inception.image.operation.scale import ScaleOperation
+    from inception.image.operation.statadjust import StatAdjustOperation
+    
+    print("Running statistical adjustment tests")
+    
+    # a textured background and a shaded object with a soft edged matte on a transparent border
+    numpy.random.seed(0)
+    rows, cols = numpy.mgrid[0:300, 0:400]
+    background = numpy.dstack((.3 + .2 * numpy.sin(cols / 15.0), .4 + .1 * numpy.cos(rows / 9.0), 
+                               .2 + .3 * rows / 300.0)) + .1 * numpy.random.rand(300, 400, 3)
+    foreground = numpy.zeros((120, 90, 4))
+    foreground[..., 0] = .8 * cols[:120, :90] / 90.0 + .1
+    foreground[..., 1] = .5 * rows[:120, :90] / 120.0 + .2
+    foreground[..., 2] = .3
+    foreground[10:110, 10:80, 3] = 1
+    foreground[9:111, 9:81, 3] += .5
+    
+    def test_scaled_bounds():
+        print("Testing that a scaled foreground is adjusted around its content, not its padded bounds")
+        scaled = ScaleOperation(Image(foreground), 180, 240).run()
+        tight = Image(scaled.data)
+        padded, exact = [StatAdjustOperation(image, Image(background), (50, 150)).run() for image in [scaled, tight]]
+        print scaled.content_bounds != tight.content_bounds, numpy.abs(padded.data - exact.data).max() < 1e-12
+    
+    test_scaled_bounds()
+    
+    def test_fast_contrast():
+        print("Testing that the fast contrast search finds a curve as good as the grid search's")
+        from inception.image.statadjust.statadjust import _contrast_high_mean
+        # foregrounds small enough to be measured whole, and large enough to be subsampled
+        for seed in range(6):
+            state = numpy.random.RandomState(seed)
+            height, width = [(120, 90), (400, 300), (600, 500)][seed % 3]
+            rows, cols = numpy.mgrid[0:height, 0:width]
+            shaded = numpy.dstack((state.rand() * .8 * cols / width + .1 + .05 * state.rand(height, width), 
+                                   .5 * rows / float(height) + .2 * state.rand(),
+                                   .3 + .3 * numpy.sin(rows / (5 + 20 * state.rand()))))
+            shaded, textured = srgb_to_linear(shaded.clip(0, 1)), srgb_to_linear(background.clip(0, 1))
+            curves = [solve_contrast(shaded, textured, search=search) for search in ['grid', 'fast']]
+            
+            # the chosen curves match the background's high zone mean contrast within .005 of each other,
+            # measured on the whole foreground, and are the same curve when the foreground isn't subsampled
+            target = compute_stats('contrast', textured, filter_exposure=False)[2]
+            luminance = ColorSpaceView.of(shaded).luminance
+            lower = (luminance <= curves[0][0])
+            errors = [abs(target - _contrast_high_mean(luminance, meanlum, alpha, lower, ~lower)) 
+                      for meanlum, alpha in curves]
+            print errors[1] - errors[0] < .005, height * width > 65536 or curves[0] == curves[1]
+            
+            # curves applied through the fast search's lookup table stay within .001 of the exact curve
+            exact, table = [apply_contrast(shaded, meanlum, curves[1][1], search=search)
+                            for meanlum, search in zip([curves[1][0]] * 2, ['grid', 'fast'])]
+            print numpy.abs(exact - table).max() < .001
+    
+    test_fast_contrast()
+    
+    def adjusted(**kwargs):
+        # the foreground adjusted into the background with the given options, and its opaque pixels
+        result = StatAdjustOperation(Image(foreground), kwargs.pop('into', Image(background)), (50, 150), 
+                                     **kwargs).run()
+        return result.data[..., :3][foreground[..., 3] > 0]
+    
+    exact = adjusted()
+    
+    def test_indexed():
+        print("Testing that the background statistics index matches measuring the background")
+        from inception.image.statadjust.index import BackgroundStatsIndex
+        index = BackgroundStatsIndex(background)
+        # zone means are found to within the bins they end in, while the medium zone means are exact, 
+        # except for local contrast, which the index measures over the whole background
+        tolerances = {'luminance': .01, 'cct': 3, 'saturation': .05, 'contrast': .005}
+        for window in [(0, 0, 192, 256), (64, 128, 256, 384), (0, 0, 300, 400)]:
+            view = ColorSpaceView(background[window[0]:window[2], window[1]:window[3]], linear=False)
+            for statname, tolerance in sorted(tolerances.items()):
+                measured = compute_stats(statname, view, filter_exposure=statfuncs[statname]['filter_exposure'])
+                indexed = index.stats(statname, window)
+                print statname, all(abs(a - b) < tolerance for a, b in zip(measured, indexed) if a is not None), \
+                    statname == 'contrast' or abs(measured[1] - indexed[1]) < 1e-9
+        
+        # windows that don't line up with the tiles are snapped to them, and the adjustment stays within .05
+        into = Image(background)
+        print numpy.abs(adjusted(indexed=True, into=into) - exact).max() < .05
+        index = into.stats_index
+        print index is not None and (adjusted(indexed=True, into=into) == adjusted(indexed=True, into=into)).all()
+        print into.stats_index is index
+    
+    test_indexed()
+    
+    def test_cct_lookup():
+        print("Testing that looked up color temperatures match converting them exactly")
+        from inception.image.statadjust.colorspace import xyY_to_cct, cct_to_xy
+        # within the tolerances stated by `CCTLookupTable`
+        xyY = rgb_to_xyY(numpy.random.RandomState(1).rand(1, 200000, 3))
+        difference = numpy.abs(xyY_to_cct(xyY, lookup=True) - xyY_to_cct(xyY))
+        print difference[..., 0].max() <= .12, difference[..., 1].max() <= .07
+        temperature = xyY_to_cct(xyY)
+        print numpy.abs(cct_to_xy(temperature, lookup=True) - cct_to_xy(temperature)).max() <= 2e-5
+        
+        # anything outside of the tables is converted exactly
+        outside = numpy.array([[[.1, .05, .5], [.7, .3, .5]]])
+        print (xyY_to_cct(outside, lookup=True) == xyY_to_cct(outside)).all()
+        print numpy.abs(adjusted(cct_lookup=True) - exact).max() < .001
+    
+    test_cct_lookup()
+    
+    def test_transfer_tables():
+        print("Testing that sRGB transfer functions by table lookup match the exact ones")
+        from inception.image.statadjust import colorspace, transfer
+        values = numpy.concatenate((numpy.linspace(0, 1, 100001), numpy.random.RandomState(2).rand(100000)))
+        # within the tolerances stated by `transfer`, with values outside of [0,1] converted exactly
+        print numpy.abs(transfer.srgb_to_linear(values) - colorspace.srgb_to_linear(values)).max() < 1e-7
+        print numpy.abs(transfer.linear_to_srgb(values) - colorspace.linear_to_srgb(values)).max() < 1e-6
+        outside = numpy.array([-.01, -1e-9, 1 + 1e-9, 2])
+        print (transfer.srgb_to_linear(outside) == colorspace.srgb_to_linear(outside)).all()
+        
+        # 8-bit images are converted exactly, and single precision ones stay in single precision
+        levels = numpy.arange(256, dtype=numpy.uint8)
+        print (transfer.srgb_to_linear(levels) == colorspace.srgb_to_linear(levels / 255.0)).all()
+        single = values.astype(numpy.float32)
+        for convert in ['srgb_to_linear', 'linear_to_srgb']:
+            result = getattr(transfer, convert)(single)
+            print result.dtype == numpy.float32, \
+                numpy.abs(result - getattr(colorspace, convert)(single.astype(numpy.float64))).max() < 1e-5
+        
+        # and can be converted in place
+        copy = single.copy()
+        print transfer.srgb_to_linear(copy, out=copy) is copy and (copy == transfer.srgb_to_linear(single)).all()
+    
+    test_transfer_tables()
+    
+    def test_fused():
+        print("Testing that fused adjustments match adjusting one statistic at a time")
+        # the fused transform is fitted on the opaque pixels only, and applied to the rest as well
+        operation = StatAdjustOperation(Image(foreground), Image(background), (50, 150), fused=True)
+        fused = operation.run().data[..., :3][foreground[..., 3] > 0]
+        print numpy.abs(fused - exact).max() < .01
+        
+        # the same transform adjusts later images without measuring either image again
+        again = StatAdjustOperation(Image(foreground), None, (50, 150), transform=operation.transform).run()
+        print (again.data[..., :3][foreground[..., 3] > 0] == fused).all()
+        try:
+            statadjust(foreground, background, (50, 150), intermediary_results=True, fused=True)
+            print False
+        except ValueError:
+            print True
+    
+    test_fused()
+    
+    def test_sampled():
+        print("Testing that statistics estimated from samples match measuring every pixel")
+        from inception.image.statadjust.sample import stratified_sample
+        samples = stratified_sample(background, 4000)
+        print abs(len(samples) - 4000) < 400 and (stratified_sample(background, 4000) == samples).all()
+        # the medium zone means are within about three standard errors of the mean luminance and saturation
+        for statname, tolerance in [('luminance', .03), ('saturation', .03)]:
+            measured, sampled = [compute_stats(statname, ColorSpaceView(image, linear=False))[1] 
+                                 for image in [background, samples[numpy.newaxis]]]
+            print statname, abs(measured - sampled) < tolerance
+        print numpy.abs(adjusted(max_samples=2000) - exact).max() < .005
+    
+    test_sampled()
+    
+    def test_chunked():
+        print("Testing that color space conversions in blocks of rows match converting the whole image")
+        from inception.image.statadjust import colorspace
+        import inception.image.statadjust.statadjust as module
+        image = srgb_to_linear(background)
+        xyY = rgb_to_xyY(image)
+        for function, argument in [(rgb_to_xyY, image), (xyY_to_rgb, xyY), (rgb_to_hsv, image), 
+                                   (colorspace.xyY_to_cct, xyY), (lambda xy, Y: xy * Y, (xyY[..., :2], xyY[..., 2:]))]:
+            whole = function(*argument) if isinstance(argument, tuple) else function(argument)
+            print all((chunked(function, argument, chunk_pixels=1000, threads=threads) == whole).all() 
+                      for threads in [1, 3])
+        
+        # in place, and for the whole adjustment
+        copy = image.copy()
+        print chunked(rgb_to_hsv, copy, out=copy, chunk_pixels=1000) is copy and (copy == rgb_to_hsv(image)).all()
+        module._threads = 3
+        try:
+            print (adjusted() == exact).all()
+        finally:
+            module._threads = 1
+    
+    test_chunked()